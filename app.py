@@ -1,26 +1,43 @@
 import os
-from flask import Flask, render_template, redirect, url_for, request, flash, send_file
+import click
+import tempfile
+import time
+from flask import Flask, render_template, redirect, url_for, request, flash, send_file, jsonify, abort, Response, stream_with_context
+from markupsafe import Markup, escape
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload, selectinload, contains_eager
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
 from flask_wtf import FlaskForm
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date, timedelta
-import uuid # For generating Submission IDs
 from functools import wraps
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
+from itertools import islice
 from io import BytesIO
 from models import db, User
 from forms import RegistrationForm, LoginForm, ReturnForm, CheckForm, ReturnItemForm, BulkUploadForm, PDFUploadForm
 from models import ReturnReport, CheckStatement, CheckDetail, ManufacturerBreakdown, ReturnCategory, ReturnItem, Reason
+from models import Submission, SubmissionItem, NDC_Master, StatusUpdate, Job
+from classification import classify_lines, price_submission_lines, insert_submission_items, insert_rows
+from pdf_import import parse_with_cache, cached_rows
+from ingest import iter_csv_rows, normalize_rows, ingest_return_items, error_report_path, REQUIRED_FIELDS
+from jobs import jobs, job_status_dict
+from pdf_cache import pdf_cache, submission_state_version, return_state_version
+from batch_export import batch_exporter, BatchExportBusy, manifest_documents, return_letter_documents, iter_zip, write_merged_pdf
+from rollups import rebuild_rollups, ensure_rollups, GRANULARITIES
+from reporting import compute_report_data, get_dashboard_metrics
+from pagination import keyset_paginate, parse_per_page
+from query_stats import query_stats
+from db_profile import database_profile
+from db_routing import REPLICA_BIND, read_only, replica_router, snapshot_sqlite
+from metrics import request_metrics, render_metrics, time_document, count_ingested, CONTENT_TYPE_LATEST
+from archive import archive_cutoff, archive_return_trees, delete_return_trees
+from exports import EXPORT_FORMATS, PARQUET_ROW_GROUP_SIZE, iter_export_chunks, iter_csv, iter_ndjson, write_excel, write_parquet
+from search_index import search, search_filter, rebuild_search_index, ensure_search_index, KINDS as SEARCH_KINDS
+from caching import reference_cache, dashboard_cache, get_category_ids, get_category_choices, get_manufacturer_choices, invalidate_reference_data, invalidate_dashboard_metrics
 import os
 from werkzeug.utils import secure_filename
 import csv
 import io
-import pdfplumber
-import pandas as pd
 # from weasyprint import HTML, CSS
 # from weasyprint.text.fonts import FontConfiguration
 
@@ -34,16 +51,44 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a_very_secret_key_for_flask_session'
     WTF_CSRF_ENABLED = False  # Disable CSRF for testing
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # Background job threads per process
+    JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 4 * 3600))  # Seconds before a Running job is taken as dead
+    JOB_RESULT_MAX_AGE = int(os.environ.get('JOB_RESULT_MAX_AGE', 7 * 24 * 3600))  # Seconds a finished job and its files are kept
+    PDF_PARSE_WORKERS = int(os.environ.get('PDF_PARSE_WORKERS', 0))  # >1 parses page ranges on a process pool
+    PDF_PARSE_CACHE_MAX_BYTES = int(os.environ.get('PDF_PARSE_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # Parsed PDFs kept on disk
+    PDF_PREVIEW_ROWS = 50  # Parsed rows shown on the PDF import preview page
+    INGEST_CHUNK_SIZE = 1000  # Rows inserted and committed per bulk-upload chunk
+    REFERENCE_CACHE_TTL = 300  # Seconds before cached reasons/categories/manufacturers are reloaded
+    DASHBOARD_CACHE_TTL = 60  # Seconds a user's dashboard figures may be served from cache
+    BATCH_EXPORT_WORKERS = int(os.environ.get('BATCH_EXPORT_WORKERS', 2))  # Render processes per batch export
+    BATCH_EXPORT_MAX_CONCURRENT = 1  # Batch exports running at once per web process
+    BATCH_EXPORT_MAX_DOCUMENTS = 500  # Documents allowed in one batch
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))  # PostgreSQL connections kept per worker
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))  # Extra PostgreSQL connections under load
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')  # Optional read replica for read-only views
+    SQLALCHEMY_BINDS = {REPLICA_BIND: REPLICA_DATABASE_URL} if REPLICA_DATABASE_URL else {}
+    REPLICA_MAX_LAG_SECONDS = int(os.environ.get('REPLICA_MAX_LAG_SECONDS', 300))  # Staler replicas are skipped
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 730))  # Returns invoiced longer ago are archived
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 200))  # Returns moved per archive transaction
     
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
-    # Initialize extensions
+    # Initialize extensions; the database profile sets the engine options db.init_app uses
+    database_profile.init_app(app)
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'login' # Define the view function for logging in
     login_manager.login_message_category = 'warning'
+    reference_cache.ttl = app.config['REFERENCE_CACHE_TTL']
+    dashboard_cache.ttl = app.config['DASHBOARD_CACHE_TTL']
+    jobs.init_app(app)
+    pdf_cache.init_app(app)
+    batch_exporter.init_app(app)
+    query_stats.init_app(app)
+    replica_router.init_app(app)
+    request_metrics.init_app(app)
 
     return app
 
@@ -57,58 +102,6 @@ login_manager = LoginManager()
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-class Submission(db.Model):
-    __tablename__ = 'submissions'
-    id = db.Column(db.Integer, primary_key=True)
-    # Submission ID used by the user (UUID for better uniqueness)
-    submission_uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    # Relationship to User (submitter)
-    submitter = db.relationship('User', backref='submissions')
-    submission_date = db.Column(db.Date, nullable=False, default=date.today)
-    # Status: Draft, Submitted, Received, Credited
-    status = db.Column(db.String(20), nullable=False, default='Draft')
-    tracking_number = db.Column(db.String(100)) # Placeholder for tracking
-    status_updated_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    # Relationship to Items
-    items = db.relationship('SubmissionItem', backref='submission', lazy=True, cascade="all, delete-orphan")
-    # Relationship to Status History
-    status_history = db.relationship('StatusUpdate', backref='submission', lazy=True, cascade="all, delete-orphan")
-    
-class SubmissionItem(db.Model):
-    __tablename__ = 'submission_items'
-    id = db.Column(db.Integer, primary_key=True)
-    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), nullable=False)
-    ndc = db.Column(db.String(11), nullable=False)
-    quantity = db.Column(db.Integer, nullable=False)
-    expiration_date = db.Column(db.Date, nullable=False)
-    estimated_credit = db.Column(db.Float, default=0.0)
-    # returnable_status: Eligible, Ineligible (based on NDC lookup/expiration rules)
-    returnable_status = db.Column(db.String(20), default='Unchecked')
-    reason_id = db.Column(db.Integer, db.ForeignKey('reasons.id'))
-
-    # Relationship to Reason
-    reason = db.relationship('Reason', backref='submission_items')
-
-class NDC_Master(db.Model):
-    __tablename__ = 'ndc_master'
-    ndc = db.Column(db.String(11), primary_key=True)
-    drug_name = db.Column(db.String(255), nullable=False)
-    manufacturer = db.Column(db.String(120), nullable=False)
-    policy_code = db.Column(db.String(10))
-    base_credit_value = db.Column(db.Float, default=1.00) # Base value per unit for calculation
-
-class StatusUpdate(db.Model):
-    __tablename__ = 'status_updates'
-    id = db.Column(db.Integer, primary_key=True)
-    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), nullable=False)
-    old_status = db.Column(db.String(20))
-    new_status = db.Column(db.String(20), nullable=False)
-    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    updated_by = db.Column(db.String(100)) # Could be 'system' or admin username
-    notes = db.Column(db.Text)
-
 # --- DECORATORS ---
 
 def admin_required(f):
@@ -131,24 +124,23 @@ def reviewer_required(f):
 
 # --- UTILITIES ---
 
-def classify_item(exp_date, ndc_record=None):
-    """Classify an item based on expiration date and NDC rules."""
-    today = date.today()
+def wants_background():
+    """True when the request asks for its heavy work to run as a background job."""
+    return request.values.get('background', '').lower() in ('1', 'true', 'on', 'yes')
 
-    # Calculate months until expiration
-    months_until_expiry = (exp_date - today).days / 30
+def parse_date_arg(name):
+    """A YYYY-MM-DD query argument as a date, or None when missing or malformed."""
+    try:
+        return datetime.strptime(request.args.get(name, ''), '%Y-%m-%d').date()
+    except ValueError:
+        return None
 
-    if exp_date < today:
-        return "Outdated"
-    elif months_until_expiry <= 6:
-        return "Short Dated"
-    elif months_until_expiry > 12:
-        return "Future Dated"
-    else:
-        # Check NDC policy if available
-        if ndc_record and ndc_record.policy_code == 'X':
-            return "Non-Returnable"
-        return "Returnable"
+def paginate_list(query, order_by):
+    """One keyset page of ``query`` driven by the after/before/per_page query arguments."""
+    return keyset_paginate(query, order_by,
+                           after=request.args.get('after'),
+                           before=request.args.get('before'),
+                           per_page=parse_per_page(request.args.get('per_page')))
 
 def seed_ndc_master(app):
     """Seeds the NDC Master table with sample data."""
@@ -163,6 +155,7 @@ def seed_ndc_master(app):
                 ndc_record = NDC_Master(**data)
                 db.session.add(ndc_record)
             db.session.commit()
+            invalidate_reference_data()
             print("NDC Master seeded with sample data.")
 
 def seed_sample_users(app):
@@ -198,6 +191,7 @@ def seed_reasons():
                 reason = Reason(**reason_data)
                 db.session.add(reason)
             db.session.commit()
+            invalidate_reference_data()
             print("Default reasons seeded.")
 
 def seed_return_reports():
@@ -302,13 +296,21 @@ def seed_return_reports():
 # --- APPLICATION FACTORY SETUP ---
 app = create_app()
 
-with app.app_context():
+# Importing this module touches neither the database nor the PDF/Excel libraries, so
+# every worker boots quickly; the schema and sample data are set up by `flask init-db`.
+
+def init_database():
+    """Create missing tables, rollups and the search index. Safe to run again."""
     db.create_all() # Create tables if they don't exist (Day 2)
+    ensure_rollups() # Backfill reporting rollups for databases created before them
+    ensure_search_index() # Create the full-text search index if it is missing
+
+def seed_sample_data():
+    """Load the sample NDCs, reasons, returns and users into empty tables."""
     seed_ndc_master(app) # Seed sample data
     seed_reasons() # Seed default reasons
     seed_return_reports() # Seed sample return reports
     seed_sample_users(app) # Seed sample users
-    print("Seeding users...")
 
 # --- ROUTES (Day 3, 5, 8, 11) ---
 
@@ -371,42 +373,36 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@read_only
 def dashboard():
     if current_user.role == 'reviewer':
-        # Reviewers see all submissions
-        submissions = Submission.query.order_by(Submission.submission_date.desc()).all()
-        return render_template('dashboard.html', title='Reviewer Dashboard', submissions=submissions, is_reviewer=True)
+        # Reviewers see all submissions, one page at a time
+        page = paginate_list(Submission.query.options(joinedload(Submission.submitter), selectinload(Submission.items)), [(Submission.submission_date, True), (Submission.id, True)])
+        return render_template('dashboard.html', title='Reviewer Dashboard', submissions=page.items, page=page, is_reviewer=True)
     else:
         # Regular users see only their own submissions
-        submissions = Submission.query.filter_by(user_id=current_user.id).order_by(Submission.submission_date.desc()).all()
+        submissions = Submission.query.filter_by(user_id=current_user.id).options(
+            selectinload(Submission.items)).order_by(Submission.submission_date.desc()).all()
 
-        # Calculate dashboard metrics
-        total_erv = db.session.query(db.func.sum(ReturnReport.ERV)).scalar() or 0
-        total_short_dated = db.session.query(db.func.sum(ReturnItem.extended_price)).join(Reason).filter(Reason.name == 'Short Dated').scalar() or 0
+        # ERV trend selection: granularity and an optional invoice date range
+        trend_granularity = request.args.get('trend', 'month')
+        if trend_granularity not in GRANULARITIES:
+            trend_granularity = 'month'
+        trend_start = parse_date_arg('trend_start')
+        trend_end = parse_date_arg('trend_end')
 
-        # Top 5 manufacturers by ERV
-        top_manufacturers = db.session.query(
-            ManufacturerBreakdown.manufacturer_name,
-            db.func.sum(ManufacturerBreakdown.ERV).label('total_erv')
-        ).group_by(ManufacturerBreakdown.manufacturer_name).order_by(db.desc('total_erv')).limit(5).all()
-
-        # ERV trend data (by month)
-        erv_trend_raw = db.session.query(
-            db.func.strftime('%Y-%m', ReturnReport.invoice_date).label('month'),
-            db.func.sum(ReturnReport.ERV).label('total_erv')
-        ).filter(ReturnReport.invoice_date.isnot(None)).group_by('month').order_by('month').all()
-
-        # Convert Row objects to dictionaries for JSON serialization
-        erv_trend = [{'month': row.month, 'total_erv': float(row.total_erv) if row.total_erv else 0} for row in erv_trend_raw]
+        # Dashboard metrics are cached per user and role; writes to returns and items invalidate them
+        metrics = get_dashboard_metrics(current_user.id, current_user.role, trend_granularity, trend_start, trend_end)
 
         return render_template('dashboard.html',
                              title='Dashboard',
                              submissions=submissions,
                              is_reviewer=False,
-                             total_erv=total_erv,
-                             total_short_dated=total_short_dated,
-                             top_manufacturers=top_manufacturers,
-                             erv_trend=erv_trend)
+                             granularities=GRANULARITIES,
+                             trend_granularity=trend_granularity,
+                             trend_start=trend_start,
+                             trend_end=trend_end,
+                             **metrics)
 
 @app.route('/new_return', methods=['GET', 'POST'])
 @login_required
@@ -464,6 +460,7 @@ def new_return():
                     continue
 
         db.session.commit()
+        invalidate_dashboard_metrics()
         flash('Return report with manufacturer breakdown submitted successfully!', 'success')
         return redirect(url_for('dashboard'))
 
@@ -552,88 +549,14 @@ def new_submission():
         db.session.add(new_submission_obj)
         db.session.flush() # Flushes the new object to get its ID without committing
 
-        # Process Items (Day 7/9 Logic)
-        for ndc, qty_str, exp_str in zip(ndc_list, qty_list, exp_list):
-            try:
-                # Data cleaning and type conversion
-                qty = int(qty_str)
-                exp_date = datetime.strptime(exp_str, '%Y-%m-%d').date()
-
-                # Basic validation
-                if qty <= 0:
-                    flash(f'Quantity must be positive for NDC {ndc}', 'warning')
-                    continue
-                
-                # Day 9: NDC Validation and Credit Logic with enhanced business rules
-                ndc_record = NDC_Master.query.get(ndc)
-
-                credit = 0.0
-                status = 'Ineligible'
-
-                # Auto-classify the item using the classification logic
-                classification = classify_item(exp_date, ndc_record)
-                reason = Reason.query.filter_by(name=classification).first()
-                if not reason:
-                    flash(f'Classification reason not found for {classification}. Please contact admin.', 'danger')
-                    continue
-
-                if ndc_record:
-                    # Check expiration date - must be at least 6 months from now to be returnable
-                    today = date.today()
-                    min_return_date = today + timedelta(days=180)  # 6 months
-
-                    if exp_date <= min_return_date:
-                        status = 'Ineligible (Expiration Too Soon)'
-                    elif exp_date > today + timedelta(days=365*3):  # More than 3 years from now
-                        status = 'Ineligible (Expiration Too Far)'
-                    else:
-                        # Check policy code
-                        if ndc_record.policy_code == 'X':
-                            status = 'Ineligible (Policy Restricted)'
-                        else:
-                            # Calculate credit with enhanced logic
-                            base_credit = ndc_record.base_credit_value
-                            if base_credit > 0:
-                                # Apply quantity discount for bulk returns
-                                if qty >= 100:
-                                    discount_factor = 0.95  # 5% discount
-                                elif qty >= 50:
-                                    discount_factor = 0.97  # 3% discount
-                                else:
-                                    discount_factor = 1.0
-
-                                # Apply expiration-based adjustment
-                                months_until_expiry = (exp_date - today).days / 30
-                                if months_until_expiry > 24:  # More than 2 years
-                                    expiry_factor = 0.9  # 10% reduction for long expiry
-                                elif months_until_expiry < 12:  # Less than 1 year
-                                    expiry_factor = 0.95  # 5% reduction for short expiry
-                                else:
-                                    expiry_factor = 1.0
-
-                                credit = round(base_credit * qty * discount_factor * expiry_factor, 2)
-                                status = 'Eligible'
-                            else:
-                                status = 'Ineligible (No Credit Value)'
-                else:
-                    status = 'NDC Not Found'
-
-                item = SubmissionItem(
-                    submission_id=new_submission_obj.id,
-                    ndc=ndc,
-                    quantity=qty,
-                    expiration_date=exp_date,
-                    estimated_credit=credit,
-                    returnable_status=status,
-                    reason_id=reason.id
-                )
-                db.session.add(item)
-            except ValueError:
-                # Handle corrupted data row
-                flash(f'Skipped invalid item row: NDC {ndc}', 'warning')
-                continue
+        # Process Items (Day 7/9 Logic): classify and price the whole batch at once
+        rows, messages = price_submission_lines(ndc_list, qty_list, exp_list)
+        for message, category in messages:
+            flash(message, category)
+        item_count = insert_submission_items(new_submission_obj.id, rows)
 
         db.session.commit()
+        count_ingested('submission', item_count)
 
         # Create initial status update record
         update_submission_status(new_submission_obj, 'Draft', 'user', 'Submission created')
@@ -673,6 +596,7 @@ def update_submission_status(submission, new_status, updated_by='system', notes=
     )
     db.session.add(status_update)
     db.session.commit()
+    invalidate_submission_pdfs(submission)
 
 @app.route('/submission/<submission_uuid>/finalize', methods=['POST'])
 @login_required
@@ -685,6 +609,11 @@ def finalize_submission(submission_uuid):
         # In a real app, this would trigger an external tracking number request
         submission.tracking_number = f"TRACK-{submission_uuid[:8].upper()}"
         db.session.commit()
+        # Render the submitted manifest now so the first download is a plain file send
+        try:
+            cached_manifest_pdf(submission)
+        except Exception:
+            app.logger.exception('Could not pre-render manifest for submission %s', submission_uuid)
         flash(f'Submission {submission_uuid} is finalized and ready for shipment. Tracking: {submission.tracking_number}', 'success')
     else:
         flash(f'Submission {submission_uuid} is already {submission.status}.', 'info')
@@ -718,120 +647,25 @@ def review_submission(submission_uuid):
                           total_credit=total_credit)
 
 
-def generate_manifest_pdf(submission):
-    """Generate a PDF manifest for the submission."""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
-    )
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=12,
-        spaceAfter=20,
-    )
-
-    story = []
-
-    # Title
-    story.append(Paragraph("Pharmaceutical Return Manifest", title_style))
-    story.append(Spacer(1, 12))
-
-    # Submission details
-    story.append(Paragraph(f"Submission ID: {submission.submission_uuid}", styles['Normal']))
-    story.append(Paragraph(f"Date: {submission.submission_date.strftime('%Y-%m-%d')}", styles['Normal']))
-    story.append(Paragraph(f"Company: {submission.submitter.company_name}", styles['Normal']))
-    story.append(Paragraph(f"Status: {submission.status}", styles['Normal']))
-    if submission.tracking_number:
-        story.append(Paragraph(f"Tracking Number: {submission.tracking_number}", styles['Normal']))
-    story.append(Spacer(1, 20))
-
-    # Items table
-    story.append(Paragraph("Return Items:", subtitle_style))
-
-    data = [['NDC', 'Quantity', 'Expiration Date', 'Status', 'Estimated Credit']]
-    total_credit = 0
-    for item in submission.items:
-        data.append([
-            item.ndc,
-            str(item.quantity),
-            item.expiration_date.strftime('%Y-%m-%d'),
-            item.returnable_status,
-            f"${item.estimated_credit:.2f}"
-        ])
-        total_credit += item.estimated_credit
-
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-
-    story.append(table)
-    story.append(Spacer(1, 20))
-    story.append(Paragraph(f"Total Estimated Credit: ${total_credit:.2f}", styles['Normal']))
-
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
-
-def generate_shipping_label_pdf(submission):
-    """Generate a PDF shipping label for the submission."""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
+def cached_manifest_pdf(submission):
+    """Path of the submission's manifest PDF for its current state, rendering it on a cache miss."""
+    from pdf_render import generate_manifest_pdf
 
-    story = []
+    return pdf_cache.get_or_build('manifest', submission.submission_uuid, submission_state_version(submission),
+                                  lambda: generate_manifest_pdf(submission))
 
-    # Shipping label content
-    story.append(Paragraph("PHARMACEUTICAL RETURNS - PREPAID SHIPPING LABEL", styles['Heading1']))
-    story.append(Spacer(1, 20))
-
-    story.append(Paragraph("FROM:", styles['Heading2']))
-    story.append(Paragraph(f"{submission.submitter.company_name}", styles['Normal']))
-    story.append(Paragraph(f"User: {submission.submitter.username}", styles['Normal']))
-    story.append(Spacer(1, 20))
-
-    story.append(Paragraph("TO:", styles['Heading2']))
-    story.append(Paragraph("PharmaReturns Processing Center", styles['Normal']))
-    story.append(Paragraph("123 Return Lane", styles['Normal']))
-    story.append(Paragraph("Processing City, PC 12345", styles['Normal']))
-    story.append(Spacer(1, 20))
-
-    story.append(Paragraph("SUBMISSION DETAILS:", styles['Heading2']))
-    story.append(Paragraph(f"Submission ID: {submission.submission_uuid}", styles['Normal']))
-    if submission.tracking_number:
-        story.append(Paragraph(f"Tracking Number: {submission.tracking_number}", styles['Normal']))
-    story.append(Paragraph(f"Items: {len(submission.items)}", styles['Normal']))
-    story.append(Spacer(1, 20))
-
-    story.append(Paragraph("IMPORTANT: This shipment contains pharmaceutical products. Handle with care.", styles['Normal']))
-
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+def invalidate_submission_pdfs(submission):
+    pdf_cache.invalidate('manifest', submission.submission_uuid)
+    pdf_cache.invalidate('label', submission.submission_uuid)
 
 @app.route('/submission/<submission_uuid>/manifest/pdf')
 @login_required
 def download_manifest(submission_uuid):
     submission = Submission.query.filter_by(submission_uuid=submission_uuid, user_id=current_user.id).first_or_404()
-    pdf_buffer = generate_manifest_pdf(submission)
+    pdf_path = cached_manifest_pdf(submission)
 
     return send_file(
-        pdf_buffer,
+        pdf_path,
         as_attachment=True,
         download_name=f'manifest_{submission_uuid}.pdf',
         mimetype='application/pdf'
@@ -840,16 +674,90 @@ def download_manifest(submission_uuid):
 @app.route('/submission/<submission_uuid>/label/pdf')
 @login_required
 def download_label(submission_uuid):
+    from pdf_render import generate_shipping_label_pdf
+
     submission = Submission.query.filter_by(submission_uuid=submission_uuid, user_id=current_user.id).first_or_404()
-    pdf_buffer = generate_shipping_label_pdf(submission)
+    pdf_path = pdf_cache.get_or_build('label', submission.submission_uuid, submission_state_version(submission),
+                                      lambda: generate_shipping_label_pdf(submission))
 
     return send_file(
-        pdf_buffer,
+        pdf_path,
         as_attachment=True,
         download_name=f'shipping_label_{submission_uuid}.pdf',
         mimetype='application/pdf'
     )
 
+# --- BATCH EXPORT ---
+
+BATCH_EXPORT_KINDS = ('manifests', 'return_letters')
+
+def batch_export_documents(kind, params):
+    """Select the documents for a batch export from request or job parameters.
+
+    Raises ValueError on missing or malformed dates.
+    """
+    limit = app.config['BATCH_EXPORT_MAX_DOCUMENTS']
+    if kind == 'manifests':
+        day = datetime.strptime(params.get('date') or date.today().isoformat(), '%Y-%m-%d').date()
+        return manifest_documents(day, params.get('status') or 'Submitted', limit=limit)
+    start_date = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+    end_date = datetime.strptime(params['end_date'], '%Y-%m-%d').date()
+    return return_letter_documents(start_date, end_date, limit=limit)
+
+def batch_export_name(kind, params, fmt):
+    if kind == 'manifests':
+        suffix = params.get('date') or date.today().isoformat()
+    else:
+        suffix = f"{params['start_date']}_{params['end_date']}"
+    return f"{kind}_{suffix}.{fmt}"
+
+@app.route('/batch_export/<kind>')
+@login_required
+@reviewer_required
+def batch_export(kind):
+    if kind not in BATCH_EXPORT_KINDS:
+        abort(404)
+    params = {name: request.args.get(name, '') for name in ('date', 'status', 'start_date', 'end_date')}
+    fmt = 'pdf' if request.args.get('format') == 'pdf' else 'zip'
+
+    if wants_background():
+        job = jobs.enqueue('batch_export', current_user.id, params=dict(params, kind=kind, format=fmt))
+        flash('Batch export queued. The file will be available for download when the job finishes.', 'info')
+        return redirect(url_for('job_status_page', job_uuid=job.job_uuid))
+
+    try:
+        documents = batch_export_documents(kind, params)
+    except (KeyError, ValueError):
+        flash('Please provide valid dates (YYYY-MM-DD) for the batch export.', 'danger')
+        return redirect(url_for('dashboard'))
+    if not documents:
+        flash('No documents match the selected dates.', 'info')
+        return redirect(url_for('dashboard'))
+
+    try:
+        batch_exporter.acquire()
+    except BatchExportBusy as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('dashboard'))
+
+    download_name = batch_export_name(kind, params, fmt)
+    if fmt == 'pdf':
+        # Merging needs the whole document set, so build it in a temporary file
+        merged = tempfile.TemporaryFile()
+        try:
+            write_merged_pdf(batch_exporter.iter_rendered(documents), merged)
+        finally:
+            batch_exporter.release()
+        merged.seek(0)
+        return send_file(merged, as_attachment=True, download_name=download_name, mimetype='application/pdf')
+
+    response = Response(stream_with_context(iter_zip(batch_exporter.iter_rendered(documents))),
+                        mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    # Hold the export slot until the server has finished sending the archive
+    response.call_on_close(batch_exporter.release)
+    return response
+
 # --- Day 8: View Returns ---
 
 @app.route('/returns')
@@ -860,21 +768,24 @@ def returns():
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
     service_type = request.args.get('service_type', '')
+    words = request.args.get('match') == 'words'
 
     query = ReturnReport.query
 
     if return_no:
-        query = query.filter(ReturnReport.return_no.ilike(f'%{return_no}%'))
+        query = query.filter(search_filter('return', 'code', return_no, ReturnReport.id, ReturnReport.return_no,
+                                          words=words))
     if start_date:
         query = query.filter(ReturnReport.invoice_date >= start_date)
     if end_date:
         query = query.filter(ReturnReport.invoice_date <= end_date)
     if service_type:
-        query = query.filter(ReturnReport.service_type.ilike(f'%{service_type}%'))
+        query = query.filter(search_filter('return', 'text', service_type, ReturnReport.id, ReturnReport.service_type,
+                                          words=words))
 
-    returns_list = query.all()
+    page = paginate_list(query, [(ReturnReport.invoice_date, True), (ReturnReport.id, True)])
 
-    return render_template('returns.html', returns=returns_list, return_no=return_no, start_date=start_date, end_date=end_date, service_type=service_type)
+    return render_template('returns.html', returns=page.items, page=page, return_no=return_no, start_date=start_date, end_date=end_date, service_type=service_type)
 
 @app.route('/returns/<return_no>')
 @login_required
@@ -894,21 +805,15 @@ def add_item(return_no):
     pdf_form = PDFUploadForm()
 
     # Populate manufacturer choices from NDC_Master
-    manufacturers = db.session.query(NDC_Master.manufacturer).distinct().all()
-    form.manufacturer.choices = [(m.manufacturer, m.manufacturer) for m in manufacturers]
+    form.manufacturer.choices = get_manufacturer_choices()
 
     # Populate category choices
-    categories = ReturnCategory.query.all()
-    form.category.choices = [(str(c.id), c.name) for c in categories]
+    form.category.choices = get_category_choices()
 
     if form.validate_on_submit():
         # Auto-classify the item
-        ndc_record = NDC_Master.query.get(form.ndc.data)
-        classification = classify_item(form.exp_date.data, ndc_record)
-
-        # Get the reason object
-        reason = Reason.query.filter_by(name=classification).first()
-        if not reason:
+        [(classification, reason_id, _)] = classify_lines([(form.ndc.data, form.exp_date.data)])
+        if reason_id is None:
             flash('Classification reason not found. Please contact admin.', 'danger')
             return redirect(url_for('add_item', return_no=return_no))
 
@@ -925,11 +830,12 @@ def add_item(return_no):
             unit_price=form.unit_price.data,
             extended_price=form.extended_price.data,
             category_id=int(form.category.data),
-            reason_id=reason.id,
+            reason_id=reason_id,
             manufacturer=form.manufacturer.data
         )
         db.session.add(new_item)
         db.session.commit()
+        invalidate_dashboard_metrics()
         flash(f'Item added successfully! Classified as: {classification}', 'success')
         return redirect(url_for('return_details', return_no=return_no))
 
@@ -950,90 +856,24 @@ def bulk_upload(return_no):
     if form.validate_on_submit():
         csv_file = form.csv_file.data
         if csv_file and csv_file.filename.endswith('.csv'):
-            # Read CSV content
-            stream = io.StringIO(csv_file.stream.read().decode("UTF8"), newline=None)
-            csv_reader = csv.DictReader(stream)
-
-            # Expected columns: ndc, description, lot_no, exp_date, pkg_size, full_qty, partial_qty, unit_price, extended_price, category, reason, manufacturer
-            required_fields = ['ndc', 'description', 'lot_no', 'exp_date', 'pkg_size', 'full_qty', 'partial_qty', 'unit_price', 'extended_price', 'category', 'reason', 'manufacturer']
-
-            items_added = 0
-            errors = []
-            ndc_seen = set()
-
-            for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 because row 1 is header
-                # Check for empty fields
-                empty_fields = [field for field in required_fields if not row.get(field, '').strip()]
-                if empty_fields:
-                    errors.append(f"Row {row_num}: Empty fields: {', '.join(empty_fields)}")
-                    continue
-
-                ndc = row['ndc'].strip()
-                # Check for duplicate NDCs in the file
-                if ndc in ndc_seen:
-                    errors.append(f"Row {row_num}: Duplicate NDC in file: {ndc}")
-                    continue
-                ndc_seen.add(ndc)
-
-                # Check for duplicate NDCs in database for this return
-                existing_item = ReturnItem.query.filter_by(return_report_id=return_report.id, ndc=ndc).first()
-                if existing_item:
-                    errors.append(f"Row {row_num}: NDC already exists in this return: {ndc}")
-                    continue
-
-                try:
-                    # Validate and convert data
-                    exp_date = datetime.strptime(row['exp_date'].strip(), '%Y-%m-%d').date()
-                    pkg_size = int(row['pkg_size'].strip())
-                    full_qty = int(row['full_qty'].strip())
-                    partial_qty = int(row['partial_qty'].strip())
-                    unit_price = float(row['unit_price'].strip())
-                    extended_price = float(row['extended_price'].strip())
-
-                    # Get category ID by name
-                    category = ReturnCategory.query.filter_by(name=row['category'].strip()).first()
-                    if not category:
-                        errors.append(f"Row {row_num}: Invalid category: {row['category']}")
-                        continue
-
-                    # Auto-classify the item
-                    ndc_record = NDC_Master.query.get(ndc)
-                    classification = classify_item(exp_date, ndc_record)
-                    reason = Reason.query.filter_by(name=classification).first()
-                    if not reason:
-                        errors.append(f"Row {row_num}: Classification reason not found for {classification}")
-                        continue
-
-                    # Create ReturnItem
-                    new_item = ReturnItem(
-                        return_report_id=return_report.id,
-                        ndc=ndc,
-                        description=row['description'].strip(),
-                        lot_no=row['lot_no'].strip(),
-                        exp_date=exp_date,
-                        pkg_size=pkg_size,
-                        full_qty=full_qty,
-                        partial_qty=partial_qty,
-                        unit_price=unit_price,
-                        extended_price=extended_price,
-                        category_id=category.id,
-                        reason_id=reason.id,
-                        manufacturer=row['manufacturer'].strip()
-                    )
-                    db.session.add(new_item)
-                    items_added += 1
-
-                except ValueError as e:
-                    errors.append(f"Row {row_num}: Invalid data format - {str(e)}")
-                except Exception as e:
-                    errors.append(f"Row {row_num}: Error processing row - {str(e)}")
-
-            db.session.commit()
+            if wants_background():
+                job = jobs.enqueue('bulk_upload', current_user.id,
+                                   params={'return_report_id': return_report.id}, uploads={'csv_path': csv_file})
+                flash('CSV upload queued for processing.', 'info')
+                return redirect(url_for('job_status_page', job_uuid=job.job_uuid))
+
+            # Stream the upload through the chunked ingestion path
+            items_added, errors = ingest_return_items(
+                iter_csv_rows(csv_file.stream),
+                return_report.id,
+                ingest_error_dir(),
+                chunk_size=app.config['INGEST_CHUNK_SIZE']
+            )
 
             if items_added > 0:
                 flash(f'Successfully added {items_added} items from CSV!', 'success')
-            if errors:
-                flash(f'Errors encountered: {"; ".join(errors)}', 'warning')
+            if errors.count:
+                flash_ingest_errors(errors)
 
             return redirect(url_for('return_details', return_no=return_no))
         else:
@@ -1041,6 +881,25 @@ def bulk_upload(return_no):
 
     return redirect(url_for('add_item', return_no=return_no))
 
+def ingest_error_dir():
+    return os.path.join(app.instance_path, 'ingest_errors')
+
+def flash_ingest_errors(errors):
+    """Flash a short summary of an ingestion error report with a download link."""
+    shown = "; ".join(errors.samples)
+    more = f" (and {errors.count - len(errors.samples)} more)" if errors.count > len(errors.samples) else ""
+    link = url_for('download_ingest_errors', token=errors.token)
+    flash(Markup(f'Errors encountered in {errors.count} rows: {escape(shown)}{more}. '
+                 f'<a href="{link}">Download the error report</a>.'), 'warning')
+
+@app.route('/bulk_upload/errors/<token>')
+@login_required
+def download_ingest_errors(token):
+    path = error_report_path(ingest_error_dir(), token)
+    if not path:
+        abort(404)
+    return send_file(path, as_attachment=True, download_name='upload_errors.csv', mimetype='text/csv')
+
 # --- Day 9: View Checks ---
 
 @app.route('/checks')
@@ -1049,17 +908,20 @@ def checks():
     # Get filters from request args
     statement_no = request.args.get('statement_no', '')
     check_no = request.args.get('check_no', '')
+    words = request.args.get('match') == 'words'
 
     query = CheckStatement.query
 
     if statement_no:
-        query = query.filter(CheckStatement.statement_no.ilike(f'%{statement_no}%'))
+        query = query.filter(search_filter('check', 'code', statement_no, CheckStatement.id, CheckStatement.statement_no,
+                                          words=words))
     if check_no:
-        query = query.filter(CheckStatement.check_no.ilike(f'%{check_no}%'))
+        query = query.filter(search_filter('check', 'alt_code', check_no, CheckStatement.id, CheckStatement.check_no,
+                                          words=words))
 
-    checks_list = query.all()
+    page = paginate_list(query, [(CheckStatement.payment_date, True), (CheckStatement.id, True)])
 
-    return render_template('checks.html', checks=checks_list, statement_no=statement_no, check_no=check_no)
+    return render_template('checks.html', checks=page.items, page=page, statement_no=statement_no, check_no=check_no)
 
 @app.route('/checks/<int:id>')
 @login_required
@@ -1068,92 +930,43 @@ def check_details(id):
     details = check_statement.details
     return render_template('check_details.html', check_statement=check_statement, details=details)
 
-# --- Day 11: Reports Route ---
+# --- Search ---
 
-@app.route('/reports')
+@app.route('/search')
 @login_required
-def reports():
-    # Aggregate totals
-    total_erv = db.session.query(db.func.sum(ReturnReport.ERV)).scalar() or 0
-    total_credits = db.session.query(db.func.sum(ReturnReport.credit_received)).scalar() or 0
-    total_fees = db.session.query(db.func.sum(ReturnReport.fees)).scalar() or 0
-
-    # Compute classification-based values
-    short_dated_value = db.session.query(db.func.sum(ReturnItem.extended_price)).join(Reason).filter(Reason.name == 'Short Dated').scalar() or 0
-    outdated_value = db.session.query(db.func.sum(ReturnItem.extended_price)).join(Reason).filter(Reason.name == 'Outdated').scalar() or 0
-    non_returnable_value = db.session.query(db.func.sum(ReturnItem.extended_price)).join(Reason).filter(Reason.name == 'Non-Returnable').scalar() or 0
-
-    # Aggregated manufacturer data
-    manufacturer_data = db.session.query(
-        ManufacturerBreakdown.manufacturer_name,
-        db.func.sum(ManufacturerBreakdown.ERV).label('total_erv'),
-        db.func.count(ManufacturerBreakdown.id).label('return_count')
-    ).group_by(ManufacturerBreakdown.manufacturer_name).all()
-
-    # Add percentages to manufacturer data
-    for m in manufacturer_data:
-        m.percentage = (m.total_erv / total_erv * 100) if total_erv > 0 else 0
-
-    # Aggregated category data
-    category_data = db.session.query(
-        ReturnCategory.name,
-        db.func.sum(ReturnItem.extended_price).label('total_value'),
-        db.func.count(ReturnItem.id).label('item_count')
-    ).join(ReturnItem).group_by(ReturnCategory.name).all()
-
-    # Data for charts
-    manufacturer_labels = [m.manufacturer_name for m in manufacturer_data]
-    manufacturer_percentages = [m.percentage for m in manufacturer_data]
-    manufacturer_colors = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40', '#FF6384', '#C9CBCF']
-
-    # Returnable vs Non-Returnable counts
-    returnable_count = db.session.query(db.func.count(ReturnItem.id)).join(Reason).filter(Reason.name == 'Returnable').scalar() or 0
-    non_returnable_count = db.session.query(db.func.count(ReturnItem.id)).join(Reason).filter(Reason.name.in_(['Non-Returnable', 'Outdated', 'Short Dated'])).scalar() or 0
-
-    return render_template('reports.html',
-                          total_erv=total_erv,
-                          total_credits=total_credits,
-                          total_fees=total_fees,
-                          short_dated_value=short_dated_value,
-                          outdated_value=outdated_value,
-                          non_returnable_value=non_returnable_value,
-                          manufacturer_data=manufacturer_data,
-                          category_data=category_data,
-                          manufacturer_labels=manufacturer_labels,
-                          manufacturer_percentages=manufacturer_percentages,
-                          manufacturer_colors=manufacturer_colors[:len(manufacturer_labels)],
-                          returnable_count=returnable_count,
-                          non_returnable_count=non_returnable_count)
-
-def parse_pdf_to_csv(pdf_file):
-    """Parse PDF file and extract tabular data to CSV format."""
-    csv_data = []
-
-    with pdfplumber.open(pdf_file) as pdf:
-        for page in pdf.pages:
-            # Extract tables from the page
-            tables = page.extract_tables()
-
-            for table in tables:
-                # Skip empty tables
-                if not table or len(table) < 2:
-                    continue
-
-                # Assume first row is headers
-                headers = [str(cell).strip() if cell else '' for cell in table[0]]
+@read_only
+def search_page():
+    query_text = request.args.get('q', '').strip()
+    kinds = [kind for kind in request.args.getlist('kind') if kind in SEARCH_KINDS]
+    limit = parse_per_page(request.args.get('limit'), default=20)
+
+    started = time.perf_counter()
+    hits = search(query_text, kinds, limit) if query_text else []
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'query': query_text,
+            'elapsed_ms': round(elapsed_ms, 2),
+            'results': [{'kind': hit.kind, 'id': hit.ref_id, 'code': hit.code, 'return_no': hit.return_no,
+                         'snippet': str(hit.snippet), 'score': hit.score, 'url': search_hit_url(hit)}
+                        for hit in hits],
+        })
+    return render_template('search.html', q=query_text, kinds=kinds, hits=hits, elapsed_ms=elapsed_ms,
+                           search_kinds=SEARCH_KINDS, hit_url=search_hit_url)
 
-                # Process data rows
-                for row in table[1:]:
-                    row_data = {}
-                    for i, cell in enumerate(row):
-                        if i < len(headers):
-                            row_data[headers[i]] = str(cell).strip() if cell else ''
+def search_hit_url(hit):
+    if hit.kind == 'check':
+        return url_for('check_details', id=hit.ref_id)
+    return url_for('return_details', return_no=hit.return_no)
 
-                    # Only add rows that have some data
-                    if any(row_data.values()):
-                        csv_data.append(row_data)
+# --- Day 11: Reports Route ---
 
-    return csv_data
+@app.route('/reports')
+@login_required
+@read_only
+def reports():
+    return render_template('reports.html', **compute_report_data())
 
 @app.route('/pdf_upload/<return_no>', methods=['POST'])
 @login_required
@@ -1164,163 +977,124 @@ def pdf_upload(return_no):
     if form.validate_on_submit():
         pdf_file = form.pdf_file.data
         if pdf_file and pdf_file.filename.endswith('.pdf'):
-            try:
-                # Parse PDF to extract tabular data
-                csv_data = parse_pdf_to_csv(pdf_file)
-
-                if not csv_data:
-                    flash('No tabular data found in the PDF file.', 'warning')
-                    return redirect(url_for('add_item', return_no=return_no))
-
-                # Create CSV content for download/review
-                output = io.StringIO()
-                if csv_data:
-                    fieldnames = csv_data[0].keys()
-                    writer = csv.DictWriter(output, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(csv_data)
-
-                # Store the parsed CSV data in session or temporary file for review
-                # For now, we'll create a downloadable CSV file
-                csv_content = output.getvalue()
-
-                # Create a response with the CSV file
-                response = send_file(
-                    io.BytesIO(csv_content.encode('utf-8')),
-                    as_attachment=True,
-                    download_name=f'parsed_data_{return_no}.csv',
-                    mimetype='text/csv'
-                )
-
-                flash('PDF parsed successfully! Download the CSV file to review the extracted data before uploading.', 'success')
-                return response
+            if wants_background():
+                job = jobs.enqueue('pdf_upload', current_user.id,
+                                   params={'return_no': return_no}, uploads={'pdf_path': pdf_file})
+                flash('PDF queued for parsing. The CSV will be available for download when the job finishes.', 'info')
+                return redirect(url_for('job_status_page', job_uuid=job.job_uuid))
 
+            try:
+                # Parse PDF to extract tabular data, reusing an earlier parse of the same file
+                digest = parse_with_cache(pdf_file, parse_cache_dir(), workers=app.config['PDF_PARSE_WORKERS'],
+                                          max_bytes=app.config['PDF_PARSE_CACHE_MAX_BYTES'])
             except Exception as e:
                 flash(f'Error parsing PDF: {str(e)}', 'danger')
+                return redirect(url_for('add_item', return_no=return_no))
+
+            return redirect(url_for('pdf_import_preview', return_no=return_no, digest=digest))
         else:
             flash('Please upload a valid PDF file.', 'danger')
 
     return redirect(url_for('add_item', return_no=return_no))
 
-def generate_return_letter_pdf(return_report):
-    """Generate a PDF return letter for a specific return report."""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=1,  # Center
+def parse_cache_dir():
+    return os.path.join(app.instance_path, 'parse_cache')
+
+def get_cached_rows_or_404(digest):
+    rows = cached_rows(parse_cache_dir(), digest)
+    if rows is None:
+        abort(404)
+    return rows
+
+@app.route('/pdf_import/<return_no>/<digest>')
+@login_required
+def pdf_import_preview(return_no, digest):
+    return_report = ReturnReport.query.filter_by(return_no=return_no).first_or_404()
+    preview_rows = [row for _, row in islice(normalize_rows(get_cached_rows_or_404(digest)), app.config['PDF_PREVIEW_ROWS'])]
+
+    # Dry run of the ingestion path so the user sees exactly what a commit would do
+    valid_count, errors = ingest_return_items(
+        normalize_rows(get_cached_rows_or_404(digest)),
+        return_report.id,
+        ingest_error_dir(),
+        chunk_size=app.config['INGEST_CHUNK_SIZE'],
+        dry_run=True
     )
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=20,
+
+    if not valid_count and not errors.count:
+        flash('No tabular data found in the PDF file.', 'warning')
+        return redirect(url_for('add_item', return_no=return_no))
+
+    return render_template('pdf_import_preview.html',
+                           title='Review Parsed PDF',
+                           return_report=return_report,
+                           digest=digest,
+                           columns=REQUIRED_FIELDS,
+                           preview_rows=preview_rows,
+                           valid_count=valid_count,
+                           errors=errors)
+
+@app.route('/pdf_import/<return_no>/<digest>/commit', methods=['POST'])
+@login_required
+def pdf_import_commit(return_no, digest):
+    return_report = ReturnReport.query.filter_by(return_no=return_no).first_or_404()
+    rows = get_cached_rows_or_404(digest)
+
+    if wants_background():
+        rows.close()
+        job = jobs.enqueue('pdf_import', current_user.id,
+                           params={'return_report_id': return_report.id, 'digest': digest})
+        flash('PDF import queued for processing.', 'info')
+        return redirect(url_for('job_status_page', job_uuid=job.job_uuid))
+
+    items_added, errors = ingest_return_items(
+        normalize_rows(rows),
+        return_report.id,
+        ingest_error_dir(),
+        chunk_size=app.config['INGEST_CHUNK_SIZE'],
+        source='pdf'
     )
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=12,
-        spaceAfter=12,
+    if items_added > 0:
+        flash(f'Successfully added {items_added} items from PDF!', 'success')
+    if errors.count:
+        flash_ingest_errors(errors)
+    return redirect(url_for('return_details', return_no=return_no))
+
+@app.route('/pdf_import/<return_no>/<digest>/csv')
+@login_required
+def pdf_import_csv(return_no, digest):
+    output = io.StringIO()
+    write_parsed_csv(get_cached_rows_or_404(digest), output)
+    return send_file(
+        io.BytesIO(output.getvalue().encode('utf-8')),
+        as_attachment=True,
+        download_name=f'parsed_data_{return_no}.csv',
+        mimetype='text/csv'
     )
 
-    story = []
-
-    # Header with logo placeholder (since we don't have actual logos)
-    story.append(Paragraph("PHARMARETURNS PROCESSING CENTER", title_style))
-    story.append(Spacer(1, 20))
-
-    # Letter details
-    story.append(Paragraph("Return Acknowledgment Letter", subtitle_style))
-    story.append(Spacer(1, 12))
-
-    story.append(Paragraph(f"Return Number: {return_report.return_no}", normal_style))
-    story.append(Paragraph(f"Invoice Date: {return_report.invoice_date.strftime('%B %d, %Y')}", normal_style))
-    story.append(Paragraph(f"Service Type: {return_report.service_type}", normal_style))
-    story.append(Spacer(1, 20))
-
-    # Summary table
-    story.append(Paragraph("Return Summary:", subtitle_style))
-
-    summary_data = [
-        ['ERV', 'Credit Received', 'Fees', 'Amount Paid', 'Last Payment Date'],
-        [
-            f"${return_report.ERV:.2f}",
-            f"${return_report.credit_received:.2f}",
-            f"${return_report.fees:.2f}",
-            f"${return_report.amount_paid:.2f}",
-            return_report.last_payment_date.strftime('%Y-%m-%d')
-        ]
-    ]
-
-    summary_table = Table(summary_data)
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-
-    story.append(summary_table)
-    story.append(Spacer(1, 20))
-
-    # Manufacturer breakdown
-    if return_report.breakdowns:
-        story.append(Paragraph("Manufacturer Breakdown:", subtitle_style))
-
-        breakdown_data = [['Manufacturer', 'ERV', 'Expiration Date']]
-        for breakdown in return_report.breakdowns:
-            breakdown_data.append([
-                breakdown.manufacturer_name,
-                f"${breakdown.ERV:.2f}",
-                breakdown.expiration_date.strftime('%Y-%m-%d')
-            ])
-
-        breakdown_table = Table(breakdown_data)
-        breakdown_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-
-        story.append(breakdown_table)
-        story.append(Spacer(1, 20))
-
-    # Closing
-    story.append(Paragraph("Thank you for your return submission. This letter serves as acknowledgment of receipt.", normal_style))
-    story.append(Spacer(1, 20))
-    story.append(Paragraph("Sincerely,", normal_style))
-    story.append(Spacer(1, 30))
-    story.append(Paragraph("PharmaReturns Processing Team", normal_style))
-    story.append(Paragraph("_______________________________", normal_style))
-    story.append(Paragraph("Signature", normal_style))
-
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+def write_parsed_csv(pdf_rows, output):
+    """Stream parsed PDF rows to a text stream, using the first row's keys as header. Returns the row count."""
+    writer = None
+    row_count = 0
+    for row in pdf_rows:
+        if writer is None:
+            writer = csv.DictWriter(output, fieldnames=row.keys())
+            writer.writeheader()
+        writer.writerow(row)
+        row_count += 1
+    return row_count
 
 @app.route('/reports/<return_no>/pdf')
 @login_required
 def download_return_letter(return_no):
+    from pdf_render import generate_return_letter_pdf
+
     return_report = ReturnReport.query.filter_by(return_no=return_no).first_or_404()
-    pdf_buffer = generate_return_letter_pdf(return_report)
+    pdf_path = pdf_cache.get_or_build('return_letter', return_report.return_no, return_state_version(return_report),
+                                      lambda: generate_return_letter_pdf(return_report))
 
     return send_file(
-        pdf_buffer,
+        pdf_path,
         as_attachment=True,
         download_name=f'return_letter_{return_no}.pdf',
         mimetype='application/pdf'
@@ -1328,67 +1102,21 @@ def download_return_letter(return_no):
 
 @app.route('/reports/summary')
 @login_required
+@read_only
 def reports_summary():
-    # Aggregate totals
-    total_erv = db.session.query(db.func.sum(ReturnReport.ERV)).scalar() or 0
-    total_credits = db.session.query(db.func.sum(ReturnReport.credit_received)).scalar() or 0
-    total_fees = db.session.query(db.func.sum(ReturnReport.fees)).scalar() or 0
-
-    # Compute classification-based values
-    short_dated_value = db.session.query(db.func.sum(ReturnItem.extended_price)).join(Reason).filter(Reason.name == 'Short Dated').scalar() or 0
-    outdated_value = db.session.query(db.func.sum(ReturnItem.extended_price)).join(Reason).filter(Reason.name == 'Outdated').scalar() or 0
-    non_returnable_value = db.session.query(db.func.sum(ReturnItem.extended_price)).join(Reason).filter(Reason.name == 'Non-Returnable').scalar() or 0
-
-    # Aggregated manufacturer data
-    manufacturer_data = db.session.query(
-        ManufacturerBreakdown.manufacturer_name,
-        db.func.sum(ManufacturerBreakdown.ERV).label('total_erv'),
-        db.func.count(ManufacturerBreakdown.id).label('return_count')
-    ).group_by(ManufacturerBreakdown.manufacturer_name).all()
-
-    # Add percentages to manufacturer data
-    for m in manufacturer_data:
-        m.percentage = (m.total_erv / total_erv * 100) if total_erv > 0 else 0
-
-    # Aggregated category data
-    category_data = db.session.query(
-        ReturnCategory.name,
-        db.func.sum(ReturnItem.extended_price).label('total_value'),
-        db.func.count(ReturnItem.id).label('item_count')
-    ).join(ReturnItem).group_by(ReturnCategory.name).all()
-
-    # Data for charts
-    manufacturer_labels = [m.manufacturer_name for m in manufacturer_data]
-    manufacturer_percentages = [m.percentage for m in manufacturer_data]
-    manufacturer_colors = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40', '#FF6384', '#C9CBCF']
-
-    # Returnable vs Non-Returnable counts
-    returnable_count = db.session.query(db.func.count(ReturnItem.id)).join(Reason).filter(Reason.name == 'Returnable').scalar() or 0
-    non_returnable_count = db.session.query(db.func.count(ReturnItem.id)).join(Reason).filter(Reason.name.in_(['Non-Returnable', 'Outdated', 'Short Dated'])).scalar() or 0
-
-    return render_template('reports.html',
-                          total_erv=total_erv,
-                          total_credits=total_credits,
-                          total_fees=total_fees,
-                          short_dated_value=short_dated_value,
-                          outdated_value=outdated_value,
-                          non_returnable_value=non_returnable_value,
-                          manufacturer_data=manufacturer_data,
-                          category_data=category_data,
-                          manufacturer_labels=manufacturer_labels,
-                          manufacturer_percentages=manufacturer_percentages,
-                          manufacturer_colors=manufacturer_colors[:len(manufacturer_labels)],
-                          returnable_count=returnable_count,
-                          non_returnable_count=non_returnable_count)
+    return render_template('reports.html', **compute_report_data())
 
 @app.route('/reports/returnable_nonreturnable')
 @login_required
+@read_only
 def reports_returnable_nonreturnable():
     # Get returnable items from ManufacturerBreakdown (data from /new_return)
-    returnable_items = ManufacturerBreakdown.query.all()
+    returnable_items = ManufacturerBreakdown.query.options(joinedload(ManufacturerBreakdown.return_report)).all()
 
-    # Get non-returnable items
-    non_returnable_items = db.session.query(ReturnItem).join(Reason).filter(Reason.name.in_(['Non-Returnable', 'Outdated', 'Short Dated'])).all()
+    # Get non-returnable items, with the return and reason the table shows loaded in the same query
+    non_returnable_items = db.session.query(ReturnItem).join(ReturnItem.reason).filter(
+        Reason.name.in_(['Non-Returnable', 'Outdated', 'Short Dated'])
+    ).options(contains_eager(ReturnItem.reason), joinedload(ReturnItem.return_report)).all()
 
     # Calculate totals
     returnable_total = sum(item.ERV for item in returnable_items)
@@ -1404,115 +1132,15 @@ def reports_returnable_nonreturnable():
 
 @app.route('/reports/returnable_nonreturnable/pdf')
 @login_required
+@read_only
 def reports_returnable_nonreturnable_pdf():
-    # For now, use ReportLab to generate PDF since WeasyPrint has installation issues on Windows
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.lib import colors
-    from io import BytesIO
-
-    # Get returnable items from ManufacturerBreakdown (data from /new_return)
-    returnable_items = ManufacturerBreakdown.query.all()
-
-    # Get non-returnable items
-    non_returnable_items = db.session.query(ReturnItem).join(Reason).filter(Reason.name.in_(['Non-Returnable', 'Outdated', 'Short Dated'])).all()
-
-    # Calculate totals
-    returnable_total = sum(item.ERV for item in returnable_items)
-    non_returnable_total = sum(item.extended_price for item in non_returnable_items)
-    grand_total = returnable_total + non_returnable_total
+    if wants_background():
+        job = jobs.enqueue('returnable_nonreturnable_pdf', current_user.id)
+        flash('Report queued. The PDF will be available for download when the job finishes.', 'info')
+        return redirect(url_for('job_status_page', job_uuid=job.job_uuid))
 
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=1,  # Center
-    )
-    section_style = ParagraphStyle(
-        'SectionStyle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=20,
-    )
-
-    story = []
-
-    # Title
-    story.append(Paragraph("Returnable / Non-Returnable Report", title_style))
-    story.append(Spacer(1, 20))
-
-    # Returnable Items Section
-    story.append(Paragraph("Returnable Items", section_style))
-
-    if returnable_items:
-        data = [['Return No', 'Manufacturer', 'ERV', 'Expiration Date']]
-        for item in returnable_items:
-            data.append([
-                item.return_report.return_no,
-                item.manufacturer_name,
-                f"${item.ERV:.2f}",
-                item.expiration_date.strftime('%Y-%m-%d')
-            ])
-
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.green),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        story.append(table)
-        story.append(Spacer(1, 20))
-
-    # Non-Returnable Items Section
-    story.append(Paragraph("Non-Returnable Items", section_style))
-
-    if non_returnable_items:
-        data = [['Return No', 'NDC', 'Description', 'Lot No', 'Exp Date', 'Manufacturer', 'Reason', 'Extended Price']]
-        for item in non_returnable_items:
-            data.append([
-                item.return_report.return_no,
-                item.ndc,
-                item.description,
-                item.lot_no,
-                item.exp_date.strftime('%Y-%m-%d'),
-                item.manufacturer,
-                item.reason.name,
-                f"${item.extended_price:.2f}"
-            ])
-
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.red),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        story.append(table)
-        story.append(Spacer(1, 20))
-
-    # Totals
-    story.append(Paragraph("Totals", section_style))
-    story.append(Paragraph(f"Returnable Total: ${returnable_total:.2f}", styles['Normal']))
-    story.append(Paragraph(f"Non-Returnable Total: ${non_returnable_total:.2f}", styles['Normal']))
-    story.append(Paragraph(f"Grand Total: ${grand_total:.2f}", styles['Normal']))
-
-    doc.build(story)
+    build_returnable_nonreturnable_pdf(buffer)
     buffer.seek(0)
 
     return send_file(
@@ -1522,74 +1150,112 @@ def reports_returnable_nonreturnable_pdf():
         mimetype='application/pdf'
     )
 
-@app.route('/export_excel')
-@login_required
-def export_excel():
-    # Get filters from request args
-    manufacturer = request.args.get('manufacturer', '')
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    category = request.args.get('category', '')
-
-    # Query return items with joins
-    query = db.session.query(ReturnItem).join(ReturnReport).join(Reason).join(ReturnCategory)
-
-    if manufacturer:
-        query = query.filter(ReturnItem.manufacturer.ilike(f'%{manufacturer}%'))
-    if start_date:
-        query = query.filter(ReturnReport.invoice_date >= start_date)
-    if end_date:
-        query = query.filter(ReturnReport.invoice_date <= end_date)
-    if category:
-        query = query.filter(ReturnCategory.name.ilike(f'%{category}%'))
-
-    items = query.all()
-
-    # Create DataFrame
-    data = []
-    for item in items:
-        data.append({
-            'Return No': item.return_report.return_no,
-            'Invoice Date': item.return_report.invoice_date.strftime('%Y-%m-%d') if item.return_report.invoice_date else '',
-            'NDC': item.ndc,
-            'Description': item.description,
-            'Lot No': item.lot_no,
-            'Exp Date': item.exp_date.strftime('%Y-%m-%d'),
-            'Pkg Size': item.pkg_size,
-            'Full Qty': item.full_qty,
-            'Partial Qty': item.partial_qty,
-            'Unit Price': item.unit_price,
-            'Extended Price': item.extended_price,
-            'Category': item.category.name if item.category else '',
-            'Reason': item.reason.name,
-            'Manufacturer': item.manufacturer
-        })
-
-    df = pd.DataFrame(data)
+@time_document('pdf', 'returnable_nonreturnable')
+def build_returnable_nonreturnable_pdf(output):
+    """Render the returnable / non-returnable report to a filename or binary stream.
 
-    # Create Excel file in memory
-    from io import BytesIO
-    buffer = BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Returns_Report', index=False)
-
-    buffer.seek(0)
+    Rows are streamed from the database straight into page-sized tables, so
+    memory stays flat however many items the report covers.
+    """
+    from pdf_render import DB_FETCH_SIZE, build_pdf, returnable_nonreturnable_story
 
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name='Returns_Report.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    # For now, use ReportLab to generate PDF since WeasyPrint has installation issues on Windows
+    non_returnable_reasons = ['Non-Returnable', 'Outdated', 'Short Dated']
+
+    # Joins go through the relationships declared on ReturnReport; the backrefs only
+    # exist once the mappers are configured, which a fresh job worker may not have done.
+    # Returnable items come from ManufacturerBreakdown (data from /new_return)
+    returnable = db.session.query(
+        ReturnReport.return_no, ManufacturerBreakdown.manufacturer_name,
+        ManufacturerBreakdown.ERV, ManufacturerBreakdown.expiration_date
+    ).join(ReturnReport.breakdowns).order_by(ManufacturerBreakdown.id).yield_per(DB_FETCH_SIZE)
+
+    non_returnable = db.session.query(
+        ReturnReport.return_no, ReturnItem.ndc, ReturnItem.description, ReturnItem.lot_no,
+        ReturnItem.exp_date, ReturnItem.manufacturer, Reason.name, ReturnItem.extended_price
+    ).join(ReturnReport.items).join(ReturnItem.reason).filter(
+        Reason.name.in_(non_returnable_reasons)
+    ).order_by(ReturnItem.id).yield_per(DB_FETCH_SIZE)
+
+    returnable_rows = ([return_no, manufacturer, f"${erv:.2f}", exp_date.strftime('%Y-%m-%d')]
+                       for return_no, manufacturer, erv, exp_date in returnable)
+    non_returnable_rows = ([return_no, ndc, description, lot_no, exp_date.strftime('%Y-%m-%d'),
+                            manufacturer, reason, f"${extended_price:.2f}"]
+                           for return_no, ndc, description, lot_no, exp_date, manufacturer, reason, extended_price
+                           in non_returnable)
+
+    def totals():
+        returnable_total = db.session.query(db.func.sum(ManufacturerBreakdown.ERV)).scalar() or 0
+        non_returnable_total = db.session.query(db.func.sum(ReturnItem.extended_price)).join(ReturnItem.reason).filter(
+            Reason.name.in_(non_returnable_reasons)).scalar() or 0
+        return returnable_total, non_returnable_total
+
+    build_pdf(output, returnable_nonreturnable_story(returnable_rows, non_returnable_rows, totals))
+
+@app.route('/export_excel', defaults={'fmt': 'excel'})
+@app.route('/export/<fmt>')
+@login_required
+@read_only
+def export_data(fmt):
+    """The filtered return items as Excel, CSV, NDJSON or Parquet."""
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    # Get filters from request args
+    filters = {
+        'manufacturer': request.args.get('manufacturer', ''),
+        'start_date': request.args.get('start_date', ''),
+        'end_date': request.args.get('end_date', ''),
+        'category': request.args.get('category', ''),
+        'match': request.args.get('match', ''),
+    }
+
+    if wants_background():
+        job = jobs.enqueue('export', current_user.id, params=dict(filters, format=fmt))
+        flash('Export queued. The file will be available for download when the job finishes.', 'info')
+        return redirect(url_for('job_status_page', job_uuid=job.job_uuid))
+
+    download_name, mimetype = EXPORT_FORMATS[fmt]
+    if fmt in STREAMED_EXPORTS:
+        response = Response(stream_with_context(iter_export(fmt, filters)), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+        return response
+
+    # openpyxl and pyarrow finish the file when it is closed, so it is spooled to an
+    # anonymous temporary file that send_file streams and closes (removing it) afterwards
+    output = tempfile.TemporaryFile()
+    EXPORT_BUILDERS[fmt](filters, output)
+    output.seek(0)
+    return send_file(output, as_attachment=True, download_name=download_name, mimetype=mimetype)
+
+STREAMED_EXPORTS = {'csv': iter_csv, 'ndjson': iter_ndjson}
+
+def iter_export(fmt, filters):
+    """Encoded pieces of a CSV or NDJSON export, one per chunk of rows."""
+    with time_document(fmt, 'returns_report'):
+        yield from STREAMED_EXPORTS[fmt](iter_export_chunks(filters))
+
+@time_document('excel', 'returns_report')
+def build_excel_export(filters, output):
+    """Write the filtered return items workbook to a filename or binary stream. Returns the row count."""
+    return write_excel(iter_export_chunks(filters), output)
+
+@time_document('parquet', 'returns_report')
+def build_parquet_export(filters, output):
+    """Write the filtered return items to a Parquet filename or binary stream. Returns the row count."""
+    return write_parquet(iter_export_chunks(filters, chunk_size=PARQUET_ROW_GROUP_SIZE), output)
+
+EXPORT_BUILDERS = {'excel': build_excel_export, 'parquet': build_parquet_export}
 
 @app.route('/manufacturer/<name>')
 @login_required
+@read_only
 def manufacturer_details(name):
     # Get all return reports for this manufacturer
     manufacturer_breakdowns = ManufacturerBreakdown.query.filter_by(manufacturer_name=name).all()
 
     # Get all items for this manufacturer
-    items = ReturnItem.query.filter_by(manufacturer=name).all()
+    items = ReturnItem.query.filter_by(manufacturer=name).options(
+        joinedload(ReturnItem.return_report), joinedload(ReturnItem.category), joinedload(ReturnItem.reason)).all()
 
     # Calculate subtotals
     total_erv = sum(bd.ERV for bd in manufacturer_breakdowns)
@@ -1614,14 +1280,234 @@ def manufacturer_details(name):
                          total_extended_price=total_extended_price,
                          returns_data=returns_data)
 
+# --- BACKGROUND JOBS ---
+
+@jobs.handler('bulk_upload')
+def run_bulk_upload_job(ctx):
+    with open(ctx.params['csv_path'], 'rb') as csv_file:
+        items_added, errors = ingest_return_items(
+            iter_csv_rows(csv_file),
+            ctx.params['return_report_id'],
+            ctx.directory,
+            chunk_size=app.config['INGEST_CHUNK_SIZE'],
+            progress=ctx.set_progress
+        )
+    if errors.count:
+        os.replace(errors.path, ctx.result_file('upload_errors.csv', 'text/csv'))
+    return f'Added {items_added} items; {errors.count} rows rejected.'
+
+@jobs.handler('pdf_upload')
+def run_pdf_upload_job(ctx):
+    digest = parse_with_cache(ctx.params['pdf_path'], parse_cache_dir(), workers=app.config['PDF_PARSE_WORKERS'],
+                              max_bytes=app.config['PDF_PARSE_CACHE_MAX_BYTES'])
+    pdf_rows = cached_rows(parse_cache_dir(), digest)
+    with open(ctx.result_file(f"parsed_data_{ctx.params['return_no']}.csv", 'text/csv'), 'w', newline='', encoding='utf-8') as output:
+        row_count = write_parsed_csv(pdf_rows, output)
+    if not row_count:
+        ctx.result = None
+        return 'No tabular data found in the PDF file.'
+    return f'Parsed {row_count} rows.'
+
+@jobs.handler('pdf_import')
+def run_pdf_import_job(ctx):
+    rows = cached_rows(parse_cache_dir(), ctx.params['digest'])
+    if rows is None:
+        raise LookupError('Parsed PDF data is no longer cached; upload the PDF again.')
+    items_added, errors = ingest_return_items(
+        normalize_rows(rows),
+        ctx.params['return_report_id'],
+        ctx.directory,
+        chunk_size=app.config['INGEST_CHUNK_SIZE'],
+        progress=ctx.set_progress,
+        source='pdf'
+    )
+    if errors.count:
+        os.replace(errors.path, ctx.result_file('import_errors.csv', 'text/csv'))
+    return f'Added {items_added} items; {errors.count} rows rejected.'
+
+@jobs.handler('export')
+def run_export_job(ctx):
+    fmt = ctx.params['format']
+    path = ctx.result_file(*EXPORT_FORMATS[fmt])
+    if fmt in STREAMED_EXPORTS:
+        with open(path, 'wb') as output:
+            output.writelines(iter_export(fmt, ctx.params))
+        return 'Export written.'
+    row_count = EXPORT_BUILDERS[fmt](ctx.params, path)
+    return f'Exported {row_count} rows.'
+
+@jobs.handler('export_excel')
+def run_export_excel_job(ctx):
+    # Excel exports queued before the export job took a format
+    path = ctx.result_file(*EXPORT_FORMATS['excel'])
+    row_count = build_excel_export(ctx.params, path)
+    return f'Exported {row_count} rows.'
+
+@jobs.handler('returnable_nonreturnable_pdf')
+def run_returnable_nonreturnable_pdf_job(ctx):
+    build_returnable_nonreturnable_pdf(ctx.result_file('returnable_nonreturnable_report.pdf', 'application/pdf'))
+    return 'Report generated.'
+
+@jobs.handler('batch_export')
+def run_batch_export_job(ctx):
+    kind, fmt = ctx.params['kind'], ctx.params['format']
+    documents = batch_export_documents(kind, ctx.params)
+    ctx.set_progress(0, total=len(documents))
+    rendered = batch_exporter.iter_rendered(documents, progress=ctx.set_progress)
+    name = batch_export_name(kind, ctx.params, fmt)
+    # Queue behind interactive exports rather than running beside them
+    batch_exporter.acquire(blocking=True)
+    try:
+        if fmt == 'pdf':
+            write_merged_pdf(rendered, ctx.result_file(name, 'application/pdf'))
+        else:
+            with open(ctx.result_file(name, 'application/zip'), 'wb') as output:
+                for chunk in iter_zip(rendered):
+                    output.write(chunk)
+    finally:
+        batch_exporter.release()
+    return f'Exported {len(documents)} documents.'
+
+@jobs.handler('archive_returns')
+def run_archive_returns_job(ctx):
+    cutoff = archive_cutoff(ctx.params.get('older_than_days', app.config['ARCHIVE_AFTER_DAYS']))
+    ctx.set_progress(0, total=ReturnReport.query.filter(ReturnReport.invoice_date < cutoff).count())
+    archived = archive_return_trees(db.session, cutoff, app.config['ARCHIVE_BATCH_SIZE'], progress=ctx.set_progress)
+    forget_return_reports([return_no for _, return_no in archived])
+    return f'Archived {len(archived)} returns invoiced before {cutoff:%Y-%m-%d}.'
+
+def get_job_or_404(job_uuid):
+    job = Job.query.filter_by(job_uuid=job_uuid).first_or_404()
+    if job.user_id != current_user.id and current_user.role != 'admin':
+        abort(404)
+    return job
+
+@app.route('/jobs/<job_uuid>')
+@login_required
+def job_status_page(job_uuid):
+    job = get_job_or_404(job_uuid)
+    return render_template('job_status.html', title='Background Job', job=job)
+
+@app.route('/jobs/<job_uuid>/status')
+@login_required
+def job_status(job_uuid):
+    return jsonify(job_status_dict(get_job_or_404(job_uuid)))
+
+@app.route('/jobs/<job_uuid>/download')
+@login_required
+def download_job_result(job_uuid):
+    job = get_job_or_404(job_uuid)
+    if job.status != 'Finished' or not job.result_path or not os.path.exists(job.result_path):
+        abort(404)
+    return send_file(job.result_path, as_attachment=True, download_name=job.result_name, mimetype=job.result_mimetype)
+
+@app.cli.command('run-jobs')
+def run_jobs_command():
+    """Run queued background jobs in this process, then exit."""
+    print(f"Ran {jobs.run_pending()} queued jobs.")
+
+@app.cli.command('batch-export')
+@click.argument('kind', type=click.Choice(BATCH_EXPORT_KINDS))
+@click.option('--date', 'day', help='Submission date for manifests (YYYY-MM-DD, default today).')
+@click.option('--status', default='Submitted', show_default=True, help='Submission status for manifests.')
+@click.option('--start-date', help='First invoice date for return letters (YYYY-MM-DD).')
+@click.option('--end-date', help='Last invoice date for return letters (YYYY-MM-DD).')
+@click.option('--format', 'fmt', type=click.Choice(['zip', 'pdf']), default='zip', show_default=True)
+@click.option('--output', '-o', help='Output file (default derived from the selection).')
+def batch_export_command(kind, day, status, start_date, end_date, fmt, output):
+    """Render manifests or return letters in bulk into a ZIP or one merged PDF."""
+    params = {'date': day, 'status': status, 'start_date': start_date, 'end_date': end_date}
+    try:
+        documents = batch_export_documents(kind, params)
+    except (KeyError, TypeError, ValueError):
+        raise click.UsageError('Return letters need --start-date and --end-date as YYYY-MM-DD.')
+    output = output or batch_export_name(kind, params, fmt)
+    rendered = batch_exporter.iter_rendered(documents)
+    if fmt == 'pdf':
+        write_merged_pdf(rendered, output)
+    else:
+        with open(output, 'wb') as f:
+            for chunk in iter_zip(rendered):
+                f.write(chunk)
+    print(f"Wrote {len(documents)} documents to {output}.")
+
+@app.cli.command('init-db')
+@click.option('--seed', is_flag=True, help='Also load the sample data (same as seed-db).')
+def init_db_command(seed):
+    """Create the tables, rollups and search index that are missing."""
+    init_database()
+    print("Database schema is up to date.")
+    if seed:
+        seed_sample_data()
+
+@app.cli.command('seed-db')
+def seed_db_command():
+    """Load the sample NDCs, reasons, returns and users into empty tables."""
+    seed_sample_data()
+    print("Sample data loaded.")
+
+@app.cli.command('refresh-replica')
+@click.option('--interval', type=float, help='Keep taking a snapshot every INTERVAL seconds.')
+def refresh_replica_command(interval):
+    """Copy a snapshot of the SQLite database to the SQLite replica bind."""
+    engines = db.engines
+    if REPLICA_BIND not in engines:
+        raise click.UsageError('Set REPLICA_DATABASE_URL to use a replica.')
+    primary, replica = engines[None].url, engines[REPLICA_BIND].url
+    if primary.get_backend_name() != 'sqlite' or replica.get_backend_name() != 'sqlite':
+        raise click.UsageError('Snapshots copy SQLite to SQLite; a PostgreSQL replica is kept current by replication.')
+    while True:
+        snapshot_sqlite(primary.database, replica.database)
+        print(f"Replica refreshed from {primary.database}.")
+        if not interval:
+            break
+        time.sleep(interval)
+
+@app.cli.command('archive-returns')
+@click.option('--older-than-days', type=int, help='Archive returns invoiced more than this many days ago (default ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, help='Returns moved per transaction (default ARCHIVE_BATCH_SIZE).')
+def archive_returns_command(older_than_days, batch_size):
+    """Move old returns with their items and breakdowns into the archive tables."""
+    cutoff = archive_cutoff(older_than_days if older_than_days is not None else app.config['ARCHIVE_AFTER_DAYS'])
+    archived = archive_return_trees(db.session, cutoff, batch_size or app.config['ARCHIVE_BATCH_SIZE'])
+    forget_return_reports([return_no for _, return_no in archived])
+    print(f"Archived {len(archived)} returns invoiced before {cutoff:%Y-%m-%d}.")
+
+@app.cli.command('create-indexes')
+def create_indexes_command():
+    """Create the model indexes missing from an existing database."""
+    inspector = db.inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+    print(f"Created {len(created)} indexes." + (f" ({', '.join(sorted(created))})" if created else ''))
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Re-create the full-text search index from returns, items and checks."""
+    rebuild_search_index()
+    print("Search index rebuilt.")
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the reporting rollup tables from returns, items and breakdowns."""
+    rebuild_rollups()
+    print("Reporting rollups rebuilt.")
+
 # --- ADMIN ROUTES ---
 
 @app.route('/admin/reasons')
 @login_required
 @admin_required
 def admin_reasons():
-    reasons = Reason.query.all()
-    return render_template('admin_reasons.html', reasons=reasons)
+    page = paginate_list(Reason.query, [(Reason.id, False)])
+    return render_template('admin_reasons.html', reasons=page.items, page=page)
 
 @app.route('/admin/reasons/add', methods=['GET', 'POST'])
 @login_required
@@ -1643,6 +1529,7 @@ def add_reason():
         new_reason = Reason(name=name, description=description)
         db.session.add(new_reason)
         db.session.commit()
+        invalidate_reference_data()
         flash('Reason added successfully!', 'success')
         return redirect(url_for('admin_reasons'))
 
@@ -1671,6 +1558,7 @@ def edit_reason(id):
         reason.name = name
         reason.description = description
         db.session.commit()
+        invalidate_reference_data()
         flash('Reason updated successfully!', 'success')
         return redirect(url_for('admin_reasons'))
 
@@ -1690,17 +1578,50 @@ def delete_reason(id):
 
     db.session.delete(reason)
     db.session.commit()
+    invalidate_reference_data()
     flash('Reason deleted successfully!', 'success')
     return redirect(url_for('admin_reasons'))
 
+@app.route('/metrics')
+def metrics():
+    # Scraped by Prometheus; see RequestMetrics.authorized for who may read it
+    if not request_metrics.authorized():
+        abort(403)
+    return Response(render_metrics(), mimetype=CONTENT_TYPE_LATEST)
+
+@app.route('/admin/cache/stats')
+@login_required
+@admin_required
+def admin_cache_stats():
+    return jsonify([reference_cache.stats(), dashboard_cache.stats(), pdf_cache.stats()])
+
+@app.route('/admin/sql_stats')
+@login_required
+@admin_required
+def admin_sql_stats():
+    endpoints = query_stats.endpoint_stats()
+    if request.args.get('format') == 'json':
+        return jsonify({'since': query_stats.since.isoformat(), 'endpoints': endpoints,
+                        'slow_queries': [dict(entry, at=entry['at'].isoformat()) for entry in query_stats.slow_queries]})
+    return render_template('admin_sql_stats.html', endpoints=endpoints, slow_queries=list(query_stats.slow_queries),
+                           since=query_stats.since, threshold_ms=app.config['SLOW_QUERY_THRESHOLD_MS'])
+
+@app.route('/admin/sql_stats/reset', methods=['POST'])
+@login_required
+@admin_required
+def reset_sql_stats():
+    query_stats.reset()
+    flash('SQL statistics reset.', 'success')
+    return redirect(url_for('admin_sql_stats'))
+
 # --- ADMIN USER MANAGEMENT ROUTES ---
 
 @app.route('/admin/users')
 @login_required
 @admin_required
 def admin_users():
-    users = User.query.all()
-    return render_template('admin_users.html', users=users)
+    page = paginate_list(User.query, [(User.id, False)])
+    return render_template('admin_users.html', users=page.items, page=page)
 
 @app.route('/admin/users/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -1764,8 +1685,8 @@ def delete_user(id):
 @login_required
 @admin_required
 def admin_returns():
-    returns = ReturnReport.query.all()
-    return render_template('admin_returns.html', returns=returns)
+    page = paginate_list(ReturnReport.query, [(ReturnReport.invoice_date, True), (ReturnReport.id, True)])
+    return render_template('admin_returns.html', returns=page.items, page=page)
 
 @app.route('/admin/returns/<return_no>/edit', methods=['GET', 'POST'])
 @login_required
@@ -1783,6 +1704,8 @@ def edit_return(return_no):
         return_report.last_payment_date = datetime.strptime(request.form.get('last_payment_date'), '%Y-%m-%d').date()
 
         db.session.commit()
+        invalidate_dashboard_metrics()
+        pdf_cache.invalidate('return_letter', return_report.return_no)
         flash('Return report updated successfully!', 'success')
         return redirect(url_for('admin_returns'))
 
@@ -1792,19 +1715,35 @@ def edit_return(return_no):
 @login_required
 @admin_required
 def delete_return(return_no):
-    return_report = ReturnReport.query.filter_by(return_no=return_no).first_or_404()
-
-    # Delete associated items and breakdowns
-    for item in return_report.items:
-        db.session.delete(item)
-    for breakdown in return_report.breakdowns:
-        db.session.delete(breakdown)
+    return_report_id = db.session.query(ReturnReport.id).filter_by(return_no=return_no).scalar()
+    if return_report_id is None:
+        abort(404)
 
-    db.session.delete(return_report)
+    # Items and breakdowns go with the return in set-based deletes
+    delete_return_trees(db.session, [return_report_id])
     db.session.commit()
+    forget_return_reports([return_no])
     flash('Return report and associated data deleted successfully!', 'success')
     return redirect(url_for('admin_returns'))
 
+@app.route('/admin/returns/archive', methods=['POST'])
+@login_required
+@admin_required
+def archive_returns():
+    job = jobs.enqueue('archive_returns', current_user.id,
+                       params={'older_than_days': app.config['ARCHIVE_AFTER_DAYS']})
+    flash('Archiving of old returns queued.', 'info')
+    return redirect(url_for('job_status_page', job_uuid=job.job_uuid))
+
+def forget_return_reports(return_nos):
+    """Drop cached data for returns that were deleted or archived."""
+    invalidate_dashboard_metrics()
+    for return_no in return_nos:
+        pdf_cache.invalidate('return_letter', return_no)
+
 if __name__ == '__main__':
     # Use Gunicorn or similar for production; Flask's development server for testing
+    with app.app_context():
+        init_database()
+        seed_sample_data()
     app.run(debug=True)
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, literal
+from models import db, ReturnReport, ReturnItem, ManufacturerBreakdown
+from models import ArchivedReturnReport, ArchivedReturnItem, ArchivedManufacturerBreakdown
+from rollups import subtract_return_trees
+from search_index import remove_documents
+
+# Live table -> archive table, children first so parents are deleted last
+TREE_TABLES = [
+    (ReturnItem.__table__, ArchivedReturnItem.__table__),
+    (ManufacturerBreakdown.__table__, ArchivedManufacturerBreakdown.__table__),
+    (ReturnReport.__table__, ArchivedReturnReport.__table__),
+]
+
+# Ids per IN (...) list, well under SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+def _owner_column(table):
+    return table.c.id if table is ReturnReport.__table__ else table.c.return_report_id
+
+def delete_return_trees(session, report_ids):
+    """Delete returns with their items and breakdowns in a few set-based statements.
+
+    The rollups and the search index are adjusted in the same transaction,
+    since Core DELETEs bypass the session events that normally keep them in
+    step. The caller commits.
+    """
+    connection = session.connection()
+    report_ids = sorted(set(report_ids))
+    for chunk_start in range(0, len(report_ids), CHUNK_SIZE):
+        chunk = report_ids[chunk_start:chunk_start + CHUNK_SIZE]
+        subtract_return_trees(connection, chunk)
+        item_ids = connection.execute(
+            select(ReturnItem.__table__.c.id).where(ReturnItem.__table__.c.return_report_id.in_(chunk))).scalars().all()
+        remove_documents(connection, ReturnItem, item_ids)
+        remove_documents(connection, ReturnReport, chunk)
+        for table, _ in TREE_TABLES:
+            connection.execute(delete(table).where(_owner_column(table).in_(chunk)))
+    # Objects already loaded for these rows are stale now
+    session.expire_all()
+    return len(report_ids)
+
+def archive_cutoff(older_than_days):
+    """Returns invoiced before this date are old enough to archive."""
+    return datetime.utcnow().date() - timedelta(days=older_than_days)
+
+def archive_return_trees(session, cutoff, batch_size=200, progress=None):
+    """Move returns invoiced before ``cutoff`` into the archive tables.
+
+    Each batch is copied, deleted and committed on its own, so locks are held
+    briefly and an interrupted run keeps the batches it finished. Returns
+    [(id, return_no)] of the archived returns. ``progress(done)`` is called
+    after each batch.
+    """
+    reports = ReturnReport.__table__
+    archived = []
+    while True:
+        connection = session.connection()
+        batch = connection.execute(
+            select(reports.c.id, reports.c.return_no).where(reports.c.invoice_date < cutoff)
+            .order_by(reports.c.invoice_date, reports.c.id).limit(batch_size)).all()
+        if not batch:
+            break
+        ids = [report_id for report_id, _ in batch]
+        archived_at = literal(datetime.utcnow(), db.DateTime)
+        for table, archive_table in TREE_TABLES:
+            columns = [column.name for column in table.columns]
+            connection.execute(insert(archive_table).from_select(
+                columns + ['archived_at'],
+                select(*[table.c[name] for name in columns], archived_at).where(_owner_column(table).in_(ids))))
+        delete_return_trees(session, ids)
+        session.commit()
+        archived.extend(batch)
+        if progress:
+            progress(len(archived))
+    return archived
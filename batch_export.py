@@ -0,0 +1,207 @@
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from sqlalchemy.orm import joinedload, selectinload
+from models import Submission, ReturnReport
+from pdf_cache import pdf_cache, submission_state_versions, return_state_versions
+
+Document = namedtuple('Document', 'kind key version filename record')
+
+class BatchExportBusy(Exception):
+    """Raised when this process is already running as many batch exports as it allows."""
+
+def manifest_snapshot(submission):
+    """Plain, picklable copy of what generate_manifest_pdf reads from a submission."""
+    return SimpleNamespace(
+        submission_uuid=submission.submission_uuid,
+        submission_date=submission.submission_date,
+        status=submission.status,
+        tracking_number=submission.tracking_number,
+        submitter=SimpleNamespace(company_name=submission.submitter.company_name,
+                                  username=submission.submitter.username),
+        items=[SimpleNamespace(ndc=item.ndc, quantity=item.quantity, expiration_date=item.expiration_date,
+                               returnable_status=item.returnable_status, estimated_credit=item.estimated_credit)
+               for item in submission.items],
+    )
+
+def return_letter_snapshot(return_report):
+    """Plain, picklable copy of what generate_return_letter_pdf reads from a return."""
+    return SimpleNamespace(
+        return_no=return_report.return_no,
+        invoice_date=return_report.invoice_date,
+        service_type=return_report.service_type,
+        ERV=return_report.ERV,
+        credit_received=return_report.credit_received,
+        fees=return_report.fees,
+        amount_paid=return_report.amount_paid,
+        last_payment_date=return_report.last_payment_date,
+        breakdowns=[SimpleNamespace(manufacturer_name=b.manufacturer_name, ERV=b.ERV, expiration_date=b.expiration_date)
+                    for b in return_report.breakdowns],
+    )
+
+SNAPSHOTS = {'manifest': manifest_snapshot, 'return_letter': return_letter_snapshot}
+# pdf_render function for each kind; ReportLab is only loaded once something is rendered
+RENDERERS = {'manifest': 'generate_manifest_pdf', 'return_letter': 'generate_return_letter_pdf'}
+
+def render(kind, snapshot):
+    """Render one document from its snapshot to a BytesIO PDF."""
+    import pdf_render
+
+    return getattr(pdf_render, RENDERERS[kind])(snapshot)
+
+def manifest_documents(day, status='Submitted', limit=None):
+    """Manifests for the submissions of one day in ``status``."""
+    # Snapshots read every submission's items; load them in one query, not one per manifest
+    submissions = Submission.query.options(joinedload(Submission.submitter), selectinload(Submission.items)).filter(
+        Submission.submission_date == day, Submission.status == status).order_by(Submission.id).limit(limit).all()
+    versions = submission_state_versions(submissions)
+    return [Document('manifest', s.submission_uuid, versions[s.id], f'manifest_{s.submission_uuid}.pdf', s)
+            for s in submissions]
+
+def return_letter_documents(start_date, end_date, limit=None):
+    """Return letters for every return invoiced between ``start_date`` and ``end_date`` inclusive."""
+    reports = ReturnReport.query.options(selectinload(ReturnReport.breakdowns)).filter(
+        ReturnReport.invoice_date >= start_date, ReturnReport.invoice_date <= end_date).order_by(
+        ReturnReport.invoice_date, ReturnReport.id).limit(limit).all()
+    versions = return_state_versions(reports)
+    return [Document('return_letter', r.return_no, versions[r.id], f'return_letter_{r.return_no}.pdf', r)
+            for r in reports]
+
+def _lower_priority(niceness):
+    # Keep render processes from competing with request handling for CPU
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+
+def render_snapshot(kind, snapshot):
+    """Render one document from its snapshot and return the PDF bytes. Runs in a pool process."""
+    return render(kind, snapshot).getvalue()
+
+class BatchExporter:
+    """Renders many cached documents at once on a small, low-priority process pool."""
+
+    def __init__(self):
+        self.app = None
+        self._slots = None
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('BATCH_EXPORT_WORKERS', 2)
+        # Batch exports allowed to run at the same time in one web process
+        app.config.setdefault('BATCH_EXPORT_MAX_CONCURRENT', 1)
+        app.config.setdefault('BATCH_EXPORT_MAX_DOCUMENTS', 500)
+        app.config.setdefault('BATCH_EXPORT_NICENESS', 10)
+        self._slots = threading.BoundedSemaphore(app.config['BATCH_EXPORT_MAX_CONCURRENT'])
+
+    def acquire(self, blocking=False):
+        """Claim an export slot. Without ``blocking``, raises BatchExportBusy when none is free."""
+        if not self._slots.acquire(blocking=blocking):
+            raise BatchExportBusy('Another batch export is already running; try again shortly.')
+
+    def release(self):
+        self._slots.release()
+
+    def iter_rendered(self, documents, progress=None):
+        """Yield (filename, path) for each document in order, rendering cache misses in parallel.
+
+        Cached versions are reused and new renders are stored in the PDF cache,
+        so a batch warms the cache for single downloads and vice versa. At most
+        two documents per worker are in flight.
+        """
+        workers = self.app.config['BATCH_EXPORT_WORKERS']
+        executor = None
+        pending = deque()
+        done = 0
+        try:
+            for document in documents:
+                path = pdf_cache.lookup(document.kind, document.key, document.version)
+                if path is None:
+                    snapshot = SNAPSHOTS[document.kind](document.record)
+                    if workers <= 1:
+                        path = pdf_cache.store(document.kind, document.key, document.version,
+                                               render(document.kind, snapshot))
+                    else:
+                        # Start the pool on the first miss; a fully cached batch never needs it
+                        if executor is None:
+                            # spawn rather than fork: the web process may be running job threads
+                            executor = ProcessPoolExecutor(max_workers=workers,
+                                                           mp_context=multiprocessing.get_context('spawn'),
+                                                           initializer=_lower_priority,
+                                                           initargs=(self.app.config['BATCH_EXPORT_NICENESS'],))
+                        path = executor.submit(render_snapshot, document.kind, snapshot)
+                pending.append((document, path))
+
+                while pending and (len(pending) >= workers * 2 or isinstance(pending[0][1], str)):
+                    yield self._finish(pending.popleft())
+                    done += 1
+                    if progress:
+                        progress(done)
+            while pending:
+                yield self._finish(pending.popleft())
+                done += 1
+                if progress:
+                    progress(done)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def _finish(self, entry):
+        document, path = entry
+        if not isinstance(path, str):
+            path = pdf_cache.store(document.kind, document.key, document.version, io.BytesIO(path.result()))
+        return document.filename, path
+
+batch_exporter = BatchExporter()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only stream that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_zip(rendered):
+    """Stream a ZIP archive of (filename, path) pairs, one chunk per document."""
+    sink = _ChunkSink()
+    # The sink is not seekable, so zipfile writes data descriptors instead of seeking back
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, path in rendered:
+            archive.write(path, arcname=filename)
+            yield sink.drain()
+    yield sink.drain()
+
+def write_merged_pdf(rendered, output):
+    """Concatenate (filename, path) documents into one PDF at ``output``. Returns the document count."""
+    import pypdfium2 as pdfium
+
+    merged = pdfium.PdfDocument.new()
+    count = 0
+    try:
+        for _, path in rendered:
+            source = pdfium.PdfDocument(path)
+            try:
+                merged.import_pages(source)
+            finally:
+                source.close()
+            count += 1
+        merged.save(output)
+    finally:
+        merged.close()
+    return count
@@ -0,0 +1,90 @@
+"""Benchmark concurrent write throughput on SQLite with and without the database profile.
+
+    python bench_db_writes.py                # 1, 4 and 8 workers, 10 s each
+    python bench_db_writes.py 2 16           # custom worker counts
+    BENCH_SECONDS=30 python bench_db_writes.py
+
+Each worker is a separate interpreter, like a gunicorn worker. Each one
+commits returns with one manufacturer breakdown for BENCH_SECONDS,
+so the rollups and the search index are written too. "stock" runs with
+SQLite's defaults (rollback journal, pysqlite's 5 s timeout). "tuned"
+runs with SQLITE_PRAGMAS from db_profile. Failed commits are counted,
+rolled back and not retried.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+DEFAULT_WORKERS = [1, 4, 8]
+PROFILES = ['stock', 'tuned']
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_app(profile):
+    from app import app
+    # Lock waits would otherwise fill stderr with slow-query warnings
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = float('inf')
+    if profile == 'stock':
+        app.config['SQLITE_PRAGMAS'] = {}
+    return app
+
+def init_one(profile):
+    from app import init_database
+    with load_app(profile).app_context():
+        init_database()
+
+def run_one(profile, start_at, seconds):
+    from sqlalchemy.exc import OperationalError
+    from models import db, ReturnReport, ManufacturerBreakdown
+    app = load_app(profile)
+    commits = errors = 0
+    with app.app_context():
+        # Connect before the start line so connection setup is not timed
+        db.session.execute(db.select(ReturnReport.id).limit(1)).all()
+        time.sleep(max(0.0, start_at - time.time()))
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            report = ReturnReport(return_no=f'BENCH-{os.getpid()}-{commits + errors}', invoice_date=date(2025, 1, 1),
+                                  service_type='Standard Return', ERV=10.0, credit_received=0, fees=0, amount_paid=0,
+                                  last_payment_date=date(2025, 2, 1))
+            report.breakdowns.append(ManufacturerBreakdown(manufacturer_name=f'Bench Pharma {commits % 20}', ERV=10.0,
+                                                           expiration_date=date(2026, 1, 1)))
+            db.session.add(report)
+            try:
+                db.session.commit()
+                commits += 1
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+    print(commits, errors)
+
+def run(profile, workers, seconds):
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(directory, 'bench.db'))
+        subprocess.run([sys.executable, __file__, '--init', profile], env=env, cwd=HERE, check=True)
+        # Give every worker time to import the app before the clock starts
+        start_at = time.time() + 5
+        processes = [subprocess.Popen([sys.executable, __file__, '--one', profile, str(start_at), str(seconds)],
+                                      env=env, cwd=HERE, stdout=subprocess.PIPE, text=True)
+                     for _ in range(workers)]
+        results = [tuple(map(int, process.communicate()[0].split()[-2:])) for process in processes]
+    commits = sum(commits for commits, _ in results)
+    errors = sum(errors for _, errors in results)
+    print(f"{profile}\t{workers}\t{commits}\t{commits / seconds:.0f}\t{errors}")
+
+def main(worker_counts):
+    seconds = int(os.environ.get('BENCH_SECONDS', 10))
+    print("profile\tworkers\tcommits\tcommits_per_s\tlock_errors")
+    for workers in worker_counts:
+        for profile in PROFILES:
+            run(profile, workers, seconds)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--init']:
+        init_one(sys.argv[2])
+    elif sys.argv[1:2] == ['--one']:
+        run_one(sys.argv[2], float(sys.argv[3]), float(sys.argv[4]))
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or DEFAULT_WORKERS)
@@ -0,0 +1,77 @@
+"""Benchmark the returns exports: time and peak memory by format and row count.
+
+    python bench_exports.py                  # 10k, 100k and 1M rows
+    python bench_exports.py 10000 50000      # custom sizes
+
+Each run happens in a fresh interpreter so peak RSS is per run. The old
+list-of-dicts + pandas layout is only measured up to LEGACY_MAX_ROWS rows.
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+LEGACY_MAX_ROWS = 100_000
+CHUNK_SIZE = 2000
+
+def synthetic_chunks(count, chunk_size=CHUNK_SIZE):
+    """Row tuples shaped like the export query, in chunks like a server-side cursor."""
+    start = date(2024, 1, 1)
+    chunk = []
+    for i in range(count):
+        chunk.append((f"R{i // 500:05d}", start + timedelta(days=i // 500 % 900),
+                      f"{i % 99999:05d}-{i % 999:03d}-{i % 99:02d}", f"Item {i}", f"L{i:07d}",
+                      start + timedelta(days=i % 900), 100, i % 10, i % 3, (i % 5000) / 7,
+                      (i % 5000) / 7 * (i % 10), 'Returnable', 'Outdated', f"Manufacturer {i % 40}"))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+FORMATS = ['excel', 'csv', 'ndjson', 'parquet']
+
+def write(mode, count, path):
+    from exports import EXPORT_HEADINGS, EXCEL_SHEET_NAME, PARQUET_ROW_GROUP_SIZE, iter_csv, iter_ndjson
+    from exports import write_excel, write_parquet
+
+    if mode == 'legacy':
+        import pandas as pd
+
+        data = [dict(zip(EXPORT_HEADINGS, row)) for chunk in synthetic_chunks(count) for row in chunk]
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            pd.DataFrame(data).to_excel(writer, sheet_name=EXCEL_SHEET_NAME, index=False)
+    elif mode == 'excel':
+        write_excel(synthetic_chunks(count), path)
+    elif mode == 'parquet':
+        write_parquet(synthetic_chunks(count, PARQUET_ROW_GROUP_SIZE), path)
+    else:
+        with open(path, 'wb') as output:
+            output.writelines((iter_csv if mode == 'csv' else iter_ndjson)(synthetic_chunks(count)))
+
+def run_one(mode, count):
+    with tempfile.NamedTemporaryFile() as out:
+        started = time.perf_counter()
+        write(mode, count, out.name)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(out.name)
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode}\t{count}\t{elapsed:.2f}\t{peak_mb:.0f}\t{size / 1024 / 1024:.1f}")
+
+def main(sizes):
+    print("mode\trows\tseconds\tpeak_rss_mb\tfile_mb")
+    for count in sizes:
+        modes = FORMATS + (['legacy'] if count <= LEGACY_MAX_ROWS else [])
+        for mode in modes:
+            subprocess.run([sys.executable, __file__, '--one', mode, str(count)], check=True)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--one']:
+        run_one(sys.argv[2], int(sys.argv[3]))
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,144 @@
+"""Benchmark large-table PDF rendering: time and peak memory by row count.
+
+    python bench_pdf_tables.py                  # 10k, 100k and 1M rows
+    python bench_pdf_tables.py 10000 50000      # custom sizes
+
+Each run happens in a fresh interpreter so peak RSS is per run. The old
+single-Table layout is only measured up to LEGACY_MAX_ROWS rows; beyond
+that it takes minutes and gigabytes.
+
+"chunked" and "legacy" lay out synthetic rows. "report" and "manifest"
+time the real database-to-PDF paths, build_returnable_nonreturnable_pdf()
+and generate_manifest_pdf(), against a throwaway SQLite database seeded
+with that many non-returnable return items or submission items (up to
+DB_MAX_ROWS). Seeding runs in its own process and is not timed.
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+LEGACY_MAX_ROWS = 10_000
+DB_MAX_ROWS = 100_000
+DB_MODES = ['report', 'manifest']
+SEED_CHUNK_SIZE = 10_000
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def synthetic_rows(count):
+    """Rows shaped like the non-returnable table, generated lazily like a DB cursor."""
+    start = date(2024, 1, 1)
+    for i in range(count):
+        yield [f"R{i // 500:05d}", f"{i % 99999:05d}-{i % 999:03d}-{i % 99:02d}", f"Item {i}",
+               f"L{i:07d}", (start + timedelta(days=i % 900)).strftime('%Y-%m-%d'),
+               f"Manufacturer {i % 40}", "Outdated", f"${(i % 5000) / 7:.2f}"]
+
+HEADER = ['Return No', 'NDC', 'Description', 'Lot No', 'Exp Date', 'Manufacturer', 'Reason', 'Extended Price']
+
+def load_app():
+    from app import app
+    # Long streaming queries would otherwise fill stderr with slow-query warnings
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = float('inf')
+    return app
+
+def seed(mode, count):
+    """Fill the database with ``count`` rows for the report or manifest path."""
+    from app import init_database, seed_sample_data
+    from models import db, ReturnReport, ReturnItem, ReturnCategory, Reason, Submission, SubmissionItem, User
+    from classification import insert_rows
+    with load_app().app_context():
+        init_database()
+        seed_sample_data()
+        if mode == 'manifest':
+            submission = Submission(user_id=User.query.filter_by(username='user1').one().id, status='Submitted')
+            db.session.add(submission)
+            db.session.commit()
+            for start in range(0, count, SEED_CHUNK_SIZE):
+                insert_rows(SubmissionItem, [
+                    {'submission_id': submission.id, 'ndc': f'{i % 99999:05d}-{i % 999:03d}', 'quantity': 1 + i % 120,
+                     'expiration_date': date(2027, 1, 1), 'estimated_credit': (i % 5000) / 7,
+                     'returnable_status': 'Eligible'}
+                    for i in range(start, min(start + SEED_CHUNK_SIZE, count))])
+                db.session.commit()
+            return
+        category = ReturnCategory(name='Bench')
+        db.session.add(category)
+        db.session.flush()
+        category_id = category.id
+        reason_id = Reason.query.filter_by(name='Outdated').one().id
+        for start in range(0, count, SEED_CHUNK_SIZE):
+            reports = [ReturnReport(return_no=f'BENCH-{i:07d}', invoice_date=date(2024, 1, 1), service_type='Standard Return',
+                                    ERV=0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2024, 1, 1))
+                       for i in range(start, min(start + SEED_CHUNK_SIZE, count), 500)]
+            db.session.add_all(reports)
+            db.session.flush()
+            insert_rows(ReturnItem, [
+                {'return_report_id': reports[(i - start) // 500].id, 'ndc': f'{i % 99999:05d}-{i % 999:03d}',
+                 'description': f'Item {i}', 'lot_no': f'L{i:07d}', 'exp_date': date(2023, 1, 1), 'pkg_size': 1,
+                 'full_qty': 1, 'partial_qty': 0, 'unit_price': 1.0, 'extended_price': (i % 5000) / 7,
+                 'category_id': category_id, 'reason_id': reason_id, 'manufacturer': f'Manufacturer {i % 40}'}
+                for i in range(start, min(start + SEED_CHUNK_SIZE, count))])
+            db.session.commit()
+
+def render_from_db(mode, path):
+    app = load_app()
+    with app.app_context():
+        if mode == 'report':
+            from app import build_returnable_nonreturnable_pdf
+            build_returnable_nonreturnable_pdf(path)
+        else:
+            from models import Submission
+            from pdf_render import generate_manifest_pdf
+            with open(path, 'wb') as out:
+                out.write(generate_manifest_pdf(Submission.query.filter_by(status='Submitted').one()).getvalue())
+
+def render(mode, count, path):
+    from reportlab.platypus import Table
+    from pdf_render import build_pdf, chunked_tables, table_style
+
+    if mode in DB_MODES:
+        render_from_db(mode, path)
+    elif mode == 'legacy':
+        table = Table([HEADER] + list(synthetic_rows(count)))
+        table.setStyle(table_style('red'))
+        build_pdf(path, [table])
+    else:
+        build_pdf(path, chunked_tables(HEADER, synthetic_rows(count), table_style('red', 7), font_size=7))
+
+def run_one(mode, count):
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as out:
+        started = time.perf_counter()
+        render(mode, count, out.name)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(out.name)
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode}\t{count}\t{elapsed:.2f}\t{peak_mb:.0f}\t{size / 1024 / 1024:.1f}")
+
+def run_db(mode, count):
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(directory, 'bench.db'))
+        subprocess.run([sys.executable, __file__, '--seed', mode, str(count)], env=env, cwd=HERE, check=True,
+                       stdout=subprocess.DEVNULL)
+        subprocess.run([sys.executable, __file__, '--one', mode, str(count)], env=env, cwd=HERE, check=True)
+
+def main(sizes):
+    print("mode\trows\tseconds\tpeak_rss_mb\tpdf_mb")
+    for count in sizes:
+        modes = ['chunked'] + (['legacy'] if count <= LEGACY_MAX_ROWS else [])
+        for mode in modes:
+            subprocess.run([sys.executable, __file__, '--one', mode, str(count)], check=True)
+        if count <= DB_MAX_ROWS:
+            for mode in DB_MODES:
+                run_db(mode, count)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--one']:
+        run_one(sys.argv[2], int(sys.argv[3]))
+    elif sys.argv[1:2] == ['--seed']:
+        seed(sys.argv[2], int(sys.argv[3]))
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
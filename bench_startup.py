@@ -0,0 +1,58 @@
+"""Benchmark application startup: cold import time and first-request latency.
+
+    python bench_startup.py          # 5 runs
+    python bench_startup.py 10       # custom run count
+
+Each run is a fresh interpreter, as a gunicorn worker is, against a
+throwaway database set up once with `flask init-db --seed`. Columns are
+milliseconds: the whole process, importing app.py, the first request
+(GET /login) and the first database-backed page (the dashboard after
+logging in). "heavy" lists PDF/Excel libraries loaded by then; it should
+be "-".
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_RUNS = 5
+HEAVY_MODULES = ['reportlab', 'pdfplumber', 'pypdfium2', 'openpyxl', 'pyarrow', 'pandas', 'numpy']
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def run_one():
+    started = time.perf_counter()
+    from app import app
+    imported = time.perf_counter()
+    client = app.test_client()
+    assert client.get('/login').status_code == 200
+    first_request = time.perf_counter()
+    client.post('/login', data={'username': 'user1', 'password': 'pass123'})
+    dashboard_started = time.perf_counter()
+    assert client.get('/dashboard').status_code == 200
+    first_page = time.perf_counter()
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"{(imported - started) * 1000:.0f}\t{(first_request - imported) * 1000:.0f}\t"
+          f"{(first_page - dashboard_started) * 1000:.0f}\t{','.join(heavy) or '-'}")
+
+def main(runs):
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(directory, 'bench.db'))
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db', '--seed'],
+                       env=env, cwd=HERE, check=True, capture_output=True)
+        print("process_ms\timport_ms\tfirst_request_ms\tfirst_page_ms\theavy")
+        totals = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            output = subprocess.run([sys.executable, __file__, '--one'], env=env, cwd=HERE, check=True,
+                                    capture_output=True, text=True).stdout.strip().splitlines()[-1]
+            totals.append((time.perf_counter() - started) * 1000)
+            print(f"{totals[-1]:.0f}\t{output}")
+        print(f"median process_ms: {statistics.median(totals):.0f}")
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--one']:
+        run_one()
+    else:
+        main(int(sys.argv[1]) if sys.argv[1:] else DEFAULT_RUNS)
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from models import db, Reason, ReturnCategory, NDC_Master
+
+class TTLCache:
+    """Thread-safe in-process cache with an optional expiry and size bound, and hit/miss counters."""
+
+    def __init__(self, name, ttl=None, max_entries=None):
+        self.name = name
+        self.ttl = ttl  # Seconds; None keeps entries until invalidated
+        self.max_entries = max_entries  # Least recently used entries beyond this are evicted
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate(); a load that started before an invalidation is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        # Age of the entries served on hits, i.e. how stale cached answers are
+        self._hit_age_total = 0.0
+        self.max_hit_age = 0.0
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss or expiry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or now - entry[1] < self.ttl):
+                age = now - entry[1]
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._hit_age_total += age
+                self.max_hit_age = max(self.max_hit_age, age)
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        # Load outside the lock so a slow query does not block other readers
+        value = loader()
+        with self._lock:
+            if self._generation == generation:
+                self._store(key, value, time.monotonic())
+        return value
+
+    def _store(self, key, value, now):
+        # Called with the lock held
+        if self.ttl is not None:
+            expired = [k for k, (_, loaded) in self._entries.items() if now - loaded >= self.ttl]
+            for k in expired:
+                del self._entries[k]
+            self.evictions += len(expired)
+        self._entries[key] = (value, now)
+        self._entries.move_to_end(key)
+        while self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drop one key, or every key when ``key`` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'ttl': self.ttl,
+                'max_entries': self.max_entries,
+                # Staleness in seconds: mean and worst age of hits, and the oldest entry now held
+                'avg_hit_age': (self._hit_age_total / self.hits) if self.hits else 0.0,
+                'max_hit_age': self.max_hit_age,
+                'oldest_entry_age': max((now - loaded for _, loaded in self._entries.values()), default=0.0),
+            }
+
+# Reasons, categories and NDC manufacturers almost never change. The TTL bounds
+# how long another worker process can serve data invalidated elsewhere.
+reference_cache = TTLCache('reference', ttl=300)
+
+# Dashboard figures change with every return or item written; writes invalidate
+# them in this process and the TTL bounds what other processes serve. Keys include
+# the trend dates from the query string, so the entry count is bounded too
+dashboard_cache = TTLCache('dashboard', ttl=60, max_entries=512)
+
+def get_reason_ids():
+    """Map of reason name to id."""
+    return reference_cache.get_or_load('reason_ids', lambda: {
+        name: reason_id for name, reason_id in db.session.query(Reason.name, Reason.id)
+    })
+
+def get_category_ids():
+    """Map of category name to id."""
+    return reference_cache.get_or_load('category_ids', lambda: {
+        name: category_id for name, category_id in db.session.query(ReturnCategory.name, ReturnCategory.id)
+    })
+
+def get_category_choices():
+    """(value, label) pairs for category select fields."""
+    return reference_cache.get_or_load('category_choices', lambda: [
+        (str(category_id), name) for category_id, name in
+        db.session.query(ReturnCategory.id, ReturnCategory.name).order_by(ReturnCategory.id)
+    ])
+
+def get_manufacturer_choices():
+    """(value, label) pairs of the distinct NDC_Master manufacturers."""
+    return reference_cache.get_or_load('manufacturer_choices', lambda: [
+        (manufacturer, manufacturer) for (manufacturer,) in
+        db.session.query(NDC_Master.manufacturer).distinct().order_by(NDC_Master.manufacturer)
+    ])
+
+def invalidate_reference_data():
+    """Call after any write to reasons, categories or the NDC master."""
+    reference_cache.invalidate()
+
+def invalidate_dashboard_metrics():
+    """Call after any write to returns, breakdowns or return items."""
+    dashboard_cache.invalidate()
@@ -0,0 +1,153 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert
+from models import db, NDC_Master, SubmissionItem
+from caching import get_reason_ids
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+def classify_item(exp_date, ndc_record=None):
+    """Classify an item based on expiration date and NDC rules."""
+    today = date.today()
+
+    # Calculate months until expiration
+    months_until_expiry = (exp_date - today).days / 30
+
+    if exp_date < today:
+        return "Outdated"
+    elif months_until_expiry <= 6:
+        return "Short Dated"
+    elif months_until_expiry > 12:
+        return "Future Dated"
+    else:
+        # Check NDC policy if available
+        if ndc_record and ndc_record.policy_code == 'X':
+            return "Non-Returnable"
+        return "Returnable"
+
+def estimate_credit(ndc_record, qty, exp_date, today=None):
+    """Apply the submission credit rules to one line. Returns (credit, returnable_status)."""
+    if not ndc_record:
+        return 0.0, 'NDC Not Found'
+
+    today = today or date.today()
+    min_return_date = today + timedelta(days=180)  # 6 months
+
+    # Check expiration date - must be at least 6 months from now to be returnable
+    if exp_date <= min_return_date:
+        return 0.0, 'Ineligible (Expiration Too Soon)'
+    if exp_date > today + timedelta(days=365*3):  # More than 3 years from now
+        return 0.0, 'Ineligible (Expiration Too Far)'
+    if ndc_record.policy_code == 'X':
+        return 0.0, 'Ineligible (Policy Restricted)'
+
+    base_credit = ndc_record.base_credit_value
+    if not base_credit or base_credit <= 0:
+        return 0.0, 'Ineligible (No Credit Value)'
+
+    # Apply quantity discount for bulk returns
+    if qty >= 100:
+        discount_factor = 0.95  # 5% discount
+    elif qty >= 50:
+        discount_factor = 0.97  # 3% discount
+    else:
+        discount_factor = 1.0
+
+    # Apply expiration-based adjustment
+    months_until_expiry = (exp_date - today).days / 30
+    if months_until_expiry > 24:  # More than 2 years
+        expiry_factor = 0.9  # 10% reduction for long expiry
+    elif months_until_expiry < 12:  # Less than 1 year
+        expiry_factor = 0.95  # 5% reduction for short expiry
+    else:
+        expiry_factor = 1.0
+
+    return round(base_credit * qty * discount_factor * expiry_factor, 2), 'Eligible'
+
+def _chunks(values, size=LOOKUP_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def load_ndc_records(ndcs):
+    """Fetch NDC_Master rows for a set of NDCs in chunked IN queries. Returns {ndc: record}."""
+    records = {}
+    for chunk in _chunks(set(ndcs)):
+        for record in NDC_Master.query.filter(NDC_Master.ndc.in_(chunk)).all():
+            records[record.ndc] = record
+    return records
+
+def load_reason_ids(names):
+    """Resolve reason names to ids from the reference-data cache. Returns {name: id}."""
+    reason_ids = get_reason_ids()
+    return {name: reason_ids[name] for name in set(names) if name in reason_ids}
+
+def classify_lines(lines):
+    """Classify a batch of (ndc, exp_date) pairs with one NDC lookup and cached reasons.
+
+    Returns a list aligned with ``lines`` of (classification, reason_id, ndc_record);
+    reason_id is None when the classification has no matching Reason row.
+    """
+    ndc_records = load_ndc_records(ndc for ndc, _ in lines)
+    classified = []
+    for ndc, exp_date in lines:
+        ndc_record = ndc_records.get(ndc)
+        classified.append((classify_item(exp_date, ndc_record), ndc_record))
+
+    reason_ids = load_reason_ids(classification for classification, _ in classified)
+    return [(classification, reason_ids.get(classification), ndc_record)
+            for classification, ndc_record in classified]
+
+def price_submission_lines(ndc_list, qty_list, exp_list):
+    """Validate, classify and price posted submission lines in one pass.
+
+    Returns (rows, messages): rows are SubmissionItem column dicts without
+    submission_id, messages are (text, category) pairs for lines that were skipped.
+    """
+    messages = []
+    parsed = []
+    for ndc, qty_str, exp_str in zip(ndc_list, qty_list, exp_list):
+        try:
+            # Data cleaning and type conversion
+            qty = int(qty_str)
+            exp_date = datetime.strptime(exp_str, '%Y-%m-%d').date()
+        except ValueError:
+            # Handle corrupted data row
+            messages.append((f'Skipped invalid item row: NDC {ndc}', 'warning'))
+            continue
+
+        # Basic validation
+        if qty <= 0:
+            messages.append((f'Quantity must be positive for NDC {ndc}', 'warning'))
+            continue
+        parsed.append((ndc, qty, exp_date))
+
+    classified = classify_lines([(ndc, exp_date) for ndc, _, exp_date in parsed])
+
+    today = date.today()
+    rows = []
+    for (ndc, qty, exp_date), (classification, reason_id, ndc_record) in zip(parsed, classified):
+        if reason_id is None:
+            messages.append((f'Classification reason not found for {classification}. Please contact admin.', 'danger'))
+            continue
+
+        credit, status = estimate_credit(ndc_record, qty, exp_date, today)
+        rows.append({
+            'ndc': ndc,
+            'quantity': qty,
+            'expiration_date': exp_date,
+            'estimated_credit': credit,
+            'returnable_status': status,
+            'reason_id': reason_id,
+        })
+    return rows, messages
+
+def insert_rows(model, rows):
+    """Insert a list of column dicts for ``model`` as a single executemany."""
+    if rows:
+        db.session.execute(insert(model), rows)
+    return len(rows)
+
+def insert_submission_items(submission_id, rows):
+    """Bulk insert priced rows from price_submission_lines for one submission."""
+    return insert_rows(SubmissionItem, [dict(row, submission_id=submission_id) for row in rows])
@@ -0,0 +1,69 @@
+import os
+import tempfile
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+
+# Point the app at a throwaway database before app.py is imported
+_test_dir = tempfile.mkdtemp(prefix='returnmedicine-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_test_dir, 'test.db')
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as flask_app, init_database, seed_sample_data
+    flask_app.config.update(
+        TESTING=True,
+        JOB_RESULTS_DIR=os.path.join(_test_dir, 'jobs'),
+        JOBS_RUN_INLINE=True,
+    )
+    with flask_app.app_context():
+        init_database()
+        seed_sample_data()
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def login(client, username, password):
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302
+    return response
+
+@contextmanager
+def count_statements(app):
+    """Collect the SQL statements executed inside the block."""
+    from models import db
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def statement_count(response):
+    """SQL statements the request behind ``response`` executed, from the query_stats header."""
+    from query_stats import STATEMENT_COUNT_HEADER
+    return int(response.headers[STATEMENT_COUNT_HEADER])
+
+def assert_rollups_match_a_rebuild():
+    """The incrementally maintained rollup tables equal a rebuild from the source tables."""
+    from sqlalchemy import select
+    from models import db
+    from rollups import ROLLUPS, rebuild_rollups
+
+    def snapshot():
+        return {rollup.__tablename__: sorted(
+                    tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                    for row in db.session.execute(select(*rollup.__table__.columns)))
+                for rollup in ROLLUPS}
+
+    maintained = snapshot()
+    rebuild_rollups()
+    assert maintained == snapshot()
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import weakref
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+# Applied to every new SQLite connection, in this order. WAL lets readers carry on
+# while one worker writes, and busy_timeout makes a writer wait for the lock
+# instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,  # milliseconds
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # durable at each WAL checkpoint; safe from corruption in WAL mode
+    'cache_size': -64000,  # negative is KiB, so 64 MB of page cache per connection
+    'mmap_size': 268435456,  # 256 MB of the file memory-mapped for reads
+}
+
+def engine_options(uri, config):
+    """Engine options from the DB_POOL_* settings for a PostgreSQL ``uri``; {} for other databases.
+
+    SQLite's pools are chosen by SQLAlchemy (one connection per thread or
+    a small queue), so only PostgreSQL is sized here.
+    """
+    if make_url(uri).get_backend_name() != 'postgresql':
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+class DatabaseProfile:
+    """Tunes every database connection: PRAGMAs on SQLite, pool sizing on PostgreSQL.
+
+    Call init_app before db.init_app so the pool options are in place when
+    the engines are created. Engines are also disposed in forked children,
+    so a worker forked after the parent connected never shares its sockets.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._engines = weakref.WeakSet()
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('SQLITE_PRAGMAS', dict(SQLITE_PRAGMAS))
+        app.config.setdefault('DB_POOL_SIZE', 5)  # Connections kept open per worker process
+        app.config.setdefault('DB_MAX_OVERFLOW', 10)  # Extra connections allowed under bursts
+        app.config.setdefault('DB_POOL_TIMEOUT', 30)  # Seconds to wait for a free connection
+        app.config.setdefault('DB_POOL_RECYCLE', 1800)  # Seconds before a connection is replaced
+        app.config.setdefault('DB_POOL_PRE_PING', True)  # Test connections on checkout
+
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        for key, value in engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config).items():
+            options.setdefault(key, value)
+
+        if not event.contains(Engine, 'engine_connect', self._track_engine):
+            event.listen(Engine, 'engine_connect', self._track_engine)
+            event.listen(Engine, 'connect', self._apply_pragmas)
+            os.register_at_fork(after_in_child=self.dispose_engines)
+
+    def _track_engine(self, connection):
+        self._engines.add(connection.engine)
+
+    def _apply_pragmas(self, dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection) or self.app is None:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in self.app.config['SQLITE_PRAGMAS'].items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+
+    def dispose_engines(self):
+        """Forget pooled connections inherited from the parent process without closing them for it."""
+        for engine in list(self._engines):
+            engine.dispose(close=False)
+
+database_profile = DatabaseProfile()
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import g, has_app_context, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND = 'replica'
+SNAPSHOT_TABLE = 'replica_snapshot'
+# Flask session key holding when this browser last committed a write
+WROTE_AT_KEY = 'db_wrote_at'
+
+# Seconds the standby is behind; zero while it has replayed everything it received,
+# so an idle primary does not look like lag
+POSTGRESQL_LAG = text("""
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+""")
+
+def read_only(view):
+    """Mark a view as read-only so its queries may be served by the replica."""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return decorated_function
+
+class RoutingSession(Session):
+    """Session that sends the reads of read-only views to the replica bind when it is usable.
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            engine = replica_router.engine_for_read(self._db.engines)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class ReplicaRouter:
+    """Decides, once per request, whether a read-only view may read from the replica.
+
+    The replica is used while its measured lag is within
+    REPLICA_MAX_LAG_SECONDS. It is skipped when it cannot be reached, and
+    for a browser whose last write is newer than the replica's data, and
+    for the rest of a request once it has flushed a write, so users always
+    see their own changes. The lag is measured at most once
+    every REPLICA_CHECK_INTERVAL seconds per process.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._lag = None
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 300)
+        app.config.setdefault('REPLICA_CHECK_INTERVAL', 10)
+        app.after_request(self._remember_write)
+        if not event.contains(RoutingSession, 'after_flush', _note_flush):
+            event.listen(RoutingSession, 'after_flush', _note_flush)
+            event.listen(RoutingSession, 'after_commit', _note_commit)
+            event.listen(RoutingSession, 'after_rollback', _note_rollback)
+
+    def engine_for_read(self, engines):
+        """The replica engine for the current request, or None to use the primary."""
+        if not has_request_context() or not g.get('db_read_only') or REPLICA_BIND not in engines:
+            return None
+        if 'db_replica' not in g:
+            g.db_replica = self._choose(engines[REPLICA_BIND])
+        return g.db_replica
+
+    def _choose(self, engine):
+        lag = self.replica_lag(engine)
+        if lag is None or lag > self.app.config['REPLICA_MAX_LAG_SECONDS']:
+            return None
+        wrote_at = flask_session.get(WROTE_AT_KEY)
+        if wrote_at is not None and wrote_at > time.time() - lag:
+            return None
+        return engine
+
+    def replica_lag(self, engine):
+        """Seconds the replica is behind the primary, or None when it cannot be used."""
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.app.config['REPLICA_CHECK_INTERVAL']:
+                self._lag = self._measure_lag(engine)
+                self._checked_at = now
+            return self._lag
+
+    def _measure_lag(self, engine):
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name == 'sqlite':
+                    taken_at = connection.execute(text(f'SELECT taken_at FROM {SNAPSHOT_TABLE}')).scalar()
+                    return max(0.0, time.time() - taken_at)
+                if engine.dialect.name == 'postgresql':
+                    return float(connection.execute(POSTGRESQL_LAG).scalar() or 0)
+                return 0.0
+        except (SQLAlchemyError, TypeError) as exc:
+            self.app.logger.warning('Replica unavailable, reading from the primary: %s', exc)
+            return None
+
+    def reset(self):
+        """Measure the lag again on the next read-only request."""
+        with self._lock:
+            self._checked_at = None
+
+    def _remember_write(self, response):
+        if g.pop('db_wrote', False):
+            flask_session[WROTE_AT_KEY] = time.time()
+        return response
+
+replica_router = ReplicaRouter()
+
+def _note_flush(session, flush_context):
+    session.info['db_wrote'] = True
+    if has_app_context():
+        # A view that writes, e.g. to queue a job, reads the rest of the request from the
+        # primary; the replica does not have the new rows yet
+        g.db_replica = None
+
+def _note_commit(session):
+    if session.info.pop('db_wrote', False) and has_request_context():
+        g.db_wrote = True
+
+def _note_rollback(session):
+    session.info.pop('db_wrote', None)
+
+def snapshot_sqlite(primary_path, replica_path):
+    """Copy a consistent snapshot of the SQLite primary over the replica file and record when it was taken."""
+    taken_at = time.time()
+    os.makedirs(os.path.dirname(os.path.abspath(replica_path)), exist_ok=True)
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path, timeout=30)
+    try:
+        source.backup(target)
+        with target:
+            target.execute(f'CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (id INTEGER PRIMARY KEY CHECK (id = 1), taken_at REAL NOT NULL)')
+            target.execute(f'INSERT OR REPLACE INTO {SNAPSHOT_TABLE} (id, taken_at) VALUES (1, ?)', (taken_at,))
+    finally:
+        target.close()
+        source.close()
+    return taken_at
@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+from datetime import date
+from sqlalchemy import select
+from models import db, ReturnItem, ReturnReport, Reason, ReturnCategory
+from search_index import search_filter
+
+# Rows fetched per round trip; PostgreSQL keeps the rest behind a server-side cursor
+EXPORT_FETCH_SIZE = 2000
+EXCEL_SHEET_NAME = 'Returns_Report'
+# Rows per Parquet row group; each group is fetched and written as one chunk
+PARQUET_ROW_GROUP_SIZE = 50_000
+
+# format -> (download name, mimetype)
+EXPORT_FORMATS = {
+    'excel': ('Returns_Report.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('Returns_Report.csv', 'text/csv'),
+    'ndjson': ('Returns_Report.ndjson', 'application/x-ndjson'),
+    'parquet': ('Returns_Report.parquet', 'application/vnd.apache.parquet'),
+}
+
+# (heading, field name, column); the export query selects exactly these columns, in this order.
+# Excel and CSV use the headings, NDJSON and Parquet the field names.
+EXPORT_COLUMNS = [
+    ('Return No', 'return_no', ReturnReport.return_no),
+    ('Invoice Date', 'invoice_date', ReturnReport.invoice_date),
+    ('NDC', 'ndc', ReturnItem.ndc),
+    ('Description', 'description', ReturnItem.description),
+    ('Lot No', 'lot_no', ReturnItem.lot_no),
+    ('Exp Date', 'exp_date', ReturnItem.exp_date),
+    ('Pkg Size', 'pkg_size', ReturnItem.pkg_size),
+    ('Full Qty', 'full_qty', ReturnItem.full_qty),
+    ('Partial Qty', 'partial_qty', ReturnItem.partial_qty),
+    ('Unit Price', 'unit_price', ReturnItem.unit_price),
+    ('Extended Price', 'extended_price', ReturnItem.extended_price),
+    ('Category', 'category', ReturnCategory.name),
+    ('Reason', 'reason', Reason.name),
+    ('Manufacturer', 'manufacturer', ReturnItem.manufacturer),
+]
+EXPORT_HEADINGS = [heading for heading, _, _ in EXPORT_COLUMNS]
+EXPORT_FIELDS = [field for _, field, _ in EXPORT_COLUMNS]
+
+def export_query(filters):
+    """Column-projection select of the return items matching the export filters.
+
+    ``filters`` takes the ``manufacturer``, ``start_date``, ``end_date`` and
+    ``category`` keys of the export forms; blank values are ignored.
+    ``match='words'`` matches the manufacturer by word prefix through the
+    search index instead of by substring.
+    """
+    query = (select(*[column for _, _, column in EXPORT_COLUMNS])
+             .select_from(ReturnItem)
+             .join(ReturnItem.return_report)
+             .join(ReturnItem.reason)
+             .join(ReturnItem.category))
+
+    manufacturer = filters.get('manufacturer')
+    if manufacturer:
+        query = query.where(search_filter('item', 'manufacturer', manufacturer, ReturnItem.id, ReturnItem.manufacturer,
+                                         words=filters.get('match') == 'words'))
+    if filters.get('start_date'):
+        query = query.where(ReturnReport.invoice_date >= filters['start_date'])
+    if filters.get('end_date'):
+        query = query.where(ReturnReport.invoice_date <= filters['end_date'])
+    if filters.get('category'):
+        query = query.where(ReturnCategory.name.ilike(f"%{filters['category']}%"))
+    return query.order_by(ReturnItem.id)
+
+def iter_export_chunks(filters, chunk_size=EXPORT_FETCH_SIZE):
+    """Yield lists of up to ``chunk_size`` row tuples, in EXPORT_COLUMNS order."""
+    result = db.session.execute(export_query(filters).execution_options(stream_results=True, yield_per=chunk_size))
+    try:
+        for chunk in result.partitions():
+            yield [tuple(row) for row in chunk]
+    finally:
+        result.close()
+
+def _cell(value):
+    # Dates are written as text, as the export always has
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return '' if value is None else value
+
+def write_excel(chunks, output):
+    """Write chunks of row tuples to an .xlsx file at ``output`` (a path or binary file). Returns the row count.
+
+    The write-only workbook spools each appended row to a temporary file, so
+    memory stays flat however many rows are written.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(EXCEL_SHEET_NAME)
+    sheet.append(EXPORT_HEADINGS)
+    count = 0
+    for chunk in chunks:
+        for row in chunk:
+            sheet.append([_cell(value) for value in row])
+        count += len(chunk)
+    workbook.save(output)
+    return count
+
+def iter_csv(chunks):
+    """Encoded CSV text with a heading row, one piece per chunk of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADINGS)
+    for chunk in chunks:
+        writer.writerows([_cell(value) for value in row] for row in chunk)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+def iter_ndjson(chunks):
+    """Encoded newline-delimited JSON, one object per row keyed by EXPORT_FIELDS, one piece per chunk."""
+    for chunk in chunks:
+        lines = [json.dumps(dict(zip(EXPORT_FIELDS, map(_json_value, row)))) for row in chunk]
+        yield ('\n'.join(lines) + '\n').encode('utf-8') if lines else b''
+
+def parquet_schema():
+    import pyarrow as pa
+
+    types = {'Integer': pa.int64(), 'Float': pa.float64(), 'Date': pa.date32()}
+    return pa.schema([(field, types.get(type(column.type).__name__, pa.string()))
+                      for _, field, column in EXPORT_COLUMNS])
+
+def write_parquet(chunks, output):
+    """Write chunks of row tuples to a Parquet file at ``output``, one row group per chunk. Returns the row count."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    count = 0
+    with pq.ParquetWriter(output, schema, compression='snappy') as writer:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            columns = zip(*chunk)
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+            count += len(chunk)
+    return count
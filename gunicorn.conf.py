@@ -0,0 +1,22 @@
+# Gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+
+# Metrics from every worker are written to this directory and summed by /metrics.
+# prometheus_client reads the variable when it is first imported, so set it before the app loads.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'returnmedicine-metrics'))
+
+def on_starting(server):
+    # Samples left over from a previous run would be added to this one's
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def child_exit(server, worker):
+    # Drop the in-flight gauges of a worker that exited; its counters and histograms are kept
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
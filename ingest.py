@@ -0,0 +1,234 @@
+import csv
+import io
+import os
+import time
+import uuid
+from datetime import datetime
+from models import db, ReturnItem
+from classification import classify_lines, insert_rows
+from caching import get_category_ids, invalidate_dashboard_metrics
+from metrics import count_ingested
+
+# Expected columns: ndc, description, lot_no, exp_date, pkg_size, full_qty, partial_qty, unit_price, extended_price, category, reason, manufacturer
+REQUIRED_FIELDS = ['ndc', 'description', 'lot_no', 'exp_date', 'pkg_size', 'full_qty', 'partial_qty', 'unit_price', 'extended_price', 'category', 'reason', 'manufacturer']
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Error reports older than this are removed when a new one is written
+ERROR_REPORT_MAX_AGE = 7 * 24 * 3600  # seconds
+
+# Column headings seen on manufacturer credit memos mapped to REQUIRED_FIELDS names
+HEADER_ALIASES = {
+    'ndc_number': 'ndc',
+    'ndc_no': 'ndc',
+    'product_description': 'description',
+    'drug_name': 'description',
+    'lot': 'lot_no',
+    'lot_number': 'lot_no',
+    'exp': 'exp_date',
+    'expiration': 'exp_date',
+    'expiration_date': 'exp_date',
+    'package_size': 'pkg_size',
+    'pkg': 'pkg_size',
+    'full_quantity': 'full_qty',
+    'partial_quantity': 'partial_qty',
+    'price': 'unit_price',
+    'ext_price': 'extended_price',
+    'extended': 'extended_price',
+    'mfr': 'manufacturer',
+    'manufacturer_name': 'manufacturer',
+}
+
+def normalize_header(name):
+    """Map a free-form column heading such as 'Lot Number' to its ingestion field name."""
+    key = ''.join(c if c.isalnum() else '_' for c in (name or '').strip().lower())
+    key = '_'.join(part for part in key.split('_') if part)
+    return HEADER_ALIASES.get(key, key)
+
+def normalize_rows(rows):
+    """Normalize the headings of parsed table rows. Yields (row_num, row) pairs like iter_csv_rows."""
+    for row_num, row in enumerate(rows, start=1):
+        yield row_num, {normalize_header(key): value for key, value in row.items()}
+
+def iter_csv_rows(binary_stream):
+    """Decode and parse an uploaded CSV incrementally. Yields (row_num, row) pairs."""
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    # Start at 2 because row 1 is header
+    return enumerate(csv.DictReader(text_stream), start=2)
+
+def prune_error_reports(directory, max_age=ERROR_REPORT_MAX_AGE):
+    """Delete error reports in ``directory`` last written more than ``max_age`` seconds ago."""
+    cutoff = time.time() - max_age
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for name in names:
+        token, ext = os.path.splitext(name)
+        # Only reports named by their download token; job directories hold other files too
+        if ext != '.csv' or len(token) != 32 or error_report_path(directory, token) is None:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass  # Pruned by another worker
+    return removed
+
+class ErrorReport:
+    """Per-row ingestion errors written to a CSV file that is only created on the first error.
+
+    Creating a report prunes reports older than ``max_age`` seconds from the same directory.
+    """
+
+    def __init__(self, directory, max_age=ERROR_REPORT_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        self.token = None
+        self.count = 0
+        self.samples = []
+        self._file = None
+        self._writer = None
+
+    def add(self, row_num, ndc, message):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            prune_error_reports(self.directory, self.max_age)
+            self.token = uuid.uuid4().hex
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['row', 'ndc', 'error'])
+        self._writer.writerow([row_num, ndc, message])
+        self.count += 1
+        if len(self.samples) < 5:
+            self.samples.append(f"Row {row_num}: {message}")
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'{self.token}.csv') if self.token else None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def error_report_path(directory, token):
+    """Resolve a download token to an error report path, or None if it is not valid."""
+    try:
+        token = uuid.UUID(hex=token).hex
+    except ValueError:
+        return None
+    path = os.path.join(directory, f'{token}.csv')
+    return path if os.path.exists(path) else None
+
+def _parse_row(row, return_report_id, category_ids):
+    """Convert one CSV row to ReturnItem column values.
+
+    Raises LookupError for an unknown category and ValueError on malformed values.
+    """
+    category_id = category_ids.get(row['category'].strip())
+    if category_id is None:
+        raise LookupError(f"Invalid category: {row['category']}")
+
+    return {
+        'return_report_id': return_report_id,
+        'ndc': row['ndc'].strip(),
+        'description': row['description'].strip(),
+        'lot_no': row['lot_no'].strip(),
+        'exp_date': datetime.strptime(row['exp_date'].strip(), '%Y-%m-%d').date(),
+        'pkg_size': int(row['pkg_size'].strip()),
+        'full_qty': int(row['full_qty'].strip()),
+        'partial_qty': int(row['partial_qty'].strip()),
+        'unit_price': float(row['unit_price'].strip()),
+        'extended_price': float(row['extended_price'].strip()),
+        'category_id': category_id,
+        'manufacturer': row['manufacturer'].strip()
+    }
+
+def _flush_chunk(pending, errors, dry_run=False, source='csv'):
+    """Classify and bulk insert a chunk of parsed rows, then commit it.
+
+    With ``dry_run`` the rows are classified and counted but not written.
+    """
+    classified = classify_lines([(item['ndc'], item['exp_date']) for _, item in pending])
+    new_items = []
+    for (row_num, item), (classification, reason_id, _) in zip(pending, classified):
+        if reason_id is None:
+            errors.add(row_num, item['ndc'], f"Classification reason not found for {classification}")
+            continue
+        item['reason_id'] = reason_id
+        new_items.append(item)
+
+    if dry_run:
+        return len(new_items)
+    added = insert_rows(ReturnItem, new_items)
+    db.session.commit()
+    count_ingested(source, added)
+    return added
+
+def ingest_return_items(rows, return_report_id, error_dir, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, dry_run=False,
+                        source='csv'):
+    """Validate and insert ReturnItem rows for one return in bounded-size, separately committed chunks.
+
+    ``rows`` is an iterable of (row_num, dict) pairs such as iter_csv_rows() produces.
+    ``progress`` is an optional callable receiving the number of rows read so far.
+    ``dry_run`` validates and classifies everything without writing, for previews.
+    ``source`` labels the rows in the rows-ingested metric.
+    Returns (items_added, error_report); items_added is the would-be count on a dry run.
+    """
+    errors = ErrorReport(error_dir)
+    category_ids = get_category_ids()
+    # Preload the NDCs already on this return instead of querying per row
+    existing_ndcs = {ndc for (ndc,) in db.session.query(ReturnItem.ndc).filter_by(return_report_id=return_report_id)}
+    ndc_seen = set()
+    pending = []
+    items_added = 0
+    rows_read = 0
+
+    try:
+        for row_num, row in rows:
+            rows_read += 1
+            # Check for empty fields
+            empty_fields = [field for field in REQUIRED_FIELDS if not (row.get(field) or '').strip()]
+            if empty_fields:
+                errors.add(row_num, (row.get('ndc') or '').strip(), f"Empty fields: {', '.join(empty_fields)}")
+                continue
+
+            ndc = row['ndc'].strip()
+            # Check for duplicate NDCs in the file
+            if ndc in ndc_seen:
+                errors.add(row_num, ndc, f"Duplicate NDC in file: {ndc}")
+                continue
+            ndc_seen.add(ndc)
+
+            # Check for duplicate NDCs in database for this return
+            if ndc in existing_ndcs:
+                errors.add(row_num, ndc, f"NDC already exists in this return: {ndc}")
+                continue
+
+            try:
+                pending.append((row_num, _parse_row(row, return_report_id, category_ids)))
+            except LookupError as e:
+                errors.add(row_num, ndc, str(e))
+            except ValueError as e:
+                errors.add(row_num, ndc, f"Invalid data format - {str(e)}")
+
+            if len(pending) >= chunk_size:
+                items_added += _flush_chunk(pending, errors, dry_run, source)
+                pending = []
+                if progress:
+                    progress(rows_read)
+
+        if pending:
+            items_added += _flush_chunk(pending, errors, dry_run, source)
+        if progress:
+            progress(rows_read)
+    finally:
+        errors.close()
+        if items_added and not dry_run:
+            invalidate_dashboard_metrics()
+
+    return items_added, errors
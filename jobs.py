@@ -0,0 +1,216 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import delete, update
+from werkzeug.utils import secure_filename
+from models import db, Job
+
+class JobContext:
+    """What a job handler sees: its parameters, a working directory and progress reporting."""
+
+    def __init__(self, job, directory):
+        self.job_id = job.id
+        self.job_uuid = job.job_uuid
+        self.user_id = job.user_id
+        self.params = json.loads(job.params or '{}')
+        self.directory = directory
+        self.result = None
+
+    def set_progress(self, progress, total=None, message=None):
+        """Record progress. Commits the current session, so call it between units of work."""
+        values = {'progress': progress}
+        if total is not None:
+            values['total'] = total
+        if message is not None:
+            values['message'] = message
+        db.session.execute(update(Job).where(Job.id == self.job_id).values(**values))
+        db.session.commit()
+
+    def result_file(self, filename, mimetype):
+        """Reserve the job's result file and return the path the handler should write to."""
+        path = os.path.join(self.directory, secure_filename(filename))
+        self.result = (path, filename, mimetype)
+        return path
+
+class JobRunner:
+    """Runs registered job handlers on a per-process thread pool, with state kept in the jobs table."""
+
+    def __init__(self):
+        self.handlers = {}
+        self.app = None
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('JOB_WORKERS', 2)
+        app.config.setdefault('JOB_RESULTS_DIR', os.path.join(app.instance_path, 'jobs'))
+        # Run jobs synchronously inside enqueue(); useful for tests and one-off scripts
+        app.config.setdefault('JOBS_RUN_INLINE', False)
+        # Running jobs older than this are taken to belong to a worker that died
+        app.config.setdefault('JOB_STALE_AFTER', 4 * 3600)  # seconds
+        # Finished and Failed jobs, with their uploads and results, are removed after this
+        app.config.setdefault('JOB_RESULT_MAX_AGE', 7 * 24 * 3600)  # seconds
+
+    def handler(self, kind):
+        """Register ``f(ctx)`` as the handler for jobs of ``kind``. Its return value becomes the job message."""
+        def decorator(f):
+            self.handlers[kind] = f
+            return f
+        return decorator
+
+    def job_dir(self, job_uuid):
+        return os.path.join(self.app.config['JOB_RESULTS_DIR'], job_uuid)
+
+    def enqueue(self, kind, user_id=None, params=None, uploads=None):
+        """Create a queued job and hand it to the worker pool.
+
+        ``uploads`` maps parameter names to uploaded FileStorage objects; they are
+        saved into the job directory and their paths passed to the handler in params.
+        """
+        if kind not in self.handlers:
+            raise KeyError(f'No job handler registered for {kind!r}')
+
+        self.prune()
+        job_uuid = str(uuid.uuid4())
+        directory = self.job_dir(job_uuid)
+        os.makedirs(directory, exist_ok=True)
+
+        params = dict(params or {})
+        for name, storage in (uploads or {}).items():
+            path = os.path.join(directory, secure_filename(storage.filename) or name)
+            storage.save(path)
+            params[name] = path
+
+        job = Job(job_uuid=job_uuid, kind=kind, user_id=user_id, params=json.dumps(params))
+        db.session.add(job)
+        db.session.commit()
+
+        if self.app.config['JOBS_RUN_INLINE']:
+            self.run_job(job.id)
+        else:
+            self._get_executor().submit(self.run_job, job.id)
+        return job
+
+    def _get_executor(self):
+        # Thread pools do not survive fork(); give every gunicorn worker its own
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.app.config['JOB_WORKERS'],
+                                                    thread_name_prefix='job')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def run_job(self, job_id):
+        """Claim and run one queued job. Returns False if another worker already claimed it."""
+        with self.app.app_context():
+            claimed = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == 'Queued')
+                .values(status='Running', started_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                return False
+
+            job = db.session.get(Job, job_id)
+            ctx = JobContext(job, self.job_dir(job.job_uuid))
+            try:
+                message = self.handlers[job.kind](ctx)
+                values = {'status': 'Finished', 'message': message}
+                if ctx.result:
+                    values.update(result_path=ctx.result[0], result_name=ctx.result[1], result_mimetype=ctx.result[2])
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('Job %s (%s) failed', job_id, ctx.job_uuid)
+                values = {'status': 'Failed', 'message': str(e)}
+
+            db.session.execute(update(Job).where(Job.id == job_id).values(finished_at=datetime.utcnow(), **values))
+            db.session.commit()
+            return True
+
+    def fail_stale(self):
+        """Mark jobs Running for longer than JOB_STALE_AFTER as Failed so their users stop waiting.
+
+        They are not re-queued: a job that is only slow would otherwise run twice.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config['JOB_STALE_AFTER'])
+        with self.app.app_context():
+            failed = db.session.execute(
+                update(Job).where(Job.status == 'Running', Job.started_at < cutoff)
+                .values(status='Failed', finished_at=datetime.utcnow(),
+                        message='Interrupted: the worker running this job stopped. Please submit it again.')
+            ).rowcount
+            db.session.commit()
+        if failed:
+            self.app.logger.warning('Marked %d stale running jobs as failed', failed)
+        return failed
+
+    def prune(self, max_age=None):
+        """Delete jobs that ended more than ``max_age`` seconds ago (default JOB_RESULT_MAX_AGE), with their files.
+
+        Directories left without a job row, e.g. by an enqueue that failed
+        before committing, go once they are as old. Returns the jobs deleted.
+        """
+        if max_age is None:
+            max_age = self.app.config['JOB_RESULT_MAX_AGE']
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        with self.app.app_context():
+            expired = db.session.query(Job.id, Job.job_uuid).filter(
+                Job.status.in_(['Finished', 'Failed']), Job.finished_at < cutoff).all()
+            for _, job_uuid in expired:
+                shutil.rmtree(self.job_dir(job_uuid), ignore_errors=True)
+            if expired:
+                db.session.execute(delete(Job).where(Job.id.in_([job_id for job_id, _ in expired])))
+                db.session.commit()
+            known = {job_uuid for (job_uuid,) in db.session.query(Job.job_uuid)}
+
+        results_dir = self.app.config['JOB_RESULTS_DIR']
+        try:
+            names = os.listdir(results_dir)
+        except FileNotFoundError:
+            return len(expired)
+        oldest = time.time() - max_age
+        for name in names:
+            path = os.path.join(results_dir, name)
+            try:
+                if name not in known and os.path.isdir(path) and os.path.getmtime(path) < oldest:
+                    shutil.rmtree(path, ignore_errors=True)
+            except FileNotFoundError:
+                pass  # Pruned by another worker
+        return len(expired)
+
+    def run_pending(self):
+        """Run every queued job in this process, e.g. ones left behind by a restarted worker.
+
+        Jobs left Running by a worker that died are marked Failed first, and
+        expired jobs are pruned.
+        """
+        self.fail_stale()
+        self.prune()
+        with self.app.app_context():
+            job_ids = [job_id for (job_id,) in
+                       db.session.query(Job.id).filter(Job.status == 'Queued').order_by(Job.id)]
+        return sum(1 for job_id in job_ids if self.run_job(job_id))
+
+def job_status_dict(job):
+    """JSON-serialisable view of a job for the status endpoint."""
+    return {
+        'id': job.job_uuid,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'message': job.message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'has_result': bool(job.result_path),
+    }
+
+jobs = JobRunner()
@@ -0,0 +1,97 @@
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from flask import g, request
+from flask_login import current_user
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+from prometheus_client import CONTENT_TYPE_LATEST
+
+# Under gunicorn, gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a directory shared by the
+# workers before anything imports prometheus_client; each worker then writes its samples there
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+# Scrapes from these addresses need no token when METRICS_TOKEN is unset
+LOCAL_ADDRESSES = {'127.0.0.1', '::1'}
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DOCUMENT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REQUEST_LATENCY = Histogram(
+    'returnmedicine_request_duration_seconds', 'Time to handle a request, by Flask endpoint.',
+    ['endpoint', 'method', 'status'], buckets=REQUEST_BUCKETS)
+REQUESTS_IN_PROGRESS = Gauge(
+    'returnmedicine_requests_in_progress', 'Requests being handled, by Flask endpoint.',
+    ['endpoint', 'method'], multiprocess_mode='livesum')
+DOCUMENT_DURATION = Histogram(
+    'returnmedicine_document_generation_seconds', 'Time to generate a PDF or Excel document.',
+    ['format', 'kind'], buckets=DOCUMENT_BUCKETS)
+ROWS_INGESTED = Counter(
+    'returnmedicine_rows_ingested_total', 'Rows written by bulk ingestion, by source.',
+    ['source'])
+
+@contextmanager
+def time_document(fmt, kind):
+    """Observe how long generating one document takes; also usable as a decorator."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        DOCUMENT_DURATION.labels(fmt, kind).observe(time.perf_counter() - started)
+
+def count_ingested(source, rows):
+    if rows:
+        ROWS_INGESTED.labels(source).inc(rows)
+
+def render_metrics():
+    """The exposition text for every metric, summed over all worker processes in multiprocess mode."""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+class RequestMetrics:
+    """Records request latency and in-flight requests per endpoint."""
+
+    def __init__(self):
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        # Bearer token Prometheus must send to read /metrics; None leaves it open
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.before_request(self._start_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish_request)
+
+    def _labels(self):
+        return request.endpoint or 'unmatched', request.method
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        REQUESTS_IN_PROGRESS.labels(*self._labels()).inc()
+
+    def _record_status(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _finish_request(self, exception=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        REQUESTS_IN_PROGRESS.labels(*self._labels()).dec()
+        status = g.pop('metrics_status', 500)
+        REQUEST_LATENCY.labels(*self._labels(), str(status)).observe(time.perf_counter() - started)
+
+    def authorized(self):
+        """With METRICS_TOKEN set, scrapes must send it as a bearer token; without
+        one, only local addresses and signed-in admins may read the metrics."""
+        token = self.app.config['METRICS_TOKEN']
+        if token:
+            return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+        if request.remote_addr in LOCAL_ADDRESSES:
+            return True
+        return current_user.is_authenticated and current_user.role == 'admin'
+
+request_metrics = RequestMetrics()
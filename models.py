@@ -1,8 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from datetime import datetime
+from datetime import datetime, date
+import uuid # For generating Submission IDs
+from db_routing import RoutingSession
 
-db = SQLAlchemy()
+# Reads in read-only views may be routed to the replica bind (see db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -23,6 +26,10 @@ class User(UserMixin, db.Model):
 
 class ReturnReport(db.Model):
     __tablename__ = 'return_reports'
+    __table_args__ = (
+        # Returns list (newest first, keyset by id), invoice date filters and return letter batches
+        db.Index('ix_return_reports_invoice_date_id', 'invoice_date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     return_no = db.Column(db.String(50), unique=True, nullable=False)
     invoice_date = db.Column(db.Date, nullable=False)
@@ -34,12 +41,18 @@ class ReturnReport(db.Model):
     last_payment_date = db.Column(db.Date, nullable=False)
 
     # Optional relationship to ManufacturerBreakdown
-    breakdowns = db.relationship('ManufacturerBreakdown', backref='return_report', lazy=True)
+    # Deleting a return through the ORM deletes its breakdowns and items too; archive.py
+    # deletes whole returns with set-based statements instead
+    breakdowns = db.relationship('ManufacturerBreakdown', backref='return_report', lazy=True, cascade='all, delete-orphan')
     # Relationship to ReturnItem
-    items = db.relationship('ReturnItem', backref='return_report', lazy=True)
+    items = db.relationship('ReturnItem', backref='return_report', lazy=True, cascade='all, delete-orphan')
 
 class CheckStatement(db.Model):
     __tablename__ = 'check_statements'
+    __table_args__ = (
+        # Checks list, newest payment first
+        db.Index('ix_check_statements_payment_date_id', 'payment_date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     statement_no = db.Column(db.String(50), unique=True, nullable=False)
     payment_date = db.Column(db.Date, nullable=False)
@@ -52,6 +65,10 @@ class CheckStatement(db.Model):
 
 class CheckDetail(db.Model):
     __tablename__ = 'check_details'
+    __table_args__ = (
+        db.Index('ix_check_details_check_statement_id', 'check_statement_id'),
+        db.Index('ix_check_details_return_no', 'return_no'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     check_statement_id = db.Column(db.Integer, db.ForeignKey('check_statements.id'), nullable=False)
     return_no = db.Column(db.String(50), nullable=False)
@@ -60,6 +77,11 @@ class CheckDetail(db.Model):
 
 class ManufacturerBreakdown(db.Model):
     __tablename__ = 'manufacturer_breakdowns'
+    __table_args__ = (
+        # A return's breakdowns, and its return letter cache version
+        db.Index('ix_manufacturer_breakdowns_return_report_id', 'return_report_id'),
+        db.Index('ix_manufacturer_breakdowns_manufacturer_name', 'manufacturer_name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     return_report_id = db.Column(db.Integer, db.ForeignKey('return_reports.id'), nullable=False)
     manufacturer_name = db.Column(db.String(120), nullable=False)
@@ -79,6 +101,15 @@ class Reason(db.Model):
 
 class ReturnItem(db.Model):
     __tablename__ = 'return_items'
+    __table_args__ = (
+        # A return's items, including the duplicate NDC check during ingest
+        db.Index('ix_return_items_return_report_id_ndc', 'return_report_id', 'ndc'),
+        # Per-reason item lists and totals on the returnable/non-returnable report
+        db.Index('ix_return_items_reason_id_extended_price', 'reason_id', 'extended_price'),
+        db.Index('ix_return_items_category_id', 'category_id'),
+        # Manufacturer details page
+        db.Index('ix_return_items_manufacturer', 'manufacturer'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     return_report_id = db.Column(db.Integer, db.ForeignKey('return_reports.id'), nullable=False)
     ndc = db.Column(db.String(11), nullable=False)
@@ -96,4 +127,190 @@ class ReturnItem(db.Model):
 
     # Relationships
     category = db.relationship('ReturnCategory', backref='items')
-    reason = db.relationship('Reason', backref='items')
\ No newline at end of file
+    reason = db.relationship('Reason', backref='items')
+
+class Submission(db.Model):
+    __tablename__ = 'submissions'
+    __table_args__ = (
+        # A user's dashboard, newest first
+        db.Index('ix_submissions_user_id_submission_date', 'user_id', 'submission_date'),
+        # Reviewer dashboard (keyset by id) and manifest batches for one day and status
+        db.Index('ix_submissions_submission_date_id', 'submission_date', 'id'),
+        db.Index('ix_submissions_status_submission_date', 'status', 'submission_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # Submission ID used by the user (UUID for better uniqueness)
+    submission_uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Relationship to User (submitter)
+    submitter = db.relationship('User', backref='submissions')
+    submission_date = db.Column(db.Date, nullable=False, default=date.today)
+    # Status: Draft, Submitted, Received, Credited
+    status = db.Column(db.String(20), nullable=False, default='Draft')
+    tracking_number = db.Column(db.String(100)) # Placeholder for tracking
+    status_updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationship to Items
+    items = db.relationship('SubmissionItem', backref='submission', lazy=True, cascade="all, delete-orphan")
+    # Relationship to Status History
+    status_history = db.relationship('StatusUpdate', backref='submission', lazy=True, cascade="all, delete-orphan")
+    
+class SubmissionItem(db.Model):
+    __tablename__ = 'submission_items'
+    __table_args__ = (
+        db.Index('ix_submission_items_submission_id', 'submission_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), nullable=False)
+    ndc = db.Column(db.String(11), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expiration_date = db.Column(db.Date, nullable=False)
+    estimated_credit = db.Column(db.Float, default=0.0)
+    # returnable_status: Eligible, Ineligible (based on NDC lookup/expiration rules)
+    returnable_status = db.Column(db.String(20), default='Unchecked')
+    reason_id = db.Column(db.Integer, db.ForeignKey('reasons.id'))
+
+    # Relationship to Reason
+    reason = db.relationship('Reason', backref='submission_items')
+
+class NDC_Master(db.Model):
+    __tablename__ = 'ndc_master'
+    ndc = db.Column(db.String(11), primary_key=True)
+    drug_name = db.Column(db.String(255), nullable=False)
+    manufacturer = db.Column(db.String(120), nullable=False)
+    policy_code = db.Column(db.String(10))
+    base_credit_value = db.Column(db.Float, default=1.00) # Base value per unit for calculation
+
+class StatusUpdate(db.Model):
+    __tablename__ = 'status_updates'
+    __table_args__ = (
+        db.Index('ix_status_updates_submission_id', 'submission_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), nullable=False)
+    old_status = db.Column(db.String(20))
+    new_status = db.Column(db.String(20), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_by = db.Column(db.String(100)) # Could be 'system' or admin username
+    notes = db.Column(db.Text)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Queue polling: oldest queued job first
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    job_uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    kind = db.Column(db.String(50), nullable=False)
+    # Status: Queued, Running, Finished, Failed
+    status = db.Column(db.String(20), nullable=False, default='Queued')
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    params = db.Column(db.Text)  # JSON-encoded handler arguments
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    message = db.Column(db.Text)
+    result_path = db.Column(db.String(255))  # Result file on local disk
+    result_name = db.Column(db.String(255))
+    result_mimetype = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+# --- Reporting rollups, maintained by rollups.py ---
+
+class ManufacturerRollup(db.Model):
+    __tablename__ = 'manufacturer_rollups'
+    manufacturer_name = db.Column(db.String(120), primary_key=True)
+    total_erv = db.Column(db.Float, nullable=False, default=0.0)
+    breakdown_count = db.Column(db.Integer, nullable=False, default=0)
+
+class CategoryRollup(db.Model):
+    __tablename__ = 'category_rollups'
+    category_id = db.Column(db.Integer, db.ForeignKey('return_categories.id'), primary_key=True)
+    total_value = db.Column(db.Float, nullable=False, default=0.0)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
+    category = db.relationship('ReturnCategory')
+
+class ReasonRollup(db.Model):
+    __tablename__ = 'reason_rollups'
+    reason_id = db.Column(db.Integer, db.ForeignKey('reasons.id'), primary_key=True)
+    total_value = db.Column(db.Float, nullable=False, default=0.0)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
+    reason = db.relationship('Reason')
+
+class ReportTotals(db.Model):
+    __tablename__ = 'report_totals'
+    # Single row with id 1
+    id = db.Column(db.Integer, primary_key=True)
+    total_erv = db.Column(db.Float, nullable=False, default=0.0)
+    total_credits = db.Column(db.Float, nullable=False, default=0.0)
+    total_fees = db.Column(db.Float, nullable=False, default=0.0)
+    return_count = db.Column(db.Integer, nullable=False, default=0)
+
+class ErvTimeBucket(db.Model):
+    __tablename__ = 'erv_time_buckets'
+    # Granularity: day, week, month, quarter; bucket_start is the first day of the period
+    granularity = db.Column(db.String(10), primary_key=True)
+    bucket_start = db.Column(db.Date, primary_key=True)
+    total_erv = db.Column(db.Float, nullable=False, default=0.0)
+    return_count = db.Column(db.Integer, nullable=False, default=0)
+
+# --- Archived returns, moved out of the hot tables by archive.py ---
+# Rows keep their original ids in ``id``; SQLite can hand a deleted id out again, so
+# the archive has its own key. archived_at records when the batch moved them
+
+class ArchivedReturnReport(db.Model):
+    __tablename__ = 'archived_return_reports'
+    __table_args__ = (
+        db.Index('ix_archived_return_reports_id', 'id'),
+        db.Index('ix_archived_return_reports_return_no', 'return_no'),
+    )
+    archive_id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, nullable=False)
+    return_no = db.Column(db.String(50), nullable=False)
+    invoice_date = db.Column(db.Date, nullable=False)
+    service_type = db.Column(db.String(100), nullable=False)
+    ERV = db.Column(db.Float, nullable=False)
+    credit_received = db.Column(db.Float, nullable=False)
+    fees = db.Column(db.Float, nullable=False)
+    amount_paid = db.Column(db.Float, nullable=False)
+    last_payment_date = db.Column(db.Date, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class ArchivedManufacturerBreakdown(db.Model):
+    __tablename__ = 'archived_manufacturer_breakdowns'
+    __table_args__ = (
+        db.Index('ix_archived_manufacturer_breakdowns_return_report_id', 'return_report_id'),
+    )
+    archive_id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, nullable=False)
+    return_report_id = db.Column(db.Integer, nullable=False)
+    manufacturer_name = db.Column(db.String(120), nullable=False)
+    ERV = db.Column(db.Float, nullable=False)
+    expiration_date = db.Column(db.Date, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class ArchivedReturnItem(db.Model):
+    __tablename__ = 'archived_return_items'
+    __table_args__ = (
+        db.Index('ix_archived_return_items_return_report_id', 'return_report_id'),
+    )
+    archive_id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, nullable=False)
+    return_report_id = db.Column(db.Integer, nullable=False)
+    ndc = db.Column(db.String(11), nullable=False)
+    description = db.Column(db.String(255), nullable=False)
+    lot_no = db.Column(db.String(50), nullable=False)
+    exp_date = db.Column(db.Date, nullable=False)
+    pkg_size = db.Column(db.Integer, nullable=False)
+    full_qty = db.Column(db.Integer, nullable=False)
+    partial_qty = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    extended_price = db.Column(db.Float, nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)
+    reason_id = db.Column(db.Integer, nullable=False)
+    manufacturer = db.Column(db.String(120), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,109 @@
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+class KeysetPage:
+    """One page of a keyset-paginated query, with opaque cursors for its neighbours."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def _encode_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def _decode_value(attr, value):
+    if value is None:
+        return None
+    python_type = attr.property.columns[0].type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token, order_by):
+    """Sort-key values from a cursor, or None if the token is missing or malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(order_by):
+            return None
+        return [_decode_value(attr, value) for (attr, _), value in zip(order_by, values)]
+    except (ValueError, TypeError):
+        return None
+
+def _after(order_by, values, reverse=False):
+    """WHERE clause selecting rows that sort after ``values`` (before them with ``reverse``).
+
+    Expands the row comparison into (a > x) OR (a = x AND b > y) ... so that
+    mixed ascending and descending keys still use the composite index.
+    """
+    clauses = []
+    for i, ((attr, descending), value) in enumerate(zip(order_by, values)):
+        ahead = attr < value if descending != reverse else attr > value
+        clauses.append(and_(*[a == v for (a, _), v in zip(order_by[:i], values[:i])], ahead))
+    return or_(*clauses)
+
+def parse_per_page(value, default=DEFAULT_PER_PAGE):
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+def keyset_paginate(query, order_by, after=None, before=None, per_page=DEFAULT_PER_PAGE):
+    """Fetch one page of ``query`` ordered by ``order_by``, a list of (attribute, descending) pairs.
+
+    The last key must be unique (normally the primary key) so the order is
+    total. ``after``/``before`` are cursors from a previous page; each page
+    costs one indexed range scan of per_page + 1 rows however deep it is.
+    """
+    before_values = decode_cursor(before, order_by)
+    after_values = None if before_values else decode_cursor(after, order_by)
+
+    if before_values:
+        # Walk backwards from the cursor, then restore display order
+        query = query.filter(_after(order_by, before_values, reverse=True)).order_by(
+            *[attr.asc() if descending else attr.desc() for attr, descending in order_by])
+        rows = query.limit(per_page + 1).all()
+        has_more_before = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_more_after = True
+    else:
+        if after_values:
+            query = query.filter(_after(order_by, after_values))
+        query = query.order_by(*[attr.desc() if descending else attr.asc() for attr, descending in order_by])
+        rows = query.limit(per_page + 1).all()
+        has_more_after = len(rows) > per_page
+        items = rows[:per_page]
+        has_more_before = after_values is not None
+
+    def cursor_for(item):
+        return encode_cursor([getattr(item, attr.key) for attr, _ in order_by])
+
+    next_cursor = cursor_for(items[-1]) if items and has_more_after else None
+    prev_cursor = cursor_for(items[0]) if items and has_more_before else None
+    return KeysetPage(items, per_page, next_cursor, prev_cursor)
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from models import db, SubmissionItem, ManufacturerBreakdown
+from metrics import time_document
+
+def _digest(value):
+    return hashlib.sha256(repr(value).encode('utf-8')).hexdigest()
+
+# Ids per grouped IN (...) query when versioning a batch of documents
+VERSION_CHUNK_SIZE = 500
+
+def _child_aggregates(model, parent_column, amount_column, parent_ids):
+    """{parent id: (row count, max row id, amount total)} in one grouped query per chunk of ids."""
+    aggregates = {}
+    for start in range(0, len(parent_ids), VERSION_CHUNK_SIZE):
+        chunk = parent_ids[start:start + VERSION_CHUNK_SIZE]
+        aggregates.update((parent_id, (count, max_id, total)) for parent_id, count, max_id, total in db.session.query(
+            parent_column, db.func.count(model.id), db.func.max(model.id), db.func.sum(amount_column)
+        ).filter(parent_column.in_(chunk)).group_by(parent_column))
+    return aggregates
+
+def submission_state_versions(submissions):
+    """Fingerprints of everything each submission's manifest and label render from, by submission id."""
+    aggregates = _child_aggregates(SubmissionItem, SubmissionItem.submission_id, SubmissionItem.estimated_credit,
+                                   [submission.id for submission in submissions])
+    return {submission.id: _digest((
+        submission.status,
+        submission.tracking_number,
+        submission.status_updated_at.isoformat() if submission.status_updated_at else None,
+        submission.submitter.company_name,
+        submission.submitter.username,
+    ) + aggregates.get(submission.id, (0, None, None))) for submission in submissions}
+
+def submission_state_version(submission):
+    """Fingerprint of everything a submission's manifest and label render from."""
+    return submission_state_versions([submission])[submission.id]
+
+def return_state_versions(return_reports):
+    """Fingerprints of everything each return letter renders from, by return id."""
+    aggregates = _child_aggregates(ManufacturerBreakdown, ManufacturerBreakdown.return_report_id,
+                                   ManufacturerBreakdown.ERV, [report.id for report in return_reports])
+    return {report.id: _digest((
+        report.return_no,
+        report.invoice_date, report.service_type,
+        report.ERV, report.credit_received, report.fees,
+        report.amount_paid, report.last_payment_date,
+    ) + aggregates.get(report.id, (0, None, None))) for report in return_reports}
+
+def return_state_version(return_report):
+    """Fingerprint of everything a return letter renders from."""
+    return return_state_versions([return_report])[return_report.id]
+
+class PDFCache:
+    """Generated documents on disk, one directory per document and one file per state version."""
+
+    def __init__(self):
+        self.root = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.root = app.config.setdefault('PDF_CACHE_DIR', os.path.join(app.instance_path, 'pdf_cache'))
+
+    def _key_dir(self, kind, key):
+        return os.path.join(self.root, kind, _digest(key))
+
+    def get_or_build(self, kind, key, version, builder):
+        """Return the path of the cached PDF for ``key`` at ``version``, building it on a miss.
+
+        ``builder()`` returns a binary buffer with the rendered document. Older
+        versions of the same document are removed once the new one is written.
+        """
+        path = self.lookup(kind, key, version)
+        if path is not None:
+            return path
+        with time_document('pdf', kind):
+            buffer = builder()
+        return self.store(kind, key, version, buffer)
+
+    def lookup(self, kind, key, version):
+        """Path of the cached PDF for ``key`` at ``version``, or None (counted as a miss)."""
+        path = os.path.join(self._key_dir(kind, key), f'{version}.pdf')
+        with self._lock:
+            if os.path.exists(path):
+                self.hits += 1
+                return path
+            self.misses += 1
+        return None
+
+    def store(self, kind, key, version, buffer):
+        """Write a rendered document for ``key`` at ``version`` and drop its older versions."""
+        key_dir = self._key_dir(kind, key)
+        path = os.path.join(key_dir, f'{version}.pdf')
+        os.makedirs(key_dir, exist_ok=True)
+        fd, partial = tempfile.mkstemp(suffix='.tmp', dir=key_dir)
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(buffer, out)
+        os.replace(partial, path)
+
+        for name in os.listdir(key_dir):
+            if name.endswith('.pdf') and name != f'{version}.pdf':
+                try:
+                    os.remove(os.path.join(key_dir, name))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def invalidate(self, kind, key):
+        """Drop every cached version of one document."""
+        shutil.rmtree(self._key_dir(kind, key), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': 'pdf',
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
+
+pdf_cache = PDFCache()
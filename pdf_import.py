@@ -0,0 +1,199 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+# Pages handed to one worker task; each task opens the document afresh so
+# pdfminer's object cache never grows beyond one page range
+DEFAULT_PAGES_PER_TASK = 10
+
+def _table_rows(table):
+    """Turn one extracted table into row dicts keyed by its first row."""
+    # Skip empty tables
+    if not table or len(table) < 2:
+        return
+
+    # Assume first row is headers
+    headers = [str(cell).strip() if cell else '' for cell in table[0]]
+
+    # Process data rows
+    for row in table[1:]:
+        row_data = {}
+        for i, cell in enumerate(row):
+            if i < len(headers):
+                row_data[headers[i]] = str(cell).strip() if cell else ''
+
+        # Only add rows that have some data
+        if any(row_data.values()):
+            yield row_data
+
+def parse_page_range(path, start, stop):
+    """Extract table rows from pages [start, stop) of the PDF at ``path``."""
+    import pdfplumber
+
+    rows = []
+    with pdfplumber.open(path, pages=range(start + 1, stop + 1)) as pdf:
+        for page in pdf.pages:
+            for table in page.extract_tables():
+                rows.extend(_table_rows(table))
+            # Release the page's parsed objects as soon as we are done with it
+            page.flush_cache()
+    return rows
+
+def count_pages(path):
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+@contextmanager
+def _as_path(pdf_file):
+    """Yield a filesystem path for a path or an uploaded file object."""
+    if isinstance(pdf_file, (str, os.PathLike)):
+        yield os.fspath(pdf_file)
+        return
+
+    stream = getattr(pdf_file, 'stream', pdf_file)
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as tmp:
+        shutil.copyfileobj(stream, tmp)
+        tmp.flush()
+        yield tmp.name
+
+def iter_pdf_rows(pdf_file, workers=0, pages_per_task=DEFAULT_PAGES_PER_TASK):
+    """Yield table rows from a PDF page range by page range, in document order.
+
+    With ``workers`` > 1 the ranges are parsed on a process pool. At most two
+    ranges per worker are in flight, so peak memory depends on the pool size
+    and ``pages_per_task``, not on the length of the document.
+    """
+    with _as_path(pdf_file) as path:
+        page_count = count_pages(path)
+        ranges = [(start, min(start + pages_per_task, page_count))
+                  for start in range(0, page_count, pages_per_task)]
+
+        if workers <= 1 or len(ranges) <= 1:
+            for start, stop in ranges:
+                yield from parse_page_range(path, start, stop)
+            return
+
+        # spawn rather than fork: the web process may be running job threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            window = workers * 2
+            pending = []
+            next_range = 0
+            while pending or next_range < len(ranges):
+                while next_range < len(ranges) and len(pending) < window:
+                    start, stop = ranges[next_range]
+                    pending.append(executor.submit(parse_page_range, path, start, stop))
+                    next_range += 1
+                # Consume the oldest range first to keep rows in page order
+                yield from pending.pop(0).result()
+
+def parse_pdf_to_csv(pdf_file, workers=0):
+    """Parse PDF file and extract tabular data to CSV format."""
+    return list(iter_pdf_rows(pdf_file, workers=workers))
+
+def _digest_path(cache_dir, digest):
+    return os.path.join(cache_dir, f'{digest}.ndjson')
+
+def is_valid_digest(digest):
+    return len(digest) == 64 and all(c in '0123456789abcdef' for c in digest)
+
+def _touch(path):
+    # The modification time doubles as last use, for least-recently-used eviction
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def prune_parse_cache(cache_dir, max_bytes, keep=None):
+    """Evict the least recently used parses until the cache fits in ``max_bytes``.
+
+    ``keep`` is a digest that is never evicted, e.g. the parse just written.
+    Returns the number of parses removed.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        digest, ext = os.path.splitext(name)
+        if ext != '.ndjson' or not is_valid_digest(digest):
+            continue  # In-progress parses and staged uploads
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, digest))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, digest in sorted(entries):
+        if total <= max_bytes:
+            break
+        if digest == keep:
+            continue
+        try:
+            os.remove(_digest_path(cache_dir, digest))
+            removed += 1
+        except FileNotFoundError:
+            pass  # Evicted by another worker
+        total -= size
+    return removed
+
+def cached_rows(cache_dir, digest):
+    """Yield the cached parse of a PDF, or return None if it has not been parsed."""
+    path = _digest_path(cache_dir, digest)
+    if not is_valid_digest(digest) or not _touch(path):
+        return None
+
+    def rows():
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+    return rows()
+
+def parse_with_cache(pdf_file, cache_dir, workers=0, max_bytes=None):
+    """Parse a PDF unless an identical file was parsed before. Returns the file's SHA-256.
+
+    Rows are cached as newline-delimited JSON named by the digest of the PDF
+    bytes, so re-uploading the same document never re-runs pdfplumber. With
+    ``max_bytes``, least recently used parses are evicted after a new one is
+    written to keep the cache within that size.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    is_path = isinstance(pdf_file, (str, os.PathLike))
+    source = open(pdf_file, 'rb') if is_path else getattr(pdf_file, 'stream', pdf_file)
+
+    # Copy the upload to disk and hash it in the same pass
+    sha = hashlib.sha256()
+    fd, staged = tempfile.mkstemp(suffix='.pdf', dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for block in iter(lambda: source.read(1024 * 1024), b''):
+                sha.update(block)
+                out.write(block)
+
+        digest = sha.hexdigest()
+        target = _digest_path(cache_dir, digest)
+        if not _touch(target):
+            fd, partial = tempfile.mkstemp(suffix='.ndjson', dir=cache_dir)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as out:
+                    for row in iter_pdf_rows(staged, workers=workers):
+                        out.write(json.dumps(row) + '\n')
+                # Publish atomically so concurrent readers never see a partial parse
+                os.replace(partial, target)
+            except BaseException:
+                os.remove(partial)
+                raise
+            if max_bytes is not None:
+                prune_parse_cache(cache_dir, max_bytes, keep=digest)
+        return digest
+    finally:
+        if is_path:
+            source.close()
+        os.remove(staged)
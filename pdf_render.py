@@ -0,0 +1,316 @@
+from functools import lru_cache
+from io import BytesIO
+from itertools import islice
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib import colors
+
+# Roughly one letter page of 10pt table rows; a chunk that does not fit is
+# still split by ReportLab, it just should not have to split often
+DEFAULT_ROWS_PER_TABLE = 32
+
+# Rows fetched per database round trip when a table is streamed from a query
+DB_FETCH_SIZE = 1000
+
+# Width available to a table: letter paper less SimpleDocTemplate's one-inch margins
+FRAME_WIDTH = letter[0] - 2 * inch
+
+# Table's default left plus right cell padding, and the fonts table_style() sets
+CELL_PADDING = 12
+BODY_FONT, HEADER_FONT, FONT_SIZE = 'Helvetica', 'Helvetica-Bold', 10
+
+# Flowables pulled from a story generator ahead of the one being laid out,
+# enough for keepWithNext look-ahead
+STORY_LOOKAHEAD = 8
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """The sample stylesheet plus the custom paragraph styles, built once per process."""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=16, spaceAfter=30))
+    styles.add(ParagraphStyle('CustomSubtitle', parent=styles['Heading2'], fontSize=12, spaceAfter=20))
+    styles.add(ParagraphStyle('LetterTitle', parent=styles['Heading1'], fontSize=18, spaceAfter=30,
+                              alignment=1))  # Center
+    styles.add(ParagraphStyle('LetterSubtitle', parent=styles['Heading2'], fontSize=14, spaceAfter=20))
+    styles.add(ParagraphStyle('LetterNormal', parent=styles['Normal'], fontSize=12, spaceAfter=12))
+    return styles
+
+@lru_cache(maxsize=None)
+def table_style(header_color='grey', font_size=FONT_SIZE):
+    """The shared data-table style: coloured header row, beige body, black grid."""
+    commands = [
+        ('BACKGROUND', (0, 0), (-1, 0), getattr(colors, header_color)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), HEADER_FONT),
+        ('FONTSIZE', (0, 0), (-1, 0), font_size),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]
+    if font_size != FONT_SIZE:
+        # Smaller text for tables with many columns
+        commands += [('FONTSIZE', (0, 1), (-1, -1), font_size), ('LEADING', (0, 0), (-1, -1), font_size + 2)]
+    return TableStyle(commands)
+
+def column_widths(weights, total_width=FRAME_WIDTH):
+    """Split ``total_width`` between the columns in proportion to ``weights``."""
+    total = sum(weights)
+    return [total_width * weight / total for weight in weights]
+
+def _wrap_cell(value, width, font, font_size):
+    """A cell's text broken onto as many lines as it needs to fit ``width``."""
+    text = str(value)
+    room = width - CELL_PADDING
+    if stringWidth(text, font, font_size) <= room:
+        return text
+    lines = []
+    for line in simpleSplit(text, font, font_size, room):
+        # simpleSplit only breaks at spaces; cut long codes between characters
+        while stringWidth(line, font, font_size) > room and len(line) > 1:
+            cut = len(line) - 1
+            while cut > 1 and stringWidth(line[:cut], font, font_size) > room:
+                cut -= 1
+            lines.append(line[:cut])
+            line = line[cut:]
+        lines.append(line)
+    return '\n'.join(lines)
+
+def chunked_tables(header, rows, style=None, rows_per_table=DEFAULT_ROWS_PER_TABLE, weights=None,
+                   font_size=FONT_SIZE):
+    """Yield page-sized Tables for an iterable of rows, each repeating ``header``.
+
+    Only one chunk of rows is held at a time, so a table of a million rows
+    costs no more to lay out than a table of one page. Every chunk gets the
+    same column widths, split from the page width by ``weights`` (equal by
+    default), so the columns line up from page to page; text wider than its
+    column wraps onto extra lines. ``font_size`` must match the style's.
+    """
+    style = style or table_style(font_size=font_size)
+    widths = column_widths(weights or [1] * len(header))
+    header = [_wrap_cell(cell, width, HEADER_FONT, font_size) for cell, width in zip(header, widths)]
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, rows_per_table))
+        if not chunk:
+            return
+        chunk = [[_wrap_cell(cell, width, BODY_FONT, font_size) for cell, width in zip(row, widths)] for row in chunk]
+        table = Table([header] + chunk, colWidths=widths, repeatRows=1)
+        table.setStyle(style)
+        yield table
+
+class LazyStory(list):
+    """A story list that refills itself from a flowable iterator as the document is built.
+
+    SimpleDocTemplate.build() consumes its story from the front and checks
+    len() on every pass, so topping the list up there keeps only a few
+    flowables in memory instead of the whole document.
+    """
+
+    def __init__(self, flowables, lookahead=STORY_LOOKAHEAD):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+
+    def __len__(self):
+        short = self._lookahead - list.__len__(self)
+        if short > 0 and self._source is not None:
+            before = list.__len__(self)
+            self.extend(islice(self._source, short))
+            if list.__len__(self) - before < short:
+                self._source = None
+        return list.__len__(self)
+
+def build_pdf(output, story):
+    """Lay out ``story`` (a list or any iterable of flowables) as a letter-size PDF."""
+    doc = SimpleDocTemplate(output, pagesize=letter)
+    if not isinstance(story, list):
+        story = LazyStory(story)
+    doc.build(story)
+
+def _render(story):
+    buffer = BytesIO()
+    build_pdf(buffer, story)
+    buffer.seek(0)
+    return buffer
+
+# Manifest item table: NDC, Quantity, Expiration Date, Status, Estimated Credit
+MANIFEST_WEIGHTS = [1.2, 0.8, 1.1, 1.6, 1.1]
+
+def generate_manifest_pdf(submission):
+    """Generate a PDF manifest for the submission."""
+    return _render(_manifest_story(submission))
+
+def _manifest_story(submission):
+    styles = get_styles()
+
+    # Title
+    yield Paragraph("Pharmaceutical Return Manifest", styles['CustomTitle'])
+    yield Spacer(1, 12)
+
+    # Submission details
+    yield Paragraph(f"Submission ID: {submission.submission_uuid}", styles['Normal'])
+    yield Paragraph(f"Date: {submission.submission_date.strftime('%Y-%m-%d')}", styles['Normal'])
+    yield Paragraph(f"Company: {submission.submitter.company_name}", styles['Normal'])
+    yield Paragraph(f"Status: {submission.status}", styles['Normal'])
+    if submission.tracking_number:
+        yield Paragraph(f"Tracking Number: {submission.tracking_number}", styles['Normal'])
+    yield Spacer(1, 20)
+
+    # Items table
+    yield Paragraph("Return Items:", styles['CustomSubtitle'])
+
+    total_credit = 0
+    def item_rows():
+        nonlocal total_credit
+        for item in submission.items:
+            total_credit += item.estimated_credit
+            yield [
+                item.ndc,
+                str(item.quantity),
+                item.expiration_date.strftime('%Y-%m-%d'),
+                item.returnable_status,
+                f"${item.estimated_credit:.2f}"
+            ]
+
+    header = ['NDC', 'Quantity', 'Expiration Date', 'Status', 'Estimated Credit']
+    tables = chunked_tables(header, item_rows(), weights=MANIFEST_WEIGHTS)
+    first = next(tables, None)
+    # An empty submission still gets a header-only table, as before
+    yield first if first is not None else Table([header], colWidths=column_widths(MANIFEST_WEIGHTS), style=table_style())
+    yield from tables
+    yield Spacer(1, 20)
+    yield Paragraph(f"Total Estimated Credit: ${total_credit:.2f}", styles['Normal'])
+
+def generate_shipping_label_pdf(submission):
+    """Generate a PDF shipping label for the submission."""
+    styles = get_styles()
+    story = []
+
+    # Shipping label content
+    story.append(Paragraph("PHARMACEUTICAL RETURNS - PREPAID SHIPPING LABEL", styles['Heading1']))
+    story.append(Spacer(1, 20))
+
+    story.append(Paragraph("FROM:", styles['Heading2']))
+    story.append(Paragraph(f"{submission.submitter.company_name}", styles['Normal']))
+    story.append(Paragraph(f"User: {submission.submitter.username}", styles['Normal']))
+    story.append(Spacer(1, 20))
+
+    story.append(Paragraph("TO:", styles['Heading2']))
+    story.append(Paragraph("PharmaReturns Processing Center", styles['Normal']))
+    story.append(Paragraph("123 Return Lane", styles['Normal']))
+    story.append(Paragraph("Processing City, PC 12345", styles['Normal']))
+    story.append(Spacer(1, 20))
+
+    story.append(Paragraph("SUBMISSION DETAILS:", styles['Heading2']))
+    story.append(Paragraph(f"Submission ID: {submission.submission_uuid}", styles['Normal']))
+    if submission.tracking_number:
+        story.append(Paragraph(f"Tracking Number: {submission.tracking_number}", styles['Normal']))
+    story.append(Paragraph(f"Items: {len(submission.items)}", styles['Normal']))
+    story.append(Spacer(1, 20))
+
+    story.append(Paragraph("IMPORTANT: This shipment contains pharmaceutical products. Handle with care.", styles['Normal']))
+
+    return _render(story)
+
+def generate_return_letter_pdf(return_report):
+    """Generate a PDF return letter for a specific return report."""
+    styles = get_styles()
+    subtitle_style = styles['LetterSubtitle']
+    normal_style = styles['LetterNormal']
+    story = []
+
+    # Header with logo placeholder (since we don't have actual logos)
+    story.append(Paragraph("PHARMARETURNS PROCESSING CENTER", styles['LetterTitle']))
+    story.append(Spacer(1, 20))
+
+    # Letter details
+    story.append(Paragraph("Return Acknowledgment Letter", subtitle_style))
+    story.append(Spacer(1, 12))
+
+    story.append(Paragraph(f"Return Number: {return_report.return_no}", normal_style))
+    story.append(Paragraph(f"Invoice Date: {return_report.invoice_date.strftime('%B %d, %Y')}", normal_style))
+    story.append(Paragraph(f"Service Type: {return_report.service_type}", normal_style))
+    story.append(Spacer(1, 20))
+
+    # Summary table
+    story.append(Paragraph("Return Summary:", subtitle_style))
+
+    summary_data = [
+        ['ERV', 'Credit Received', 'Fees', 'Amount Paid', 'Last Payment Date'],
+        [
+            f"${return_report.ERV:.2f}",
+            f"${return_report.credit_received:.2f}",
+            f"${return_report.fees:.2f}",
+            f"${return_report.amount_paid:.2f}",
+            return_report.last_payment_date.strftime('%Y-%m-%d')
+        ]
+    ]
+    story.append(Table(summary_data, style=table_style()))
+    story.append(Spacer(1, 20))
+
+    # Manufacturer breakdown
+    if return_report.breakdowns:
+        story.append(Paragraph("Manufacturer Breakdown:", subtitle_style))
+
+        breakdown_rows = ([
+            breakdown.manufacturer_name,
+            f"${breakdown.ERV:.2f}",
+            breakdown.expiration_date.strftime('%Y-%m-%d')
+        ] for breakdown in return_report.breakdowns)
+        story.extend(chunked_tables(['Manufacturer', 'ERV', 'Expiration Date'], breakdown_rows, weights=[2, 1, 1]))
+        story.append(Spacer(1, 20))
+
+    # Closing
+    story.append(Paragraph("Thank you for your return submission. This letter serves as acknowledgment of receipt.", normal_style))
+    story.append(Spacer(1, 20))
+    story.append(Paragraph("Sincerely,", normal_style))
+    story.append(Spacer(1, 30))
+    story.append(Paragraph("PharmaReturns Processing Team", normal_style))
+    story.append(Paragraph("_______________________________", normal_style))
+    story.append(Paragraph("Signature", normal_style))
+
+    return _render(story)
+
+def returnable_nonreturnable_story(returnable_rows, non_returnable_rows, totals):
+    """Story for the returnable / non-returnable report.
+
+    ``returnable_rows`` and ``non_returnable_rows`` are iterables of already
+    formatted table rows, consumed while the document is laid out.
+    ``totals()`` is called once both tables are drawn and returns
+    (returnable_total, non_returnable_total).
+    """
+    styles = get_styles()
+    section_style = styles['LetterSubtitle']
+
+    # Title
+    yield Paragraph("Returnable / Non-Returnable Report", styles['LetterTitle'])
+    yield Spacer(1, 20)
+
+    sections = [
+        ("Returnable Items", ['Return No', 'Manufacturer', 'ERV', 'Expiration Date'], [1, 2, 1, 1], FONT_SIZE,
+         returnable_rows, 'green'),
+        # Eight columns only fit the page in 7pt; the weights are the widths in points
+        ("Non-Returnable Items", ['Return No', 'NDC', 'Description', 'Lot No', 'Exp Date', 'Manufacturer',
+                                  'Reason', 'Extended Price'], [59, 60, 71, 57, 48, 65, 62, 46], 7,
+         non_returnable_rows, 'red'),
+    ]
+    for title, header, weights, font_size, rows, color in sections:
+        yield Paragraph(title, section_style)
+        drew_rows = False
+        for table in chunked_tables(header, rows, table_style(color, font_size), weights=weights, font_size=font_size):
+            drew_rows = True
+            yield table
+        if drew_rows:
+            yield Spacer(1, 20)
+
+    # Totals
+    returnable_total, non_returnable_total = totals()
+    yield Paragraph("Totals", section_style)
+    yield Paragraph(f"Returnable Total: ${returnable_total:.2f}", styles['Normal'])
+    yield Paragraph(f"Non-Returnable Total: ${non_returnable_total:.2f}", styles['Normal'])
+    yield Paragraph(f"Grand Total: ${returnable_total + non_returnable_total:.2f}", styles['Normal'])
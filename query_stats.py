@@ -0,0 +1,202 @@
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+STATEMENT_COUNT_HEADER = 'X-SQL-Statement-Count'
+DB_TIME_HEADER = 'X-SQL-Time-Ms'
+SLOWEST_KEPT = 5
+
+def parameter_shape(parameters, executemany=False):
+    """Describe bound parameters by type only, e.g. "(str, int x 500)"; values are never recorded."""
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} rows of {_shape(rows[0])}" if rows else '0 rows'
+    return _shape(parameters)
+
+def _shape(parameters):
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in parameters.items()) + '}'
+    if not parameters:
+        return '()'
+    # Collapse runs such as the expanded parameters of an IN list
+    runs = []
+    for value in parameters:
+        name = type(value).__name__
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return '(' + ', '.join(name if count == 1 else f'{name} x {count}' for name, count in runs) + ')'
+
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_statement(statement):
+    """One line of SQL with expanded IN lists folded, so repeats of a query compare equal."""
+    return _IN_LIST.sub('(?, ...)', _WHITESPACE.sub(' ', statement).strip())
+
+class _Slowest:
+    """The N slowest (duration, statement, shape) entries seen, slowest first."""
+
+    def __init__(self, size=SLOWEST_KEPT):
+        self.size = size
+        self.entries = []
+
+    def add(self, duration, statement, shape):
+        if len(self.entries) < self.size or duration > self.entries[-1][0]:
+            self.entries.append((duration, statement, shape))
+            self.entries.sort(key=lambda entry: entry[0], reverse=True)
+            del self.entries[self.size:]
+
+class RequestStats:
+    """Statements run while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = _Slowest()
+
+class EndpointStats:
+    """Totals over every request an endpoint has handled since the last reset."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.requests = 0
+        self.statements = 0
+        self.db_time = 0.0
+        self.max_statements = 0
+        self.max_db_time = 0.0
+        self.slowest = _Slowest()
+
+    def add(self, stats):
+        self.requests += 1
+        self.statements += stats.count
+        self.db_time += stats.total_time
+        self.max_statements = max(self.max_statements, stats.count)
+        self.max_db_time = max(self.max_db_time, stats.total_time)
+        for entry in stats.slowest.entries:
+            self.slowest.add(*entry)
+
+    def as_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'requests': self.requests,
+            'statements': self.statements,
+            'avg_statements': self.statements / self.requests if self.requests else 0,
+            'max_statements': self.max_statements,
+            'db_time_ms': self.db_time * 1000,
+            'avg_db_time_ms': self.db_time * 1000 / self.requests if self.requests else 0,
+            'max_db_time_ms': self.max_db_time * 1000,
+            'slowest': [{'duration_ms': duration * 1000, 'statement': statement, 'parameters': shape}
+                        for duration, statement, shape in self.slowest.entries],
+        }
+
+class QueryStats:
+    """Per-request SQL statement counts and timings, per-endpoint totals and a slow-query log.
+
+    Statements are timed with engine cursor events. Each request's figures
+    are folded into totals per endpoint; statements slower than
+    SLOW_QUERY_THRESHOLD_MS are logged with their parameter types, never
+    their values.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.slow_queries = deque(maxlen=100)
+        self.since = datetime.utcnow()
+
+    def init_app(self, app):
+        self.app = app
+        # None reports the per-request figures in response headers only when TESTING is on
+        app.config.setdefault('SQL_STATEMENT_COUNT_HEADER', None)
+        app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', 250)
+        # Optional file the slow-query log is appended to, besides the application log
+        app.config.setdefault('SLOW_QUERY_LOG', None)
+        self.slow_queries = deque(maxlen=app.config.setdefault('SLOW_QUERY_KEEP', 100))
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _start_request(self):
+        g.sql_stats = RequestStats()
+
+    def _finish_request(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        endpoint = request.endpoint or 'unknown'
+        with self._lock:
+            self._endpoints.setdefault(endpoint, EndpointStats(endpoint)).add(stats)
+
+        enabled = self.app.config['SQL_STATEMENT_COUNT_HEADER']
+        if enabled is None:
+            enabled = self.app.testing
+        if enabled:
+            response.headers[STATEMENT_COUNT_HEADER] = str(stats.count)
+            response.headers[DB_TIME_HEADER] = f'{stats.total_time * 1000:.2f}'
+        return response
+
+    def record(self, statement, parameters, executemany, duration):
+        """Account one finished statement to the current request and the slow-query log."""
+        stats = g.get('sql_stats') if has_request_context() else None
+        threshold = self.app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000 if self.app else None
+        is_slow = threshold is not None and duration >= threshold
+        if stats is None and not is_slow:
+            return
+
+        normalized = normalize_statement(statement)
+        shape = parameter_shape(parameters, executemany)
+        if stats is not None:
+            stats.count += 1
+            stats.total_time += duration
+            stats.slowest.add(duration, normalized, shape)
+        if is_slow:
+            self._log_slow_query(normalized, shape, duration)
+
+    def _log_slow_query(self, statement, shape, duration):
+        endpoint = request.endpoint if has_request_context() else None
+        entry = {'at': datetime.utcnow(), 'endpoint': endpoint or '-', 'duration_ms': duration * 1000,
+                 'statement': statement, 'parameters': shape}
+        self.slow_queries.appendleft(entry)
+        message = f"Slow query ({entry['duration_ms']:.1f} ms, {entry['endpoint']}): {statement} -- params {shape}"
+        self.app.logger.warning(message)
+        path = self.app.config['SLOW_QUERY_LOG']
+        if path:
+            with self._lock, open(path, 'a', encoding='utf-8') as log:
+                log.write(f"{entry['at'].isoformat(timespec='seconds')} {message}\n")
+
+    def endpoint_stats(self):
+        """Per-endpoint totals, the endpoints spending the most time in the database first."""
+        with self._lock:
+            rows = [stats.as_dict() for stats in self._endpoints.values()]
+        return sorted(rows, key=lambda row: row['db_time_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.slow_queries.clear()
+            self.since = datetime.utcnow()
+
+query_stats = QueryStats()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start_time'].pop()
+    query_stats.record(statement, parameters, executemany, time.perf_counter() - started)
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start_time'):
+        connection.info['query_start_time'].pop()
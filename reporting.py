@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+from sqlalchemy import case, func
+from models import db, ReturnCategory, ManufacturerRollup, CategoryRollup, ReasonRollup
+from caching import get_reason_ids, dashboard_cache
+from rollups import get_report_totals, erv_trend
+
+NON_RETURNABLE_REASONS = ['Non-Returnable', 'Outdated', 'Short Dated']
+MANUFACTURER_COLORS = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40', '#FF6384', '#C9CBCF']
+
+def _reason_ids(*names):
+    reason_ids = get_reason_ids()
+    return [reason_ids[name] for name in names if name in reason_ids]
+
+def _sum_for(column, reason_ids):
+    """SUM(column) over the rollup rows of the given reasons, as one conditional aggregate."""
+    return func.coalesce(func.sum(case((ReasonRollup.reason_id.in_(reason_ids), column), else_=0)), 0)
+
+def classification_summary():
+    """Values and counts per classification from a single scan of the reason rollup."""
+    short_dated = _reason_ids('Short Dated')
+    outdated = _reason_ids('Outdated')
+    non_returnable = _reason_ids('Non-Returnable')
+    returnable = _reason_ids('Returnable')
+
+    row = db.session.query(
+        _sum_for(ReasonRollup.total_value, short_dated).label('short_dated_value'),
+        _sum_for(ReasonRollup.total_value, outdated).label('outdated_value'),
+        _sum_for(ReasonRollup.total_value, non_returnable).label('non_returnable_value'),
+        _sum_for(ReasonRollup.item_count, returnable).label('returnable_count'),
+        _sum_for(ReasonRollup.item_count, _reason_ids(*NON_RETURNABLE_REASONS)).label('non_returnable_count'),
+    ).one()
+    return row._asdict()
+
+def compute_report_data():
+    """Template context for reports.html, shared by the reports and reports_summary pages.
+
+    Reads only the rollup tables: totals, one conditional-aggregate scan for
+    the classification figures, and the manufacturer and category groups.
+    """
+    totals = get_report_totals()
+    total_erv = totals.total_erv
+
+    # Aggregated manufacturer data, with percentages
+    manufacturer_data = [
+        SimpleNamespace(manufacturer_name=m.manufacturer_name, total_erv=m.total_erv, return_count=m.breakdown_count,
+                        percentage=(m.total_erv / total_erv * 100) if total_erv > 0 else 0)
+        for m in ManufacturerRollup.query.order_by(ManufacturerRollup.manufacturer_name)
+    ]
+
+    # Aggregated category data
+    category_data = db.session.query(
+        ReturnCategory.name,
+        CategoryRollup.total_value,
+        CategoryRollup.item_count
+    ).join(CategoryRollup.category).order_by(ReturnCategory.name).all()
+
+    # Data for charts
+    manufacturer_labels = [m.manufacturer_name for m in manufacturer_data]
+
+    return dict(
+        classification_summary(),
+        total_erv=total_erv,
+        total_credits=totals.total_credits,
+        total_fees=totals.total_fees,
+        manufacturer_data=manufacturer_data,
+        category_data=category_data,
+        manufacturer_labels=manufacturer_labels,
+        manufacturer_percentages=[m.percentage for m in manufacturer_data],
+        manufacturer_colors=MANUFACTURER_COLORS[:len(manufacturer_labels)],
+    )
+
+def period_label(start, granularity):
+    """Chart label for the period starting on ``start``."""
+    if granularity == 'month':
+        return start.strftime('%Y-%m')
+    if granularity == 'quarter':
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    return start.isoformat()
+
+def compute_dashboard_metrics(granularity='month', start_date=None, end_date=None):
+    """Figures shown on a regular user's dashboard."""
+    short_dated = _reason_ids('Short Dated')
+    total_short_dated = db.session.query(_sum_for(ReasonRollup.total_value, short_dated)).scalar()
+
+    # Top 5 manufacturers by ERV
+    top_manufacturers = [
+        SimpleNamespace(manufacturer_name=m.manufacturer_name, total_erv=m.total_erv)
+        for m in ManufacturerRollup.query.order_by(ManufacturerRollup.total_erv.desc()).limit(5)
+    ]
+
+    return {
+        'total_erv': get_report_totals().total_erv,
+        'total_short_dated': total_short_dated,
+        'top_manufacturers': top_manufacturers,
+        # ERV trend from the time-bucket rollup, as plain dicts for JSON serialization in the chart
+        'erv_trend': [{'period': period_label(start, granularity), 'total_erv': float(total or 0)}
+                      for start, total in erv_trend(granularity, start_date, end_date)],
+    }
+
+def get_dashboard_metrics(user_id, role, granularity='month', start_date=None, end_date=None):
+    """Dashboard figures for one user and trend selection, served from the dashboard cache."""
+    return dashboard_cache.get_or_load((user_id, role, granularity, start_date, end_date),
+                                       lambda: compute_dashboard_metrics(granularity, start_date, end_date))
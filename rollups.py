@@ -0,0 +1,261 @@
+import importlib
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import event, select, insert, update, delete, func, inspect
+from models import db, ReturnReport, ManufacturerBreakdown, ReturnItem
+from models import ManufacturerRollup, CategoryRollup, ReasonRollup, ReportTotals, ErvTimeBucket
+
+# Rollup model -> (key columns, summed columns, count column)
+ROLLUPS = {
+    ManufacturerRollup: (('manufacturer_name',), ('total_erv', 'breakdown_count'), 'breakdown_count'),
+    CategoryRollup: (('category_id',), ('total_value', 'item_count'), 'item_count'),
+    ReasonRollup: (('reason_id',), ('total_value', 'item_count'), 'item_count'),
+    ReportTotals: (('id',), ('total_erv', 'total_credits', 'total_fees', 'return_count'), None),
+    ErvTimeBucket: (('granularity', 'bucket_start'), ('total_erv', 'return_count'), 'return_count'),
+}
+
+GRANULARITIES = ('day', 'week', 'month', 'quarter')
+
+def bucket_start(day, granularity):
+    """First day of the day/week/month/quarter containing ``day``; weeks start on Monday."""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    raise ValueError(f'Unknown granularity: {granularity}')
+
+def _bucket_deltas(invoice_date, erv):
+    # Bucketing happens here rather than in SQL so it works the same on every database
+    if invoice_date is None:
+        return []
+    return [(ErvTimeBucket, (granularity, bucket_start(invoice_date, granularity)), (erv, 1))
+            for granularity in GRANULARITIES]
+
+def _report_deltas(v):
+    return ([(ReportTotals, (1,), (v['ERV'], v['credit_received'], v['fees'], 1))]
+            + _bucket_deltas(v['invoice_date'], v['ERV']))
+
+# Source model -> (columns the rollups read, values -> [(rollup, key, amounts)])
+SOURCES = {
+    ReturnItem: (
+        ('reason_id', 'category_id', 'extended_price'),
+        lambda v: [(ReasonRollup, (v['reason_id'],), (v['extended_price'], 1)),
+                   (CategoryRollup, (v['category_id'],), (v['extended_price'], 1))],
+    ),
+    ManufacturerBreakdown: (
+        ('manufacturer_name', 'ERV'),
+        lambda v: [(ManufacturerRollup, (v['manufacturer_name'],), (v['ERV'], 1))],
+    ),
+    ReturnReport: (
+        ('ERV', 'credit_received', 'fees', 'invoice_date'),
+        _report_deltas,
+    ),
+}
+
+class RollupDeltas:
+    """Pending changes to the rollup tables, accumulated per group before they are written."""
+
+    def __init__(self):
+        self.groups = defaultdict(dict)
+        self.has_removals = False
+
+    def add(self, model, values, sign=1):
+        """Count one source row's column values in (sign=1) or out (sign=-1)."""
+        self.add_contributions(SOURCES[model][1](values), sign)
+
+    def add_contributions(self, contributions, sign=1):
+        """Add (rollup, key, amounts) triples."""
+        for rollup, key, amounts in contributions:
+            current = self.groups[rollup].get(key)
+            signed = [sign * (amount or 0) for amount in amounts]
+            self.groups[rollup][key] = signed if current is None else [a + b for a, b in zip(current, signed)]
+        if sign < 0:
+            self.has_removals = True
+
+    def apply(self, connection):
+        """Write the accumulated deltas with one upsert per rollup table."""
+        for rollup, groups in self.groups.items():
+            key_columns, amount_columns, count_column = ROLLUPS[rollup]
+            rows = [dict(zip(key_columns, key), **dict(zip(amount_columns, amounts)))
+                    for key, amounts in groups.items()]
+            if rows:
+                _upsert(connection, rollup.__table__, key_columns, amount_columns, rows)
+            if self.has_removals and count_column:
+                # Drop groups whose last row was removed
+                table = rollup.__table__
+                connection.execute(delete(table).where(table.c[count_column] <= 0))
+        self.groups.clear()
+        self.has_removals = False
+
+def _upsert(connection, table, key_columns, amount_columns, rows):
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # Only the dialect in use is imported; loading both slows application startup
+        stmt = importlib.import_module(f'sqlalchemy.dialects.{dialect}').insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={name: table.c[name] + stmt.excluded[name] for name in amount_columns}
+        )
+        connection.execute(stmt, rows)
+        return
+
+    # Other databases: update in place, insert the groups that did not exist yet
+    for row in rows:
+        stmt = update(table).where(*[table.c[name] == row[name] for name in key_columns]).values(
+            {name: table.c[name] + row[name] for name in amount_columns})
+        if not connection.execute(stmt).rowcount:
+            connection.execute(insert(table), [row])
+
+def _tracked_changes(obj):
+    """True when a flushed object changes a column some rollup reads."""
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in SOURCES[type(obj)][0])
+
+def _load_stored_values(connection, model, ids, deltas):
+    """Count the database's current version of rows out of the rollups."""
+    columns = SOURCES[model][0]
+    table = model.__table__
+    for chunk_start in range(0, len(ids), 500):
+        chunk = ids[chunk_start:chunk_start + 500]
+        for row in connection.execute(select(*[table.c[name] for name in columns]).where(table.c.id.in_(chunk))):
+            deltas.add(model, dict(zip(columns, row)), sign=-1)
+
+@event.listens_for(db.session, 'before_flush')
+def _before_flush(session, flush_context, instances):
+    deltas = session.info.setdefault('rollup_deltas', RollupDeltas())
+    counted_in = session.info.setdefault('rollup_pending', [])
+    stored = defaultdict(list)
+
+    for obj in session.deleted:
+        if type(obj) in SOURCES and obj.id is not None:
+            stored[type(obj)].append(obj.id)
+    for obj in session.dirty:
+        if type(obj) in SOURCES and _tracked_changes(obj):
+            stored[type(obj)].append(obj.id)
+            counted_in.append(obj)
+    for obj in session.new:
+        if type(obj) in SOURCES:
+            counted_in.append(obj)
+
+    # Old values come from the database rather than attribute history, which
+    # does not hold the previous value of attributes expired by a commit
+    if stored:
+        connection = session.connection()
+        for model, ids in stored.items():
+            _load_stored_values(connection, model, ids, deltas)
+
+@event.listens_for(db.session, 'after_flush')
+def _after_flush(session, flush_context):
+    deltas = session.info.pop('rollup_deltas', None)
+    counted_in = session.info.pop('rollup_pending', [])
+    if deltas is None:
+        return
+    for obj in counted_in:
+        if obj not in session.deleted:
+            model = type(obj)
+            deltas.add(model, {name: getattr(obj, name) for name in SOURCES[model][0]})
+    deltas.apply(session.connection())
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _bulk_insert(orm_execute_state):
+    # Bulk INSERTs such as classification.insert_rows() bypass the flush
+    if not orm_execute_state.is_insert:
+        return
+    mapper = orm_execute_state.bind_mapper
+    model = mapper.class_ if mapper is not None else None
+    params = orm_execute_state.parameters
+    if model not in SOURCES or not params:
+        return
+    deltas = RollupDeltas()
+    for row in (params if isinstance(params, list) else [params]):
+        deltas.add(model, row)
+    deltas.apply(orm_execute_state.session.connection())
+
+def subtract_return_trees(connection, report_ids):
+    """Count returns and their items and breakdowns out of the rollups ahead of a set-based delete.
+
+    Core DELETE statements bypass the flush, so the removed rows are summed
+    here per rollup group instead.
+    """
+    deltas = RollupDeltas()
+    items, breakdowns, reports = ReturnItem.__table__, ManufacturerBreakdown.__table__, ReturnReport.__table__
+    for reason_id, total, count in connection.execute(
+            select(items.c.reason_id, func.sum(items.c.extended_price), func.count())
+            .where(items.c.return_report_id.in_(report_ids)).group_by(items.c.reason_id)):
+        deltas.add_contributions([(ReasonRollup, (reason_id,), (total, count))], sign=-1)
+    for category_id, total, count in connection.execute(
+            select(items.c.category_id, func.sum(items.c.extended_price), func.count())
+            .where(items.c.return_report_id.in_(report_ids)).group_by(items.c.category_id)):
+        deltas.add_contributions([(CategoryRollup, (category_id,), (total, count))], sign=-1)
+    for manufacturer_name, total, count in connection.execute(
+            select(breakdowns.c.manufacturer_name, func.sum(breakdowns.c.ERV), func.count())
+            .where(breakdowns.c.return_report_id.in_(report_ids)).group_by(breakdowns.c.manufacturer_name)):
+        deltas.add_contributions([(ManufacturerRollup, (manufacturer_name,), (total, count))], sign=-1)
+    for invoice_date, erv, credits, fees, count in connection.execute(
+            select(reports.c.invoice_date, func.sum(reports.c.ERV), func.sum(reports.c.credit_received),
+                   func.sum(reports.c.fees), func.count())
+            .where(reports.c.id.in_(report_ids)).group_by(reports.c.invoice_date)):
+        deltas.add_contributions([(ReportTotals, (1,), (erv, credits, fees, count))]
+                                 + [(rollup, key, (erv, count)) for rollup, key, _ in _bucket_deltas(invoice_date, erv)],
+                                 sign=-1)
+    deltas.apply(connection)
+
+def rebuild_rollups(session=None):
+    """Recompute every rollup table from the source tables in set-based statements."""
+    session = session or db.session
+    for rollup in ROLLUPS:
+        session.execute(delete(rollup))
+
+    session.execute(insert(ManufacturerRollup).from_select(
+        ['manufacturer_name', 'total_erv', 'breakdown_count'],
+        select(ManufacturerBreakdown.manufacturer_name, func.sum(ManufacturerBreakdown.ERV),
+               func.count(ManufacturerBreakdown.id)).group_by(ManufacturerBreakdown.manufacturer_name)
+    ))
+    session.execute(insert(CategoryRollup).from_select(
+        ['category_id', 'total_value', 'item_count'],
+        select(ReturnItem.category_id, func.sum(ReturnItem.extended_price),
+               func.count(ReturnItem.id)).group_by(ReturnItem.category_id)
+    ))
+    session.execute(insert(ReasonRollup).from_select(
+        ['reason_id', 'total_value', 'item_count'],
+        select(ReturnItem.reason_id, func.sum(ReturnItem.extended_price),
+               func.count(ReturnItem.id)).group_by(ReturnItem.reason_id)
+    ))
+    totals = session.execute(select(
+        func.coalesce(func.sum(ReturnReport.ERV), 0.0), func.coalesce(func.sum(ReturnReport.credit_received), 0.0),
+        func.coalesce(func.sum(ReturnReport.fees), 0.0), func.count(ReturnReport.id)
+    )).one()
+    session.execute(insert(ReportTotals).values(id=1, total_erv=totals[0], total_credits=totals[1],
+                                                total_fees=totals[2], return_count=totals[3]))
+
+    buckets = RollupDeltas()
+    for invoice_date, erv in session.execute(
+            select(ReturnReport.invoice_date, ReturnReport.ERV).where(ReturnReport.invoice_date.isnot(None))
+            .execution_options(yield_per=1000)):
+        buckets.add_contributions(_bucket_deltas(invoice_date, erv))
+    buckets.apply(session.connection())
+    session.commit()
+
+def ensure_rollups():
+    """Build the rollups once for a database that predates them, or predates one of them."""
+    totals = db.session.get(ReportTotals, 1)
+    if totals is None or (totals.return_count and db.session.query(ErvTimeBucket.granularity).first() is None):
+        rebuild_rollups()
+
+def get_report_totals():
+    totals = db.session.get(ReportTotals, 1)
+    return totals or ReportTotals(id=1, total_erv=0.0, total_credits=0.0, total_fees=0.0, return_count=0)
+
+def erv_trend(granularity='month', start_date=None, end_date=None):
+    """ERV per period from the time-bucket rollup, oldest first. Returns [(bucket_start, total_erv)]."""
+    query = db.session.query(ErvTimeBucket.bucket_start, ErvTimeBucket.total_erv).filter(
+        ErvTimeBucket.granularity == granularity)
+    if start_date:
+        query = query.filter(ErvTimeBucket.bucket_start >= bucket_start(start_date, granularity))
+    if end_date:
+        query = query.filter(ErvTimeBucket.bucket_start <= end_date)
+    return query.order_by(ErvTimeBucket.bucket_start).all()
@@ -0,0 +1,264 @@
+import re
+from collections import defaultdict, namedtuple
+from markupsafe import escape, Markup
+from sqlalchemy import (MetaData, Table, Column, Integer, BigInteger, String, Text, event, select, insert, delete,
+                        func, literal, literal_column, inspect, text, true)
+from models import db, ReturnReport, ReturnItem, CheckStatement
+
+# Each document packs its kind into the id so a write touches it by primary key
+# (the FTS5 rowid): doc_id = ref_id * 4 + KIND_CODES[kind]
+KIND_CODES = {'return': 1, 'item': 2, 'check': 3}
+KINDS = tuple(KIND_CODES)
+
+# Searchable columns, most specific first, and their rank weights
+FIELDS = ('code', 'alt_code', 'text', 'manufacturer')
+FIELD_WEIGHTS = (10.0, 5.0, 1.0, 3.0)
+
+# Source model -> (kind, parent column, {field: source column})
+SOURCES = {
+    ReturnReport: ('return', None, {'code': 'return_no', 'text': 'service_type'}),
+    ReturnItem: ('item', 'return_report_id', {'code': 'ndc', 'alt_code': 'lot_no', 'text': 'description',
+                                              'manufacturer': 'manufacturer'}),
+    CheckStatement: ('check', None, {'code': 'statement_no', 'alt_code': 'check_no'}),
+}
+
+SearchHit = namedtuple('SearchHit', 'kind ref_id parent_id code snippet score return_no')
+
+_HIGHLIGHT_START, _HIGHLIGHT_END = '\x02', '\x03'
+
+def _index_table(id_column):
+    return Table(
+        'search_index', MetaData(),
+        Column(id_column, BigInteger, key='doc_id', primary_key=True),
+        Column('kind', String(10)),
+        Column('ref_id', Integer),
+        Column('parent_id', Integer),
+        *[Column(field, Text) for field in FIELDS],
+    )
+
+# SQLite addresses FTS5 documents by the implicit rowid
+_TABLES = {'sqlite': _index_table('rowid'), 'postgresql': _index_table('doc_id')}
+
+def _pg_vector(expression):
+    # Split codes such as NDCs and return numbers into their alphanumeric parts, as FTS5 does
+    return func.to_tsvector('simple', func.regexp_replace(func.coalesce(expression, ''), '[^[:alnum:]]+', ' ', 'g'))
+
+_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, parent_id UNINDEXED, code, alt_code, text, manufacturer, "
+        "tokenize = 'unicode61', prefix = '2 3')",
+    ],
+    'postgresql': [
+        "CREATE TABLE IF NOT EXISTS search_index ("
+        "doc_id BIGINT PRIMARY KEY, kind VARCHAR(10) NOT NULL, ref_id INTEGER NOT NULL, parent_id INTEGER, "
+        "code TEXT, alt_code TEXT, text TEXT, manufacturer TEXT, "
+        "document tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', regexp_replace(coalesce(code, '') || ' ' || coalesce(alt_code, ''), '[^[:alnum:]]+', ' ', 'g')), 'A') || "
+        "setweight(to_tsvector('simple', regexp_replace(coalesce(manufacturer, ''), '[^[:alnum:]]+', ' ', 'g')), 'B') || "
+        "setweight(to_tsvector('simple', regexp_replace(coalesce(text, ''), '[^[:alnum:]]+', ' ', 'g')), 'C')"
+        ") STORED)",
+        "CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)",
+    ],
+}
+
+def _table(connection):
+    return _TABLES.get(connection.dialect.name)
+
+def index_supported(connection):
+    return connection.dialect.name in _TABLES
+
+def create_search_index(connection):
+    """Create the search index table if this database supports one. Returns True when it did."""
+    if not index_supported(connection) or inspect(connection).has_table('search_index'):
+        return False
+    for statement in _DDL[connection.dialect.name]:
+        connection.execute(text(statement))
+    return True
+
+def _document_select(model, where):
+    kind, parent, fields = SOURCES[model]
+    table = model.__table__
+    columns = [
+        (table.c.id * 4 + KIND_CODES[kind]).label('doc_id'),
+        literal(kind).label('kind'),
+        table.c.id.label('ref_id'),
+        (table.c[parent] if parent else literal(None, Integer)).label('parent_id'),
+    ]
+    columns += [(table.c[fields[field]] if field in fields else literal('')).label(field) for field in FIELDS]
+    return select(*columns).where(where)
+
+def refresh_documents(connection, model, ids):
+    """Re-index the rows of ``model`` with the given ids; ids that no longer exist are dropped."""
+    index = _table(connection)
+    if index is None or not ids:
+        return
+    code = KIND_CODES[SOURCES[model][0]]
+    ids = sorted(set(ids))
+    for chunk_start in range(0, len(ids), 500):
+        chunk = ids[chunk_start:chunk_start + 500]
+        connection.execute(delete(index).where(index.c.doc_id.in_([ref_id * 4 + code for ref_id in chunk])))
+        connection.execute(insert(index).from_select(
+            ['doc_id', 'kind', 'ref_id', 'parent_id', *FIELDS],
+            _document_select(model, model.__table__.c.id.in_(chunk))))
+
+def remove_documents(connection, model, ids):
+    """Drop the documents of ``model`` rows that are about to be deleted outside the ORM."""
+    index = _table(connection)
+    if index is None or not ids:
+        return
+    code = KIND_CODES[SOURCES[model][0]]
+    ids = sorted(set(ids))
+    for chunk_start in range(0, len(ids), 500):
+        chunk = ids[chunk_start:chunk_start + 500]
+        connection.execute(delete(index).where(index.c.doc_id.in_([ref_id * 4 + code for ref_id in chunk])))
+
+def rebuild_search_index(session=None):
+    """Drop and re-create every search document from the source tables."""
+    session = session or db.session
+    connection = session.connection()
+    index = _table(connection)
+    if index is None:
+        return
+    create_search_index(connection)
+    connection.execute(delete(index))
+    for model in SOURCES:
+        connection.execute(insert(index).from_select(['doc_id', 'kind', 'ref_id', 'parent_id', *FIELDS],
+                                                     _document_select(model, true())))
+    session.commit()
+
+def ensure_search_index():
+    """Create and fill the search index for a database that predates it."""
+    if create_search_index(db.session.connection()):
+        rebuild_search_index()
+    else:
+        db.session.commit()
+
+# --- Keeping the index in sync ---
+
+def _tracked_changes(obj):
+    """True when a flushed object changes a column the index reads."""
+    state = inspect(obj)
+    return any(state.attrs[column].history.has_changes() for column in SOURCES[type(obj)][2].values())
+
+@event.listens_for(db.session, 'after_flush')
+def _after_flush(session, flush_context):
+    # Pre-flush collections and attribute history are still available here, and new rows have their ids
+    changed = defaultdict(set)
+    for obj in list(session.new) + list(session.deleted) + [obj for obj in session.dirty
+                                                            if type(obj) in SOURCES and _tracked_changes(obj)]:
+        if type(obj) in SOURCES and obj.id is not None:
+            changed[type(obj)].add(obj.id)
+    if changed:
+        connection = session.connection()
+        for model, ids in changed.items():
+            refresh_documents(connection, model, ids)
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _bulk_insert(orm_execute_state):
+    # Bulk INSERTs bypass the flush and carry no ids; note where the new rows will start
+    # and index them before the transaction commits
+    if not orm_execute_state.is_insert:
+        return
+    mapper = orm_execute_state.bind_mapper
+    model = mapper.class_ if mapper is not None else None
+    if model not in SOURCES:
+        return
+    session = orm_execute_state.session
+    pending = session.info.setdefault('search_bulk_inserts', {})
+    if model not in pending:
+        pending[model] = session.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+
+@event.listens_for(db.session, 'before_commit')
+def _before_commit(session):
+    pending = session.info.pop('search_bulk_inserts', None)
+    if not pending:
+        return
+    connection = session.connection()
+    for model, watermark in pending.items():
+        ids = connection.execute(select(model.__table__.c.id).where(model.__table__.c.id > watermark)).scalars().all()
+        refresh_documents(connection, model, ids)
+
+@event.listens_for(db.session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('search_bulk_inserts', None)
+
+# --- Queries ---
+
+def _terms(query_text):
+    """Whitespace-separated terms as lists of their alphanumeric parts."""
+    return [parts for parts in (re.findall(r'\w+', term) for term in query_text.split()) if parts]
+
+def _fts5_query(terms, field=None):
+    # Each term is a phrase of its parts with a prefix match on the last one: "0002 1234"*
+    expression = ' '.join('"%s"*' % ' '.join(parts) for parts in terms)
+    return f'{{{field}}} : ({expression})' if field else expression
+
+def _pg_query(terms):
+    return ' & '.join(' <-> '.join(f'{part}:*' for part in parts) for parts in terms)
+
+def _match(connection, index, terms, field=None):
+    """WHERE clause and relevance score (higher is better) for ``terms``."""
+    if connection.dialect.name == 'sqlite':
+        table = literal_column('search_index')
+        weights = [literal_column('0')] * 3 + [literal_column(repr(weight)) for weight in FIELD_WEIGHTS]
+        return table.op('MATCH')(_fts5_query(terms, field)), -func.bm25(table, *weights)
+    tsquery = func.to_tsquery('simple', _pg_query(terms))
+    document = literal_column('search_index.document')
+    clause = document.op('@@')(tsquery)
+    if field:
+        clause = clause & _pg_vector(index.c[field]).op('@@')(tsquery)
+    return clause, func.ts_rank(document, tsquery)
+
+def search_filter(kind, field, term, id_column, fallback_column, words=False):
+    """Filter rows whose ``fallback_column`` contains ``term``, e.g. returns by part of a return_no.
+
+    This is a substring ILIKE, so ``24-00`` finds ``RTN-2024-001``. With
+    ``words=True`` the terms are instead matched as word prefixes through the
+    index, which skips the table scan but no longer finds text inside a word.
+    Input without any letters or digits, or a database without an index,
+    always uses the ILIKE.
+    """
+    substring = fallback_column.ilike(f'%{term}%')
+    if not words:
+        return substring
+    connection = db.session.connection()
+    terms = _terms(term)
+    index = _table(connection)
+    if not terms or index is None:
+        return substring
+    clause, _ = _match(connection, index, terms, field)
+    return id_column.in_(select(index.c.ref_id).where(clause, index.c.kind == kind))
+
+def _highlight(snippet):
+    if not snippet:
+        return Markup('')
+    return Markup(str(escape(snippet)).replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>'))
+
+def search(query_text, kinds=None, limit=20):
+    """Ranked hits for ``query_text`` across returns, items and checks, best first."""
+    connection = db.session.connection()
+    index = _table(connection)
+    terms = _terms(query_text)
+    if index is None or not terms:
+        return []
+    clause, score = _match(connection, index, terms)
+    if connection.dialect.name == 'sqlite':
+        snippet = func.snippet(literal_column('search_index'), -1, _HIGHLIGHT_START, _HIGHLIGHT_END, '…', 12)
+    else:
+        snippet = func.ts_headline('simple', index.c.code + ' ' + index.c.alt_code + ' ' + index.c.manufacturer + ' ' + index.c.text,
+                                   func.to_tsquery('simple', _pg_query(terms)),
+                                   f'StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_END}')
+    statement = select(index.c.kind, index.c.ref_id, index.c.parent_id, index.c.code,
+                       snippet.label('snippet'), score.label('score')).where(clause)
+    if kinds:
+        statement = statement.where(index.c.kind.in_(kinds))
+    rows = connection.execute(statement.order_by(literal_column('score').desc()).limit(limit)).all()
+
+    # Items link to their return, so look up the return numbers in one query
+    parent_ids = {row.parent_id for row in rows if row.kind == 'item'}
+    return_nos = dict(db.session.query(ReturnReport.id, ReturnReport.return_no)
+                      .filter(ReturnReport.id.in_(parent_ids))) if parent_ids else {}
+    return [SearchHit(row.kind, row.ref_id, row.parent_id, row.code, _highlight(row.snippet), row.score,
+                      row.code if row.kind == 'return' else return_nos.get(row.parent_id))
+            for row in rows]
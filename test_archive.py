@@ -0,0 +1,75 @@
+from datetime import date
+from conftest import login, assert_rollups_match_a_rebuild
+
+def _add_return(return_no, invoice_date):
+    from models import db, ReturnReport, ReturnItem, ManufacturerBreakdown, ReturnCategory
+    from caching import get_reason_ids
+    category = ReturnCategory.query.filter_by(name='Archive').first() or ReturnCategory(name='Archive')
+    report = ReturnReport(return_no=return_no, invoice_date=invoice_date, service_type='Standard Return', ERV=40.0,
+                          credit_received=5.0, fees=1.0, amount_paid=0, last_payment_date=invoice_date)
+    report.breakdowns.append(ManufacturerBreakdown(manufacturer_name='Archive Pharma', ERV=40.0, expiration_date=invoice_date))
+    for n in range(2):
+        report.items.append(ReturnItem(ndc=f'6666000000{n}', description='Archive item', lot_no=f'ARCH{return_no}{n}',
+                                       exp_date=invoice_date, pkg_size=1, full_qty=1, partial_qty=0, unit_price=20.0,
+                                       extended_price=20.0, category=category,
+                                       reason_id=get_reason_ids()['Outdated'], manufacturer='Archive Pharma'))
+    db.session.add_all([category, report])
+    db.session.commit()
+    return report.id
+
+def _search_refs(return_no):
+    from search_index import search
+    return [(hit.kind, hit.code) for hit in search(return_no)]
+
+def test_delete_return_removes_the_tree_and_keeps_rollups_and_search_in_step(app, client):
+    from models import db, ReturnReport, ReturnItem, ManufacturerBreakdown
+    with app.app_context():
+        report_id = _add_return('RTN-DELETE-1', date(2033, 3, 3))
+        assert _search_refs('RTN-DELETE-1')
+
+    login(client, 'admin', 'admin123')
+    response = client.post('/admin/returns/RTN-DELETE-1/delete')
+    assert response.status_code == 302
+    assert client.post('/admin/returns/RTN-DELETE-1/delete').status_code == 404
+
+    with app.app_context():
+        assert db.session.get(ReturnReport, report_id) is None
+        assert ReturnItem.query.filter_by(return_report_id=report_id).count() == 0
+        assert ManufacturerBreakdown.query.filter_by(return_report_id=report_id).count() == 0
+        assert _search_refs('RTN-DELETE-1') == []
+        assert_rollups_match_a_rebuild()
+
+def test_archive_job_moves_old_returns_in_batches(app, client):
+    from models import db, ReturnReport, ReturnItem, ManufacturerBreakdown, Job
+    from models import ArchivedReturnReport, ArchivedReturnItem, ArchivedManufacturerBreakdown
+    with app.app_context():
+        old_ids = [_add_return(f'RTN-ARCHIVE-{n}', date(1990, 1, n + 1)) for n in range(3)]
+        recent_id = _add_return('RTN-ARCHIVE-RECENT', date(2033, 1, 1))
+
+    login(client, 'admin', 'admin123')
+    settings = {key: app.config[key] for key in ('ARCHIVE_AFTER_DAYS', 'ARCHIVE_BATCH_SIZE')}
+    app.config.update(ARCHIVE_AFTER_DAYS=(date.today() - date(2000, 1, 1)).days, ARCHIVE_BATCH_SIZE=2)
+    try:
+        response = client.post('/admin/returns/archive')
+    finally:
+        app.config.update(settings)
+    assert response.status_code == 302
+
+    with app.app_context():
+        job = Job.query.filter_by(kind='archive_returns').order_by(Job.id.desc()).first()
+        assert job.status == 'Finished' and (job.progress, job.total) == (3, 3)
+
+        assert ReturnReport.query.filter(ReturnReport.id.in_(old_ids)).count() == 0
+        assert ReturnItem.query.filter(ReturnItem.return_report_id.in_(old_ids)).count() == 0
+        assert ManufacturerBreakdown.query.filter(ManufacturerBreakdown.return_report_id.in_(old_ids)).count() == 0
+        assert db.session.get(ReturnReport, recent_id) is not None
+
+        archived = ArchivedReturnReport.query.filter(ArchivedReturnReport.id.in_(old_ids)).all()
+        assert sorted(report.return_no for report in archived) == ['RTN-ARCHIVE-0', 'RTN-ARCHIVE-1', 'RTN-ARCHIVE-2']
+        assert ArchivedReturnItem.query.filter(ArchivedReturnItem.return_report_id.in_(old_ids)).count() == 6
+        assert ArchivedManufacturerBreakdown.query.filter(
+            ArchivedManufacturerBreakdown.return_report_id.in_(old_ids)).count() == 3
+
+        assert _search_refs('RTN-ARCHIVE-0') == []
+        assert _search_refs('RTN-ARCHIVE-RECENT')
+        assert_rollups_match_a_rebuild()
@@ -0,0 +1,83 @@
+import io
+import zipfile
+from datetime import date
+from conftest import login, count_statements
+
+DAY = date(2036, 6, 1)
+
+def _submissions(app, count, day=DAY):
+    from models import db, User, Submission, SubmissionItem
+    with app.app_context():
+        user = User.query.filter_by(username='user1').one()
+        for n in range(count):
+            submission = Submission(user_id=user.id, status='Submitted', submission_date=day)
+            submission.items.append(SubmissionItem(ndc='0002-1234-01', quantity=n + 1, expiration_date=date(2038, 1, 1),
+                                                   estimated_credit=10.0 * (n + 1)))
+            db.session.add(submission)
+        db.session.commit()
+
+def test_documents_are_versioned_and_snapshotted_in_grouped_queries(app):
+    from batch_export import manifest_documents, manifest_snapshot
+    from pdf_cache import submission_state_version
+    _submissions(app, 2, date(2036, 6, 2))
+    _submissions(app, 6, date(2036, 6, 3))
+    with app.app_context():
+        with count_statements(app) as few:
+            [manifest_snapshot(d.record) for d in manifest_documents(date(2036, 6, 2))]
+        with count_statements(app) as many:
+            documents = manifest_documents(date(2036, 6, 3))
+            snapshots = [manifest_snapshot(d.record) for d in documents]
+        assert len(documents) == 6 and [len(s.items) for s in snapshots] == [1] * 6
+        assert len(many) == len(few)
+        # Same fingerprint as a single download computes, so both share cache entries
+        assert [d.version for d in documents] == [submission_state_version(d.record) for d in documents]
+
+def test_zip_and_merged_pdf_hold_every_document(app, client):
+    import pypdfium2 as pdfium
+    _submissions(app, 3)
+    login(client, 'reviewer1', 'review123')
+
+    response = client.get(f'/batch_export/manifests?date={DAY}')
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        names = archive.namelist()
+        assert len(names) == 3 and all(name.startswith('manifest_') for name in names)
+        assert all(archive.read(name).startswith(b'%PDF') for name in names)
+    response.close()  # releases the export slot
+
+    response = client.get(f'/batch_export/manifests?date={DAY}&format=pdf')
+    assert response.status_code == 200
+    merged = pdfium.PdfDocument(response.data)
+    try:
+        assert len(merged) >= 3
+    finally:
+        merged.close()
+
+def test_rendered_documents_warm_the_pdf_cache(app):
+    from batch_export import batch_exporter, manifest_documents
+    from pdf_cache import pdf_cache
+    _submissions(app, 2, date(2036, 6, 4))
+    with app.app_context():
+        documents = manifest_documents(date(2036, 6, 4))
+        paths = [path for _, path in batch_exporter.iter_rendered(documents)]
+        assert paths == [pdf_cache.lookup(d.kind, d.key, d.version) for d in documents]
+
+def test_return_letters_load_their_breakdowns_with_the_returns(app):
+    from models import db, ReturnReport, ManufacturerBreakdown
+    from batch_export import return_letter_documents, return_letter_snapshot
+    with app.app_context():
+        for n in range(4):
+            report = ReturnReport(return_no=f'RTN-LETTER-{n}', invoice_date=date(2036, 7, n + 1), service_type='Standard Return',
+                                  ERV=1.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2036, 8, 1))
+            report.breakdowns.append(ManufacturerBreakdown(manufacturer_name='Letter Labs', ERV=1.0,
+                                                           expiration_date=date(2038, 1, 1)))
+            db.session.add(report)
+        db.session.commit()
+
+        def statements(end):
+            with count_statements(app) as executed:
+                snapshots = [return_letter_snapshot(d.record) for d in return_letter_documents(date(2036, 7, 1), end)]
+            assert all(len(s.breakdowns) == 1 for s in snapshots)
+            return len(executed)
+
+        assert statements(date(2036, 7, 4)) == statements(date(2036, 7, 1))
@@ -0,0 +1,62 @@
+def test_entries_are_served_until_invalidated():
+    from caching import TTLCache
+    cache = TTLCache('test')
+    loads = []
+    load = lambda: loads.append(1) or len(loads)
+    assert cache.get_or_load('key', load) == 1
+    assert cache.get_or_load('key', load) == 1
+    cache.invalidate('key')
+    assert cache.get_or_load('key', load) == 2
+    assert (cache.hits, cache.misses, cache.invalidations) == (1, 2, 1)
+
+def test_expired_entries_are_reloaded():
+    from caching import TTLCache
+    cache = TTLCache('test', ttl=0)
+    values = iter([1, 2])
+    assert cache.get_or_load('key', lambda: next(values)) == 1
+    assert cache.get_or_load('key', lambda: next(values)) == 2
+
+def test_load_racing_an_invalidation_is_not_stored():
+    from caching import TTLCache
+    cache = TTLCache('test')
+
+    def stale_load():
+        # Another thread writes and invalidates while this load is running
+        cache.invalidate()
+        return 'stale'
+
+    assert cache.get_or_load('key', stale_load) == 'stale'
+    assert cache.get_or_load('key', lambda: 'fresh') == 'fresh'
+
+def test_reference_lookups_follow_invalidation(app):
+    from models import db, Reason
+    from caching import get_reason_ids, invalidate_reference_data
+    with app.app_context():
+        assert 'Cache Test' not in get_reason_ids()
+        reason = Reason(name='Cache Test', description='Added by test_caching')
+        db.session.add(reason)
+        db.session.commit()
+        assert 'Cache Test' not in get_reason_ids()  # still cached
+        invalidate_reference_data()
+        assert get_reason_ids()['Cache Test'] == reason.id
+        db.session.delete(reason)
+        db.session.commit()
+        invalidate_reference_data()
+
+def test_least_recently_used_entries_are_evicted_beyond_the_bound():
+    from caching import TTLCache
+    cache = TTLCache('test', max_entries=2)
+    cache.get_or_load('a', lambda: 'a')
+    cache.get_or_load('b', lambda: 'b')
+    cache.get_or_load('a', lambda: 'reloaded')
+    cache.get_or_load('c', lambda: 'c')
+    assert list(cache._entries) == ['a', 'c']
+    assert cache.evictions == 1
+
+def test_expired_entries_are_purged_when_storing():
+    from caching import TTLCache
+    cache = TTLCache('test', ttl=0)
+    for key in range(5):
+        cache.get_or_load(key, lambda: key)
+    assert list(cache._entries) == [4]
+    assert cache.stats()['evictions'] == 4
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+from conftest import count_statements
+
+TODAY = date(2025, 1, 1)
+
+def test_estimate_credit_rules():
+    from classification import estimate_credit
+    record = SimpleNamespace(policy_code=None, base_credit_value=10.0)
+    in_window = TODAY + timedelta(days=450)  # 15 months out: no expiry adjustment
+    assert estimate_credit(record, 10, in_window, TODAY) == (100.0, 'Eligible')
+    assert estimate_credit(record, 50, in_window, TODAY) == (485.0, 'Eligible')
+    assert estimate_credit(record, 100, in_window, TODAY) == (950.0, 'Eligible')
+    assert estimate_credit(record, 10, TODAY + timedelta(days=900), TODAY) == (90.0, 'Eligible')
+    assert estimate_credit(None, 10, in_window, TODAY) == (0.0, 'NDC Not Found')
+    assert estimate_credit(record, 10, TODAY + timedelta(days=100), TODAY)[1] == 'Ineligible (Expiration Too Soon)'
+    assert estimate_credit(record, 10, TODAY + timedelta(days=1200), TODAY)[1] == 'Ineligible (Expiration Too Far)'
+    restricted = SimpleNamespace(policy_code='X', base_credit_value=10.0)
+    assert estimate_credit(restricted, 10, in_window, TODAY)[1] == 'Ineligible (Policy Restricted)'
+
+def test_classify_lines_looks_up_every_ndc_in_one_query(app):
+    from caching import get_reason_ids
+    from classification import classify_lines
+    today = date.today()
+    lines = [('0002-1234-01', today - timedelta(days=1)),
+             ('0003-5678-02', today + timedelta(days=60)),
+             ('0004-9012-03', today + timedelta(days=270)),
+             ('0002-1234-01', today + timedelta(days=270)),
+             ('9999-9999-99', today + timedelta(days=500))]
+    with app.app_context():
+        reason_ids = get_reason_ids()
+        with count_statements(app) as statements:
+            classified = classify_lines(lines)
+    assert len([s for s in statements if 'ndc_master' in s]) == 1
+    assert [classification for classification, _, _ in classified] == [
+        'Outdated', 'Short Dated', 'Non-Returnable', 'Returnable', 'Future Dated']
+    assert [reason_id for _, reason_id, _ in classified] == [reason_ids[c] for c, _, _ in classified]
+    assert classified[4][2] is None
+
+def test_price_submission_lines_skips_invalid_rows(app):
+    from classification import price_submission_lines
+    exp = (date.today() + timedelta(days=450)).isoformat()
+    with app.app_context():
+        rows, messages = price_submission_lines(['0002-1234-01', '0003-5678-02', 'BAD', '0002-1234-01'],
+                                                ['4', '0', '1', 'x'], [exp, exp, 'not-a-date', exp])
+    assert [(row['ndc'], row['quantity'], row['estimated_credit'], row['returnable_status']) for row in rows] == [
+        ('0002-1234-01', 4, 50.0, 'Eligible')]
+    assert [category for _, category in messages] == ['warning', 'warning', 'warning']
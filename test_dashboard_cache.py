@@ -0,0 +1,27 @@
+from conftest import login, count_statements
+
+def test_dashboard_metrics_are_cached_until_a_return_is_written(app, client):
+    from caching import dashboard_cache
+    login(client, 'user1', 'pass123')
+    client.get('/dashboard')
+    hits = dashboard_cache.hits
+
+    with count_statements(app) as cached:
+        response = client.get('/dashboard')
+    assert response.status_code == 200
+    assert dashboard_cache.hits == hits + 1
+    assert not any('report_totals' in statement or 'manufacturer_rollups' in statement for statement in cached)
+
+    response = client.post('/new_return', data={
+        'invoice_date': '2025-03-01', 'service_type': 'Standard Return', 'ERV': '1234.5',
+        'credit_received': '0', 'fees': '0', 'amount_paid': '0', 'last_payment_date': '2025-04-01',
+    })
+    assert response.status_code == 302
+
+    with count_statements(app) as reloaded:
+        response = client.get('/dashboard')
+    assert any('report_totals' in statement for statement in reloaded)
+    stats = dashboard_cache.stats()
+    assert stats['invalidations'] >= 1
+    assert 0 < stats['hit_rate'] < 1
+    assert stats['max_hit_age'] >= 0
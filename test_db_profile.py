@@ -0,0 +1,38 @@
+import os
+from sqlalchemy import text
+
+def test_sqlite_connections_get_the_profile_pragmas(app):
+    from models import db
+    with app.app_context():
+        pragma = lambda name: db.session.execute(text(f'PRAGMA {name}')).scalar()
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('busy_timeout') == app.config['SQLITE_PRAGMAS']['busy_timeout']
+        assert pragma('cache_size') == app.config['SQLITE_PRAGMAS']['cache_size']
+
+def test_pool_options_only_for_postgresql(app):
+    from db_profile import engine_options
+    assert engine_options('sqlite:///returns.db', app.config) == {}
+    options = engine_options('postgresql://user@db.example/returns', dict(app.config, DB_POOL_SIZE=12))
+    assert options['pool_size'] == 12 and options['pool_pre_ping'] is True
+    assert {'max_overflow', 'pool_recycle', 'pool_timeout'} <= set(options)
+
+def test_forked_child_starts_with_a_fresh_pool(app):
+    from models import db
+    with app.app_context():
+        db.session.execute(text('SELECT 1'))
+        db.session.commit()
+        parent_pool = db.engine.pool
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            os.write(write_end, b'fresh' if db.engine.pool is not parent_pool else b'shared')
+            os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+        with os.fdopen(read_end, 'rb') as result:
+            assert result.read() == b'fresh'
+        # The parent keeps its own pool and connections
+        assert db.engine.pool is parent_pool
+        assert db.session.execute(text('SELECT 1')).scalar() == 1
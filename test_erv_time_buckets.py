@@ -0,0 +1,34 @@
+from datetime import date
+
+def test_bucket_start():
+    from rollups import bucket_start
+    day = date(2025, 8, 14)  # a Thursday
+    assert bucket_start(day, 'day') == day
+    assert bucket_start(day, 'week') == date(2025, 8, 11)
+    assert bucket_start(day, 'month') == date(2025, 8, 1)
+    assert bucket_start(day, 'quarter') == date(2025, 7, 1)
+
+def test_buckets_follow_return_writes(app):
+    from models import db, ReturnReport
+    from rollups import erv_trend
+
+    def month_total(month_start):
+        return dict(erv_trend('month', month_start, month_start)).get(month_start, 0)
+
+    with app.app_context():
+        report = ReturnReport(return_no='RTN-BUCKET-1', invoice_date=date(2031, 1, 20), service_type='Standard Return',
+                              ERV=250.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2031, 2, 1))
+        db.session.add(report)
+        db.session.commit()
+        assert month_total(date(2031, 1, 1)) == 250.0
+        assert dict(erv_trend('quarter'))[date(2031, 1, 1)] >= 250.0
+
+        # Moving the invoice date moves the ERV to the new period
+        report.invoice_date = date(2031, 2, 3)
+        db.session.commit()
+        assert month_total(date(2031, 1, 1)) == 0
+        assert month_total(date(2031, 2, 1)) == 250.0
+
+        db.session.delete(report)
+        db.session.commit()
+        assert month_total(date(2031, 2, 1)) == 0
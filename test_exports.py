@@ -0,0 +1,108 @@
+from datetime import date
+from io import BytesIO
+from openpyxl import load_workbook
+from conftest import login
+
+def _add_export_rows(app):
+    from models import db, ReturnReport, ReturnItem, ReturnCategory
+    from caching import get_reason_ids
+    with app.app_context():
+        category = ReturnCategory.query.filter_by(name='Export Stream').first()
+        if category is None:
+            category = ReturnCategory(name='Export Stream')
+            db.session.add(category)
+            db.session.flush()
+            for i, invoice_date in enumerate([date(2036, 1, 5), date(2036, 3, 5)]):
+                report = ReturnReport(return_no=f'RTN-EXPORT-{i}', invoice_date=invoice_date, service_type='Standard Return',
+                                      ERV=5.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=invoice_date)
+                db.session.add(report)
+                db.session.flush()
+                db.session.add(ReturnItem(return_report_id=report.id, ndc=f'5555{i:07d}', description='Export item',
+                                          lot_no=f'LOT{i}', exp_date=date(2030, 1, 1), pkg_size=10, full_qty=2,
+                                          partial_qty=1, unit_price=3.5, extended_price=7.0, category_id=category.id,
+                                          reason_id=get_reason_ids()['Outdated'], manufacturer='Streamwell Labs'))
+            db.session.commit()
+
+def test_excel_export_streams_filtered_rows(app, client):
+    from exports import EXPORT_HEADINGS
+    _add_export_rows(app)
+    login(client, 'user1', 'pass123')
+    response = client.get('/export_excel?category=Export Stream&start_date=2036-02-01')
+    assert response.status_code == 200
+    assert response.is_streamed
+    workbook = load_workbook(BytesIO(response.get_data()), read_only=True)
+    response.close()
+
+    rows = list(workbook['Returns_Report'].iter_rows(values_only=True))
+    assert list(rows[0]) == EXPORT_HEADINGS
+    assert rows[1:] == [('RTN-EXPORT-1', '2036-03-05', '55550000001', 'Export item', 'LOT1', '2030-01-01', 10, 2, 1,
+                         3.5, 7, 'Export Stream', 'Outdated', 'Streamwell Labs')]
+
+def test_export_query_selects_columns_not_entities(app):
+    from exports import EXPORT_COLUMNS, iter_export_chunks
+    _add_export_rows(app)
+    with app.app_context():
+        chunks = list(iter_export_chunks({'manufacturer': 'Streamwell'}, chunk_size=1))
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+    assert all(isinstance(row, tuple) and len(row) == len(EXPORT_COLUMNS) for chunk in chunks for row in chunk)
+
+EXPORT_ROW = ['RTN-EXPORT-1', '2036-03-05', '55550000001', 'Export item', 'LOT1', '2030-01-01', 10, 2, 1, 3.5, 7.0,
+              'Export Stream', 'Outdated', 'Streamwell Labs']
+
+def _download(client, fmt):
+    response = client.get(f'/export/{fmt}?category=Export Stream&start_date=2036-02-01')
+    assert response.status_code == 200 and response.is_streamed
+    data = response.get_data()
+    response.close()
+    return response, data
+
+def test_csv_and_ndjson_exports_stream_the_same_rows(app, client):
+    import csv
+    import json
+    from exports import EXPORT_FIELDS, EXPORT_HEADINGS
+    _add_export_rows(app)
+    login(client, 'user1', 'pass123')
+
+    response, data = _download(client, 'csv')
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.reader(data.decode('utf-8').splitlines()))
+    assert rows == [EXPORT_HEADINGS, [str(value) for value in EXPORT_ROW]]
+
+    response, data = _download(client, 'ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in data.decode('utf-8').splitlines()] == [dict(zip(EXPORT_FIELDS, EXPORT_ROW))]
+    assert client.get('/export/xml').status_code == 404
+
+def test_parquet_export_has_typed_columns(app, client):
+    from io import BytesIO
+    import pyarrow.parquet as pq
+    from exports import EXPORT_FIELDS
+    _add_export_rows(app)
+    login(client, 'user1', 'pass123')
+
+    _, data = _download(client, 'parquet')
+    table = pq.read_table(BytesIO(data))
+    assert table.column_names == EXPORT_FIELDS
+    assert str(table.schema.field('invoice_date').type) == 'date32[day]'
+    row = table.to_pylist()[0]
+    assert [row[field] if not hasattr(row[field], 'isoformat') else row[field].isoformat()
+            for field in EXPORT_FIELDS] == EXPORT_ROW
+
+def test_parquet_writes_one_row_group_per_chunk(tmp_path):
+    import pyarrow.parquet as pq
+    from datetime import date
+    from exports import write_parquet
+    row = ('RTN-1', date(2036, 1, 1), '1', 'Item', 'L', date(2030, 1, 1), 1, 1, 0, 1.0, 1.0, 'C', 'R', 'M')
+    path = tmp_path / 'items.parquet'
+    assert write_parquet([[row] * 3, [row] * 2], str(path)) == 5
+    assert pq.ParquetFile(str(path)).metadata.num_row_groups == 2
+
+def test_manufacturer_filter_matches_inside_words_unless_word_matching_is_asked_for(app):
+    from exports import iter_export_chunks
+    _add_export_rows(app)
+    with app.app_context():
+        def count(filters):
+            return sum(len(chunk) for chunk in iter_export_chunks(dict(filters, category='Export Stream')))
+        assert count({'manufacturer': 'well'}) == 2
+        assert count({'manufacturer': 'well', 'match': 'words'}) == 0
+        assert count({'manufacturer': 'stream', 'match': 'words'}) == 2
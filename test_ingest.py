@@ -0,0 +1,89 @@
+import io
+import os
+import time
+from datetime import date, timedelta
+
+HEADER = 'NDC Number,Description,Lot Number,Expiration,pkg_size,full_qty,partial_qty,unit_price,extended_price,category,reason,Manufacturer\n'
+
+def _csv(lines):
+    return io.BytesIO((HEADER + ''.join(line + '\n' for line in lines)).encode('utf-8'))
+
+def _line(ndc, exp_date, category='Ingest', pkg_size='1'):
+    return f'{ndc},Ingest item,LOT-{ndc},{exp_date},{pkg_size},1,0,2.5,2.5,{category},x,Ingest Pharma'
+
+def _return(return_no):
+    from models import db, ReturnReport, ReturnCategory
+    if not ReturnCategory.query.filter_by(name='Ingest').first():
+        db.session.add(ReturnCategory(name='Ingest'))
+    report = ReturnReport(return_no=return_no, invoice_date=date(2034, 1, 1), service_type='Standard Return', ERV=0,
+                          credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2034, 1, 1))
+    db.session.add(report)
+    db.session.commit()
+    return report.id
+
+def test_bad_rows_go_to_the_error_report_and_chunks_commit_separately(app, tmp_path):
+    from sqlalchemy import event
+    from models import db, ReturnItem
+    from caching import invalidate_reference_data
+    from ingest import ingest_return_items, iter_csv_rows, normalize_rows
+    exp = (date.today() + timedelta(days=400)).isoformat()
+    lines = [_line(f'5555000{n:04d}', exp) for n in range(5)]
+    lines += [
+        _line('55550000000', exp),                      # duplicate of the first row
+        _line('55551111111', exp, category='Nope'),     # unknown category
+        _line('55552222222', exp, pkg_size='one'),      # malformed number
+        _line('', exp),                                  # empty NDC
+    ]
+    with app.app_context():
+        invalidate_reference_data()
+        report_id = _return('RTN-INGEST-1')
+        commits, progress = [], []
+        listener = lambda session: commits.append(1)
+        event.listen(db.session, 'after_commit', listener)
+        try:
+            rows = normalize_rows(row for _, row in iter_csv_rows(_csv(lines)))
+            added, errors = ingest_return_items(rows, report_id, str(tmp_path), chunk_size=2, progress=progress.append)
+        finally:
+            event.remove(db.session, 'after_commit', listener)
+
+        assert added == 5
+        assert ReturnItem.query.filter_by(return_report_id=report_id).count() == 5
+        assert len(commits) == 3  # chunks of 2, 2 and 1
+        assert progress[-1] == len(lines)
+
+    assert errors.count == 4
+    with open(errors.path, encoding='utf-8') as report:
+        report_lines = report.read().splitlines()
+    assert report_lines[0] == 'row,ndc,error'
+    assert any('Duplicate NDC' in line for line in report_lines)
+    assert any('Invalid category' in line for line in report_lines)
+    assert any('Invalid data format' in line for line in report_lines)
+    assert any('Empty fields: ndc' in line for line in report_lines)
+
+def test_clean_upload_writes_no_error_report(app, tmp_path):
+    from ingest import ingest_return_items, iter_csv_rows, normalize_rows
+    exp = (date.today() + timedelta(days=400)).isoformat()
+    with app.app_context():
+        report_id = _return('RTN-INGEST-2')
+        rows = normalize_rows(row for _, row in iter_csv_rows(_csv([_line('55553333333', exp)])))
+        added, errors = ingest_return_items(rows, report_id, str(tmp_path / 'errors'))
+    assert (added, errors.count, errors.path) == (1, 0, None)
+    assert not os.path.exists(tmp_path / 'errors')
+
+def test_writing_a_report_prunes_old_reports(tmp_path):
+    from ingest import ErrorReport, error_report_path
+    old = ErrorReport(str(tmp_path))
+    old.add(2, 'x', 'old error')
+    old.close()
+    two_weeks_ago = time.time() - 14 * 24 * 3600
+    os.utime(old.path, (two_weeks_ago, two_weeks_ago))
+    upload = tmp_path / 'upload.csv'  # not a report; left alone
+    upload.write_text('ndc\n')
+    os.utime(upload, (two_weeks_ago, two_weeks_ago))
+
+    new = ErrorReport(str(tmp_path))
+    new.add(2, 'y', 'new error')
+    new.close()
+    assert error_report_path(str(tmp_path), old.token) is None
+    assert error_report_path(str(tmp_path), new.token) == new.path
+    assert upload.exists()
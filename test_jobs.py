@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+def _queued(app, kind, params='{}', **values):
+    from models import db, Job
+    with app.app_context():
+        job = Job(kind=kind, params=params, **values)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+def _job(app, job_id):
+    from models import db, Job
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        db.session.expunge(job)
+        return job
+
+def test_a_job_claimed_twice_runs_once(app):
+    from jobs import jobs
+    runs = []
+
+    @jobs.handler('test_count')
+    def count(ctx):
+        runs.append(ctx.job_id)
+        ctx.set_progress(1, total=1)
+        return 'Counted.'
+
+    job_id = _queued(app, 'test_count')
+    assert jobs.run_job(job_id) is True
+    assert jobs.run_job(job_id) is False
+    assert runs == [job_id]
+    job = _job(app, job_id)
+    assert (job.status, job.message, job.progress, job.total) == ('Finished', 'Counted.', 1, 1)
+    assert job.started_at and job.finished_at
+
+def test_a_failing_handler_marks_the_job_failed(app):
+    from jobs import jobs
+
+    @jobs.handler('test_fail')
+    def fail(ctx):
+        raise ValueError(f"bad input {ctx.params['n']}")
+
+    job_id = _queued(app, 'test_fail', params='{"n": 3}')
+    jobs.run_job(job_id)
+    job = _job(app, job_id)
+    assert (job.status, job.message) == ('Failed', 'bad input 3')
+
+def test_run_pending_fails_stale_running_jobs_and_runs_queued_ones(app):
+    from jobs import jobs
+
+    @jobs.handler('test_pending')
+    def pending(ctx):
+        return 'Ran.'
+
+    now = datetime.utcnow()
+    stale_id = _queued(app, 'test_pending', status='Running', started_at=now - timedelta(seconds=app.config['JOB_STALE_AFTER'] + 60))
+    busy_id = _queued(app, 'test_pending', status='Running', started_at=now)
+    queued_id = _queued(app, 'test_pending')
+
+    assert jobs.run_pending() >= 1
+    assert _job(app, stale_id).status == 'Failed' and 'Interrupted' in _job(app, stale_id).message
+    assert _job(app, busy_id).status == 'Running'
+    assert _job(app, queued_id).status == 'Finished'
+
+def test_prune_removes_expired_jobs_and_their_files(app, tmp_path):
+    import os
+    from jobs import jobs
+    results_dir = app.config['JOB_RESULTS_DIR']
+    app.config['JOB_RESULTS_DIR'] = str(tmp_path)
+    try:
+        now = datetime.utcnow()
+        max_age = app.config['JOB_RESULT_MAX_AGE']
+        old = dict(started_at=now - timedelta(seconds=max_age + 120), finished_at=now - timedelta(seconds=max_age + 60))
+        expired_id = _queued(app, 'test_prune', status='Finished', job_uuid='expired', **old)
+        failed_id = _queued(app, 'test_prune', status='Failed', job_uuid='failed', **old)
+        recent_id = _queued(app, 'test_prune', status='Finished', job_uuid='recent', started_at=now, finished_at=now)
+        running_id = _queued(app, 'test_prune', status='Running', job_uuid='running', started_at=old['started_at'])
+        for name in ('expired', 'failed', 'recent', 'running', 'orphan', 'new-orphan'):
+            os.makedirs(tmp_path / name)
+            (tmp_path / name / 'result.xlsx').write_bytes(b'x')
+        stale = (now - timedelta(seconds=max_age + 60)).timestamp()
+        os.utime(tmp_path / 'orphan', (stale, stale))
+
+        assert jobs.prune() == 2
+        assert sorted(os.listdir(tmp_path)) == ['new-orphan', 'recent', 'running']
+        assert _job(app, recent_id) and _job(app, running_id)
+        from models import db, Job
+        with app.app_context():
+            assert db.session.get(Job, expired_id) is None and db.session.get(Job, failed_id) is None
+    finally:
+        app.config['JOB_RESULTS_DIR'] = results_dir
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+from conftest import login
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _sample(text, name, **labels):
+    """Value of one sample line in Prometheus exposition text, or None."""
+    for line in text.splitlines():
+        if line.startswith(name + '{') and all(f'{key}="{value}"' in line for key, value in labels.items()):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+def test_metrics_endpoint_reports_request_latency_and_documents(app, client):
+    login(client, 'user1', 'pass123')
+    assert client.get('/dashboard').status_code == 200
+    response = client.get('/export_excel')
+    assert response.status_code == 200
+    response.close()
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert _sample(text, 'returnmedicine_request_duration_seconds_count', endpoint='dashboard', status='200') >= 1
+    assert _sample(text, 'returnmedicine_request_duration_seconds_bucket', endpoint='dashboard', le='+Inf') >= 1
+    assert _sample(text, 'returnmedicine_document_generation_seconds_count', format='excel') >= 1
+    # The scrape itself is in flight while the page is rendered
+    assert _sample(text, 'returnmedicine_requests_in_progress', endpoint='metrics') == 1.0
+
+def test_metrics_token(app, client):
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    try:
+        assert client.get('/metrics').status_code == 403
+        assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+    finally:
+        app.config['METRICS_TOKEN'] = None
+
+def test_metrics_are_local_or_admin_only_without_a_token(app):
+    remote = app.test_client()
+    remote.environ_base['REMOTE_ADDR'] = '10.0.0.5'
+    assert remote.get('/metrics').status_code == 403
+    login(remote, 'user1', 'pass123')
+    assert remote.get('/metrics').status_code == 403
+    remote.get('/logout')
+    login(remote, 'admin', 'admin123')
+    assert remote.get('/metrics').status_code == 200
+
+def test_multiprocess_samples_are_summed(tmp_path):
+    # Each process stands in for a gunicorn worker writing to the shared directory
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), PYTHONPATH=HERE)
+    worker = "from metrics import count_ingested; count_ingested('csv', {})"
+    for rows in (3, 4):
+        subprocess.run([sys.executable, '-c', worker.format(rows)], env=env, check=True, cwd=HERE)
+    output = subprocess.run([sys.executable, '-c', "import sys; from metrics import render_metrics; "
+                                                   "sys.stdout.write(render_metrics().decode())"],
+                            env=env, check=True, cwd=HERE, capture_output=True, text=True).stdout
+    assert _sample(output, 'returnmedicine_rows_ingested_total', source='csv') == 7.0
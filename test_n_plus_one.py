@@ -0,0 +1,60 @@
+from datetime import date
+from itertools import count
+import pytest
+from conftest import login, statement_count
+
+_batches = count()
+
+PASSWORDS = {'user1': 'pass123', 'reviewer1': 'review123'}
+
+ROUTES = [
+    ('user1', '/reports/returnable_nonreturnable'),
+    ('user1', '/export_excel'),
+    ('user1', '/manufacturer/Eager Pharma'),
+    ('user1', '/dashboard'),
+    ('reviewer1', '/dashboard'),
+]
+
+def _add_batch(app, size):
+    """``size`` returns, each with a breakdown, an outdated item and a submission with an item."""
+    from models import db, User, ReturnReport, ReturnItem, ReturnCategory, ManufacturerBreakdown
+    from models import Submission, SubmissionItem
+    from caching import get_reason_ids
+    tag = next(_batches)
+    with app.app_context():
+        category = ReturnCategory.query.filter_by(name=f'Eager {tag}').first() or ReturnCategory(name=f'Eager {tag}')
+        db.session.add(category)
+        user = User.query.filter_by(username='user1').one()
+        for i in range(size):
+            report = ReturnReport(return_no=f'RTN-EAGER-{tag}-{i}', invoice_date=date(2035, 1, 1), service_type='Standard Return',
+                                  ERV=5.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2035, 2, 1))
+            submission = Submission(user_id=user.id, submission_date=date(2035, 1, 1), status='Submitted')
+            db.session.add_all([report, submission])
+            db.session.flush()
+            db.session.add_all([
+                ManufacturerBreakdown(return_report_id=report.id, manufacturer_name='Eager Pharma', ERV=5.0,
+                                      expiration_date=date(2035, 6, 1)),
+                ReturnItem(return_report_id=report.id, ndc=f'{i:011d}', description='Eager item', lot_no='L1',
+                           exp_date=date(2020, 1, 1), pkg_size=1, full_qty=1, partial_qty=0, unit_price=1.0,
+                           extended_price=1.0, category_id=category.id, reason_id=get_reason_ids()['Outdated'],
+                           manufacturer='Eager Pharma'),
+                SubmissionItem(submission_id=submission.id, ndc=f'{i:011d}', quantity=1, expiration_date=date(2035, 1, 1)),
+            ])
+        db.session.commit()
+
+def _statements(app, username, url):
+    client = app.test_client()
+    login(client, username, PASSWORDS[username])
+    # The first request warms the reference and dashboard caches
+    client.get(url).close()
+    response = client.get(url)
+    assert response.status_code == 200
+    response.close()
+    return statement_count(response)
+
+@pytest.mark.parametrize('username,url', ROUTES)
+def test_statement_count_does_not_grow_with_rows(app, username, url):
+    _add_batch(app, 3)
+    before = _statements(app, username, url)
+    _add_batch(app, 12)
+    assert _statements(app, username, url) == before
@@ -0,0 +1,72 @@
+import re
+from datetime import date, timedelta
+from conftest import login, count_statements
+
+SERVICE_TYPE = 'Keyset Pagination Test'
+
+def _add_returns(app, count):
+    from models import db, ReturnReport
+    with app.app_context():
+        if ReturnReport.query.filter_by(service_type=SERVICE_TYPE).count():
+            return
+        # Several returns share each invoice date, so the id tie-breaker matters
+        db.session.add_all([
+            ReturnReport(return_no=f'RTN-KEYSET-{i:03d}', invoice_date=date(2032, 1, 1) + timedelta(days=i // 4),
+                         service_type=SERVICE_TYPE, ERV=1.0, credit_received=0, fees=0, amount_paid=0,
+                         last_payment_date=date(2032, 6, 1))
+            for i in range(count)
+        ])
+        db.session.commit()
+
+def test_keyset_pages_cover_every_row_once_in_both_directions(app):
+    from models import ReturnReport
+    from pagination import keyset_paginate
+    _add_returns(app, 23)
+    order_by = [(ReturnReport.invoice_date, True), (ReturnReport.id, True)]
+
+    with app.app_context():
+        query = ReturnReport.query.filter_by(service_type=SERVICE_TYPE)
+        expected = [r.id for r in query.order_by(ReturnReport.invoice_date.desc(), ReturnReport.id.desc())]
+
+        pages = [keyset_paginate(query, order_by, per_page=5)]
+        while pages[-1].has_next:
+            pages.append(keyset_paginate(query, order_by, after=pages[-1].next_cursor, per_page=5))
+        assert [r.id for page in pages for r in page.items] == expected
+        assert not pages[0].has_prev and [len(page.items) for page in pages] == [5, 5, 5, 5, 3]
+
+        # Walking back from the last page returns the same pages
+        back = keyset_paginate(query, order_by, before=pages[-1].prev_cursor, per_page=5)
+        assert [r.id for r in back.items] == [r.id for r in pages[-2].items]
+        assert back.has_next and back.has_prev
+        first = keyset_paginate(query, order_by, before=pages[1].prev_cursor, per_page=5)
+        assert [r.id for r in first.items] == [r.id for r in pages[0].items] and not first.has_prev
+
+        # A tampered cursor falls back to the first page
+        assert [r.id for r in keyset_paginate(query, order_by, after='not-a-cursor', per_page=5).items] == expected[:5]
+
+def test_returns_page_follows_next_link_with_filters(app, client):
+    _add_returns(app, 23)
+    login(client, 'user1', 'pass123')
+
+    response = client.get(f'/returns?service_type={SERVICE_TYPE}&per_page=10')
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert html.count('<td>RTN-KEYSET-') == 10
+    next_url = re.search(r'href="(/returns\?[^"]*after=[^"]*)"', html).group(1).replace('&amp;', '&')
+    assert 'service_type=' in next_url and 'per_page=10' in next_url
+
+    # A later page is one bounded range query that starts at the cursor
+    with count_statements(app) as statements:
+        response = client.get(next_url)
+    html = response.get_data(as_text=True)
+    assert html.count('<td>RTN-KEYSET-') == 10
+    page_query = [s for s in statements if 'FROM return_reports' in s]
+    assert len(page_query) == 1 and 'LIMIT' in page_query[0]
+    assert 'return_reports.invoice_date < ?' in page_query[0] and 'return_reports.id < ?' in page_query[0]
+
+def test_per_page_is_clamped():
+    from pagination import parse_per_page, DEFAULT_PER_PAGE, MAX_PER_PAGE
+    assert parse_per_page(None) == DEFAULT_PER_PAGE
+    assert parse_per_page('junk') == DEFAULT_PER_PAGE
+    assert parse_per_page('100000') == MAX_PER_PAGE
+    assert parse_per_page('0') == 1
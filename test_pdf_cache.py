@@ -0,0 +1,75 @@
+import io
+from datetime import date
+from conftest import login
+
+def _submission(app):
+    from models import db, User, Submission, SubmissionItem
+    with app.app_context():
+        user = User.query.filter_by(username='user1').one()
+        submission = Submission(user_id=user.id, status='Submitted')
+        submission.items.append(SubmissionItem(ndc='0002-1234-01', quantity=2, expiration_date=date(2030, 1, 1),
+                                               estimated_credit=25.0))
+        db.session.add(submission)
+        db.session.commit()
+        return submission.id, submission.submission_uuid
+
+def test_manifest_is_served_from_the_cache_until_the_submission_changes(app, client):
+    from models import db, Submission, SubmissionItem
+    from pdf_cache import pdf_cache, submission_state_version
+    submission_id, submission_uuid = _submission(app)
+    login(client, 'user1', 'pass123')
+
+    def download():
+        response = client.get(f'/submission/{submission_uuid}/manifest/pdf')
+        assert response.status_code == 200 and response.data.startswith(b'%PDF')
+        response.close()
+
+    hits, misses = pdf_cache.hits, pdf_cache.misses
+    download()
+    download()
+    assert (pdf_cache.hits - hits, pdf_cache.misses - misses) == (1, 1)
+
+    with app.app_context():
+        submission = db.session.get(Submission, submission_id)
+        version = submission_state_version(submission)
+        assert submission_state_version(submission) == version
+        db.session.add(SubmissionItem(submission_id=submission_id, ndc='0003-5678-02', quantity=1,
+                                      expiration_date=date(2030, 1, 1), estimated_credit=9.0))
+        db.session.commit()
+        assert submission_state_version(submission) != version
+        after_items = submission_state_version(submission)
+        submission.tracking_number = 'TRACK-1'
+        db.session.commit()
+        assert submission_state_version(submission) != after_items
+
+    download()
+    assert pdf_cache.misses - misses == 2
+
+def test_return_letter_version_follows_breakdowns(app):
+    from models import db, ReturnReport, ManufacturerBreakdown
+    from pdf_cache import return_state_version
+    with app.app_context():
+        report = ReturnReport(return_no='RTN-PDFCACHE-1', invoice_date=date(2035, 1, 1), service_type='Standard Return',
+                              ERV=10.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2035, 1, 1))
+        db.session.add(report)
+        db.session.commit()
+        version = return_state_version(report)
+        report.breakdowns.append(ManufacturerBreakdown(manufacturer_name='Cache Pharma', ERV=10.0,
+                                                       expiration_date=date(2036, 1, 1)))
+        db.session.commit()
+        assert return_state_version(report) != version
+
+def test_store_keeps_only_the_latest_version(tmp_path):
+    import os
+    from pdf_cache import PDFCache
+    cache = PDFCache()
+    cache.root = str(tmp_path)
+    old = cache.store('manifest', 'key', 'v1', io.BytesIO(b'%PDF old'))
+    new = cache.store('manifest', 'key', 'v2', io.BytesIO(b'%PDF new'))
+    assert not os.path.exists(old)
+    assert cache.lookup('manifest', 'key', 'v2') == new
+    assert cache.lookup('manifest', 'key', 'v1') is None
+    assert cache.get_or_build('manifest', 'key', 'v2', lambda: 1 / 0) == new
+    cache.invalidate('manifest', 'key')
+    assert cache.lookup('manifest', 'key', 'v2') is None
+    assert (cache.hits, cache.misses) == (2, 2)
@@ -0,0 +1,64 @@
+def make_table_pdf(path, pages, rows_per_page=3):
+    """A PDF with one NDC table per page; row values encode their page and position."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, PageBreak
+    story = []
+    for page in range(pages):
+        data = [['NDC Number', 'Lot Number']] + [[f'{page:03d}{row:02d}', f'L{page}-{row}'] for row in range(rows_per_page)]
+        story += [Table(data, style=TableStyle([('GRID', (0, 0), (-1, -1), 0.5, 'black')])), PageBreak()]
+    SimpleDocTemplate(str(path), pagesize=letter).build(story)
+    return [{'NDC Number': f'{page:03d}{row:02d}', 'Lot Number': f'L{page}-{row}'}
+            for page in range(pages) for row in range(rows_per_page)]
+
+def test_page_ranges_yield_rows_in_document_order(tmp_path):
+    from pdf_import import iter_pdf_rows
+    expected = make_table_pdf(tmp_path / 'memo.pdf', pages=5)
+    assert list(iter_pdf_rows(str(tmp_path / 'memo.pdf'), pages_per_task=2)) == expected
+
+def test_process_pool_keeps_document_order(tmp_path):
+    from pdf_import import iter_pdf_rows
+    expected = make_table_pdf(tmp_path / 'memo.pdf', pages=4)
+    assert list(iter_pdf_rows(str(tmp_path / 'memo.pdf'), workers=2, pages_per_task=1)) == expected
+
+def test_uploaded_file_objects_are_parsed(tmp_path):
+    from pdf_import import parse_pdf_to_csv
+    expected = make_table_pdf(tmp_path / 'memo.pdf', pages=1)
+    with open(tmp_path / 'memo.pdf', 'rb') as upload:
+        assert parse_pdf_to_csv(upload) == expected
+
+def test_identical_uploads_are_parsed_once(tmp_path, monkeypatch):
+    import pdf_import
+    expected = make_table_pdf(tmp_path / 'memo.pdf', pages=2)
+    parses = []
+    parse = pdf_import.iter_pdf_rows
+    monkeypatch.setattr(pdf_import, 'iter_pdf_rows', lambda *args, **kwargs: parses.append(1) or parse(*args, **kwargs))
+    cache_dir = str(tmp_path / 'cache')
+    digest = pdf_import.parse_with_cache(str(tmp_path / 'memo.pdf'), cache_dir)
+    with open(tmp_path / 'memo.pdf', 'rb') as upload:
+        assert pdf_import.parse_with_cache(upload, cache_dir) == digest
+    assert len(parses) == 1
+    assert list(pdf_import.cached_rows(cache_dir, digest)) == expected
+    assert pdf_import.cached_rows(cache_dir, '0' * 64) is None
+    assert pdf_import.cached_rows(cache_dir, '../etc/passwd') is None
+
+def test_least_recently_used_parses_are_evicted_over_the_budget(tmp_path):
+    import os
+    from pdf_import import parse_with_cache, cached_rows
+    cache_dir = tmp_path / 'cache'
+    digests = []
+    for n in range(3):
+        make_table_pdf(tmp_path / f'memo{n}.pdf', pages=1, rows_per_page=n + 1)
+        digests.append(parse_with_cache(str(tmp_path / f'memo{n}.pdf'), str(cache_dir)))
+    sizes = {digest: os.path.getsize(cache_dir / f'{digest}.ndjson') for digest in digests}
+    # Oldest first, except that memo0 was read most recently
+    for age, digest in zip((300, 200, 100), digests):
+        os.utime(cache_dir / f'{digest}.ndjson', (os.path.getmtime(cache_dir / f'{digest}.ndjson') - age,) * 2)
+    list(cached_rows(str(cache_dir), digests[0]))
+
+    # Same rows as memo1, so the new parse is the same size as the one that has to go
+    make_table_pdf(tmp_path / 'memo3.pdf', pages=1, rows_per_page=2)
+    budget = sum(sizes.values())
+    newest = parse_with_cache(str(tmp_path / 'memo3.pdf'), str(cache_dir), max_bytes=budget)
+    assert newest not in digests
+    kept = {digest for digest in digests + [newest] if cached_rows(str(cache_dir), digest) is not None}
+    assert kept == {digests[0], digests[2], newest}
@@ -0,0 +1,136 @@
+import re
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from sqlalchemy import event
+from conftest import login
+
+# Lookup and summary tables that stay small; scanning them is expected
+SMALL_TABLES = {
+    'users', 'reasons', 'return_categories', 'manufacturer_rollups', 'category_rollups', 'reason_rollups',
+    'report_totals', 'erv_time_buckets',
+}
+
+# "SCAN return_items" (or "SCAN TABLE return_items" on older SQLite) with no index after it
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+@contextmanager
+def captured_selects(app):
+    """Collect the (statement, parameters) of every SELECT executed inside the block."""
+    from models import db
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def full_scans(app, captured):
+    """(table, statement) for every captured query whose plan scans a large table."""
+    from models import db
+    found = []
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for statement, parameters in captured:
+                for row in cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall():
+                    match = FULL_SCAN.match(row[3])
+                    if match:
+                        table = _table_for(match.group(1), statement)
+                        if table not in SMALL_TABLES:
+                            found.append((table, statement))
+        finally:
+            connection.close()
+    return found
+
+def _table_for(name, statement):
+    # Plans name aliased tables by their alias
+    alias = re.search(r'(\w+) AS %s\b' % re.escape(name), statement)
+    return alias.group(1) if alias else name
+
+@pytest.fixture(scope='module')
+def sample(app):
+    """One of each row the hot queries filter on."""
+    from models import db, User, ReturnReport, ReturnItem, ReturnCategory, ManufacturerBreakdown, CheckStatement
+    from models import CheckDetail, Submission, SubmissionItem
+    from caching import get_reason_ids
+    with app.app_context():
+        if not ReturnCategory.query.first():
+            db.session.add(ReturnCategory(name='Returnable'))
+            db.session.commit()
+        report = ReturnReport(return_no='RTN-PLAN-1', invoice_date=date(2034, 1, 5), service_type='Standard Return',
+                              ERV=10.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2034, 2, 1))
+        check = CheckStatement(statement_no='STMT-PLAN-1', payment_date=date(2034, 2, 1), check_amount=10.0,
+                               check_no='CHK-PLAN-1')
+        db.session.add_all([report, check])
+        db.session.flush()
+        db.session.add_all([
+            ReturnItem(return_report_id=report.id, ndc='00002123401', description='Plan item', lot_no='L1',
+                       exp_date=date(2035, 1, 1), pkg_size=1, full_qty=1, partial_qty=0, unit_price=1.0,
+                       extended_price=1.0, category_id=ReturnCategory.query.first().id,
+                       reason_id=get_reason_ids()['Returnable'], manufacturer='Plan Pharma'),
+            ManufacturerBreakdown(return_report_id=report.id, manufacturer_name='Plan Pharma', ERV=10.0,
+                                  expiration_date=date(2035, 1, 1)),
+            CheckDetail(check_statement_id=check.id, return_no=report.return_no, amount=10.0),
+        ])
+        submission = Submission(user_id=User.query.filter_by(username='user1').one().id,
+                                submission_date=date(2034, 1, 6), status='Submitted')
+        db.session.add(submission)
+        db.session.flush()
+        db.session.add(SubmissionItem(submission_id=submission.id, ndc='00002123401', quantity=1,
+                                      expiration_date=date(2035, 1, 1)))
+        db.session.commit()
+        return {'return_no': report.return_no, 'check_id': check.id, 'submission_uuid': submission.submission_uuid}
+
+HOT_PAGES = [
+    ('user1', '/returns'),
+    ('user1', '/returns?start_date=2034-01-01&end_date=2034-12-31'),
+    ('user1', '/returns?per_page=1&after={returns_cursor}'),
+    ('user1', '/returns/{return_no}'),
+    ('user1', '/checks'),
+    ('user1', '/checks/{check_id}'),
+    ('user1', '/dashboard'),
+    ('user1', '/manufacturer/Plan Pharma'),
+    ('reviewer1', '/dashboard'),
+    ('admin', '/admin/returns'),
+    ('admin', '/admin/users'),
+]
+
+PASSWORDS = {'user1': 'pass123', 'reviewer1': 'review123', 'admin': 'admin123'}
+
+@pytest.mark.parametrize('username,url', HOT_PAGES)
+def test_hot_pages_use_indexes(app, sample, username, url):
+    from pagination import encode_cursor
+    client = app.test_client()
+    login(client, username, PASSWORDS[username])
+    url = url.format(returns_cursor=encode_cursor(['2034-01-05', 10 ** 9]), **sample)
+
+    with captured_selects(app) as captured:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert captured
+    assert full_scans(app, captured) == []
+
+def test_hot_helper_queries_use_indexes(app, sample):
+    from models import db, Submission, ReturnReport, Job
+    from batch_export import manifest_documents, return_letter_documents
+    from pdf_cache import submission_state_version, return_state_version
+    from ingest import ingest_return_items
+
+    with app.app_context(), captured_selects(app) as captured:
+        manifest_documents(date(2034, 1, 6))
+        return_letter_documents(date(2034, 1, 1), date(2034, 1, 31))
+        submission_state_version(Submission.query.filter_by(submission_uuid=sample['submission_uuid']).one())
+        report = ReturnReport.query.filter_by(return_no=sample['return_no']).one()
+        return_state_version(report)
+        db.session.query(Job.id).filter(Job.status == 'Queued').order_by(Job.id).all()
+        ingest_return_items([], report.id, error_dir=None, dry_run=True)
+    assert full_scans(app, captured) == []
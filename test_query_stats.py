@@ -0,0 +1,39 @@
+from conftest import login
+
+def test_parameter_shape_reports_types_not_values():
+    from query_stats import parameter_shape, normalize_statement
+    assert parameter_shape(('RTN-1', 5, 5, 5)) == '(str, int x 3)'
+    assert parameter_shape({'name': 'secret'}) == '{name: str}'
+    assert parameter_shape([(1, 'a'), (2, 'b')], executemany=True) == '2 rows of (int, str)'
+    assert normalize_statement('SELECT *\n  FROM t WHERE id IN (?, ?, ?)') == 'SELECT * FROM t WHERE id IN (?, ...)'
+
+def test_requests_are_totalled_per_endpoint_and_slow_queries_logged(app, client, tmp_path):
+    from query_stats import query_stats
+    log_path = tmp_path / 'slow.log'
+    app.config.update(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=str(log_path))
+    try:
+        query_stats.reset()
+        login(client, 'user1', 'pass123')
+        response = client.get('/reports')
+        assert int(response.headers['X-SQL-Statement-Count']) > 0
+        assert float(response.headers['X-SQL-Time-Ms']) >= 0
+    finally:
+        app.config.update(SLOW_QUERY_THRESHOLD_MS=250, SLOW_QUERY_LOG=None)
+
+    reports = next(row for row in query_stats.endpoint_stats() if row['endpoint'] == 'reports')
+    assert reports['requests'] == 1 and reports['statements'] == int(response.headers['X-SQL-Statement-Count'])
+    assert reports['slowest'] and reports['slowest'][0]['statement'].startswith('SELECT')
+    assert any(entry['endpoint'] == 'reports' for entry in query_stats.slow_queries)
+    assert 'Slow query' in log_path.read_text() and 'pass123' not in log_path.read_text()
+
+def test_sql_stats_page_is_admin_only(app, client):
+    login(client, 'user1', 'pass123')
+    assert client.get('/admin/sql_stats').status_code == 302
+    client.get('/logout')
+
+    login(client, 'admin', 'admin123')
+    client.get('/dashboard')
+    assert client.get('/admin/sql_stats').status_code == 200
+    data = client.get('/admin/sql_stats?format=json').get_json()
+    assert any(row['endpoint'] == 'dashboard' for row in data['endpoints'])
+    assert client.post('/admin/sql_stats/reset').status_code == 302
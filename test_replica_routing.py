@@ -0,0 +1,97 @@
+import time
+from contextlib import contextmanager
+from datetime import date
+from sqlalchemy import create_engine
+from conftest import login
+
+MANUFACTURER = 'Replica Pharma'
+
+def _add_item(app, return_no):
+    from models import db, ReturnReport, ReturnItem, ReturnCategory
+    from caching import get_reason_ids
+    with app.app_context():
+        category = ReturnCategory.query.filter_by(name='Replica').first() or ReturnCategory(name='Replica')
+        report = ReturnReport(return_no=return_no, invoice_date=date(2037, 1, 1), service_type='Standard Return',
+                              ERV=1.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2037, 1, 1))
+        db.session.add_all([category, report])
+        db.session.flush()
+        db.session.add(ReturnItem(return_report_id=report.id, ndc='77770000001', description='Replica item', lot_no='R1',
+                                  exp_date=date(2030, 1, 1), pkg_size=1, full_qty=1, partial_qty=0, unit_price=1.0,
+                                  extended_price=1.0, category_id=category.id, reason_id=get_reason_ids()['Outdated'],
+                                  manufacturer=MANUFACTURER))
+        db.session.commit()
+
+@contextmanager
+def replica(app, path):
+    """Register ``path`` as the replica bind for the duration of the block."""
+    from models import db
+    from db_routing import REPLICA_BIND, replica_router
+    engine = create_engine(f'sqlite:///{path}')
+    with app.app_context():
+        db.engines[REPLICA_BIND] = engine
+    replica_router.reset()
+    try:
+        yield
+    finally:
+        with app.app_context():
+            del db.engines[REPLICA_BIND]
+        engine.dispose()
+        replica_router.reset()
+
+def _exported_returns(client):
+    response = client.get(f'/export/csv?manufacturer={MANUFACTURER}')
+    body = response.get_data(as_text=True)
+    response.close()
+    return {line.split(',')[0] for line in body.splitlines()[1:]}
+
+def test_read_only_views_use_a_fresh_replica_and_fall_back_to_the_primary(app, client, tmp_path):
+    from models import db
+    from db_routing import snapshot_sqlite, replica_router
+    _add_item(app, 'RTN-REPLICA-OLD')
+    with app.app_context():
+        primary_path = db.engine.url.database
+    snapshot_sqlite(primary_path, str(tmp_path / 'replica.db'))
+    _add_item(app, 'RTN-REPLICA-NEW')
+
+    login(client, 'user1', 'pass123')
+    with replica(app, tmp_path / 'replica.db'):
+        # The snapshot predates the new return
+        assert _exported_returns(client) == {'RTN-REPLICA-OLD'}
+
+        # Too far behind: read from the primary
+        app.config['REPLICA_MAX_LAG_SECONDS'] = 0
+        replica_router.reset()
+        try:
+            time.sleep(0.01)
+            assert _exported_returns(client) == {'RTN-REPLICA-OLD', 'RTN-REPLICA-NEW'}
+        finally:
+            app.config['REPLICA_MAX_LAG_SECONDS'] = 300
+            replica_router.reset()
+
+        # A browser that has written since the snapshot reads its own writes from the primary
+        response = client.post('/new_check', data={'statement_no': 'STMT-REPLICA', 'payment_date': '2037-01-01',
+                                                   'amount': '10', 'check_no': 'CHK-REPLICA'})
+        assert response.status_code == 302
+        assert _exported_returns(client) == {'RTN-REPLICA-OLD', 'RTN-REPLICA-NEW'}
+
+def test_unreachable_replica_falls_back_to_the_primary(app, client, tmp_path):
+    _add_item(app, 'RTN-REPLICA-DOWN')
+    login(client, 'user1', 'pass123')
+    # An empty file has no snapshot table, like a replica that was never refreshed
+    with replica(app, tmp_path / 'missing.db'):
+        assert 'RTN-REPLICA-DOWN' in _exported_returns(client)
+
+def test_read_only_view_that_queues_a_job_reads_it_back_from_the_primary(app, client, tmp_path):
+    from models import db
+    from db_routing import snapshot_sqlite
+    _add_item(app, 'RTN-REPLICA-JOB')
+    with app.app_context():
+        primary_path = db.engine.url.database
+    snapshot_sqlite(primary_path, str(tmp_path / 'replica.db'))
+
+    login(client, 'user1', 'pass123')
+    with replica(app, tmp_path / 'replica.db'):
+        # The job row is committed after the snapshot, so only the primary has it
+        response = client.get(f'/export/csv?background=1&manufacturer={MANUFACTURER}')
+        assert response.status_code == 302
+        assert '/jobs/' in response.headers['Location']
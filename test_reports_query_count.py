@@ -0,0 +1,60 @@
+import pytest
+from conftest import login, count_statements
+
+# The logged-in user, report totals, the classification scan, manufacturers and categories
+MAX_REPORT_STATEMENTS = 5
+
+@pytest.mark.parametrize('url', ['/reports', '/reports/summary'])
+def test_report_pages_issue_fixed_number_of_statements(app, client, url):
+    login(client, 'user1', 'pass123')
+    # Warm the reference-data cache so only per-request statements are counted
+    client.get(url)
+
+    with count_statements(app) as statements:
+        response = client.get(url)
+
+    assert response.status_code == 200
+    assert len(statements) <= MAX_REPORT_STATEMENTS, '\n\n'.join(statements)
+
+def test_report_statement_count_does_not_grow_with_items(app, client):
+    from models import db, ReturnItem, ReturnReport, ReturnCategory
+    from caching import get_reason_ids
+    login(client, 'user1', 'pass123')
+    client.get('/reports')
+    with count_statements(app) as before:
+        client.get('/reports')
+
+    with app.app_context():
+        if not ReturnCategory.query.first():
+            db.session.add(ReturnCategory(name='Returnable'))
+            db.session.commit()
+        category_id = ReturnCategory.query.first().id
+        report = ReturnReport.query.first()
+        reason_ids = get_reason_ids()
+        db.session.add_all(ReturnItem(
+            return_report_id=report.id, ndc=f'{i:011d}', description='Test item', lot_no='L1',
+            exp_date=report.invoice_date, pkg_size=1, full_qty=1, partial_qty=0, unit_price=1.0,
+            extended_price=2.0, category_id=category_id,
+            reason_id=reason_ids['Outdated' if i % 2 else 'Returnable'], manufacturer='Test Pharma'
+        ) for i in range(50))
+        db.session.commit()
+
+    with count_statements(app) as after:
+        response = client.get('/reports')
+    assert response.status_code == 200
+    assert len(after) == len(before)
+
+def test_report_figures_match_source_tables(app, client):
+    from models import db, ReturnItem, ReturnReport, Reason
+    from reporting import compute_report_data
+    with app.app_context():
+        data = compute_report_data()
+        outdated = db.session.query(db.func.sum(ReturnItem.extended_price)).join(Reason).filter(
+            Reason.name == 'Outdated').scalar() or 0
+        returnable_count = db.session.query(db.func.count(ReturnItem.id)).join(Reason).filter(
+            Reason.name == 'Returnable').scalar() or 0
+        total_erv = db.session.query(db.func.sum(ReturnReport.ERV)).scalar() or 0
+
+    assert data['outdated_value'] == pytest.approx(outdated)
+    assert data['returnable_count'] == returnable_count
+    assert data['total_erv'] == pytest.approx(total_erv)
@@ -0,0 +1,72 @@
+from datetime import date
+from conftest import assert_rollups_match_a_rebuild
+
+def _report(return_no):
+    from models import ReturnReport, ManufacturerBreakdown
+    report = ReturnReport(return_no=return_no, invoice_date=date(2032, 5, 5), service_type='Standard Return', ERV=30.0,
+                          credit_received=3.0, fees=0.5, amount_paid=0, last_payment_date=date(2032, 6, 1))
+    report.breakdowns.append(ManufacturerBreakdown(manufacturer_name='Rollup Pharma A', ERV=30.0,
+                                                   expiration_date=date(2033, 1, 1)))
+    return report
+
+def _item_values(report_id, category_id, reason_id, n):
+    return dict(return_report_id=report_id, ndc=f'4444000{n:04d}', description='Rollup item', lot_no=f'RL{n}',
+                exp_date=date(2033, 1, 1), pkg_size=1, full_qty=1, partial_qty=0, unit_price=5.0,
+                extended_price=5.0 * (n + 1), category_id=category_id, reason_id=reason_id,
+                manufacturer='Rollup Pharma A')
+
+def test_rollups_follow_orm_inserts_updates_and_deletes(app):
+    from models import db, ReturnItem, ReturnCategory, ManufacturerRollup
+    from caching import get_reason_ids
+    with app.app_context():
+        category = ReturnCategory(name='Rollup')
+        report = _report('RTN-ROLLUP-1')
+        db.session.add_all([category, report])
+        db.session.flush()
+        reasons = get_reason_ids()
+        items = [ReturnItem(**_item_values(report.id, category.id, reasons['Outdated'], n)) for n in range(3)]
+        db.session.add_all(items)
+        db.session.commit()
+        assert_rollups_match_a_rebuild()
+
+        # Move money and counts between groups
+        items[0].reason_id = reasons['Short Dated']
+        items[1].extended_price = 99.0
+        report.ERV = 45.0
+        report.invoice_date = date(2032, 8, 8)
+        report.breakdowns[0].manufacturer_name = 'Rollup Pharma B'
+        db.session.commit()
+        assert_rollups_match_a_rebuild()
+
+        db.session.delete(items[2])
+        db.session.delete(report.breakdowns[0])
+        db.session.commit()
+        assert_rollups_match_a_rebuild()
+        # A group whose last row went is dropped, not left at zero
+        assert db.session.get(ManufacturerRollup, 'Rollup Pharma B') is None
+
+        db.session.delete(report)
+        db.session.commit()
+        assert_rollups_match_a_rebuild()
+
+def test_rollups_follow_bulk_inserts(app):
+    from models import db, ReturnItem, ReturnCategory
+    from caching import get_reason_ids
+    from classification import insert_rows
+    with app.app_context():
+        category = ReturnCategory.query.filter_by(name='Rollup').first() or ReturnCategory(name='Rollup')
+        report = _report('RTN-ROLLUP-2')
+        db.session.add_all([category, report])
+        db.session.commit()
+        insert_rows(ReturnItem, [_item_values(report.id, category.id, get_reason_ids()['Returnable'], n)
+                                 for n in range(10, 15)])
+        db.session.commit()
+        assert_rollups_match_a_rebuild()
+
+def test_rolled_back_writes_leave_the_rollups_alone(app):
+    from models import db
+    with app.app_context():
+        db.session.add(_report('RTN-ROLLUP-3'))
+        db.session.flush()
+        db.session.rollback()
+        assert_rollups_match_a_rebuild()
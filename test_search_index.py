@@ -0,0 +1,86 @@
+from datetime import date
+from conftest import login
+
+def _item(report, category_id, reason_id, **values):
+    row = dict(return_report_id=report.id, ndc='00000000000', description='Test item', lot_no='L1',
+               exp_date=date(2030, 1, 1), pkg_size=1, full_qty=1, partial_qty=0, unit_price=1.0,
+               extended_price=1.0, category_id=category_id, reason_id=reason_id, manufacturer='Test Pharma')
+    row.update(values)
+    return row
+
+def test_index_follows_orm_and_bulk_writes(app):
+    from models import db, ReturnReport, ReturnItem, ReturnCategory
+    from caching import get_reason_ids
+    from classification import insert_rows
+    from search_index import search
+
+    def found(query_text, kind):
+        return [(hit.kind, hit.code) for hit in search(query_text, [kind])]
+
+    with app.app_context():
+        if not ReturnCategory.query.first():
+            db.session.add(ReturnCategory(name='Returnable'))
+            db.session.commit()
+        category_id = ReturnCategory.query.first().id
+        reason_id = get_reason_ids()['Returnable']
+
+        report = ReturnReport(return_no='RTN-SEARCH-7731', invoice_date=date(2033, 3, 1), service_type='Zephyrline Pickup',
+                              ERV=1.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2033, 4, 1))
+        db.session.add(report)
+        db.session.flush()
+        db.session.add(ReturnItem(**_item(report, category_id, reason_id, ndc='77310000001',
+                                          description='Quorvex 20mg tablets', manufacturer='Halcyon Labs')))
+        db.session.commit()
+        assert found('7731', 'return') == [('return', 'RTN-SEARCH-7731')]
+        assert found('zephyr', 'return') == [('return', 'RTN-SEARCH-7731')]
+        assert found('quorv', 'item') == [('item', '77310000001')]
+
+        # Rows inserted in bulk are indexed when the transaction commits
+        insert_rows(ReturnItem, [_item(report, category_id, reason_id, ndc=f'7732000000{i}', lot_no=f'LOTQX{i}',
+                                       manufacturer='Halcyon Labs') for i in range(3)])
+        db.session.commit()
+        assert len(found('halcyon', 'item')) == 4
+        hit = search('lotqx1', ['item'])[0]
+        assert hit.return_no == 'RTN-SEARCH-7731' and '<mark>' in hit.snippet
+
+        # Edits replace the old text and deletes drop the document
+        report.service_type = 'Standard Return'
+        db.session.commit()
+        assert found('zephyr', 'return') == []
+        item = ReturnItem.query.filter_by(ndc='77310000001').one()
+        db.session.delete(item)
+        db.session.commit()
+        assert found('quorv', 'item') == []
+
+def test_search_ranks_identifier_matches_first(app, client):
+    from models import db, ReturnReport
+    with app.app_context():
+        db.session.add_all([
+            ReturnReport(return_no='RTN-RANK-1', invoice_date=date(2033, 5, 1), service_type='Rankwell courier',
+                         ERV=1.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2033, 6, 1)),
+            ReturnReport(return_no='RTN-RANKWELL-2', invoice_date=date(2033, 5, 1), service_type='Standard Return',
+                         ERV=1.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2033, 6, 1)),
+        ])
+        db.session.commit()
+
+    login(client, 'user1', 'pass123')
+    data = client.get('/search?q=rankwell&format=json').get_json()
+    assert [result['code'] for result in data['results']] == ['RTN-RANKWELL-2', 'RTN-RANK-1']
+    assert data['results'][0]['url'] == '/returns/RTN-RANKWELL-2'
+
+    # The list filters match substrings
+    html = client.get('/returns?return_no=rankwell').get_data(as_text=True)
+    assert '<td>RTN-RANKWELL-2</td>' in html and '<td>RTN-RANK-1</td>' not in html
+    assert client.get('/search?q=rankwell').status_code == 200
+
+def test_list_filters_match_substrings_unless_word_matching_is_asked_for(app, client):
+    from models import db, ReturnReport
+    with app.app_context():
+        db.session.add(ReturnReport(return_no='RTN-2024-001', invoice_date=date(2033, 7, 1), service_type='Standard Return',
+                                    ERV=1.0, credit_received=0, fees=0, amount_paid=0, last_payment_date=date(2033, 8, 1)))
+        db.session.commit()
+
+    login(client, 'user1', 'pass123')
+    assert '<td>RTN-2024-001</td>' in client.get('/returns?return_no=24-00').get_data(as_text=True)
+    assert '<td>RTN-2024-001</td>' not in client.get('/returns?return_no=24-00&match=words').get_data(as_text=True)
+    assert '<td>RTN-2024-001</td>' in client.get('/returns?return_no=2024 001&match=words').get_data(as_text=True)
@@ -0,0 +1,31 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _run(args, database, **kwargs):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + str(database))
+    return subprocess.run([sys.executable] + args, env=env, cwd=HERE, check=True,
+                          capture_output=True, text=True, **kwargs)
+
+def test_import_touches_no_database_and_no_heavy_libraries(tmp_path):
+    from bench_startup import HEAVY_MODULES
+    database = tmp_path / 'startup.db'
+    output = _run(['-c', 'import sys, app; print(",".join(sorted(set(m.split(".")[0] for m in sys.modules))))'],
+                  database).stdout
+    assert not database.exists()
+    assert not set(HEAVY_MODULES) & set(output.strip().split(','))
+
+def test_init_db_command_creates_schema_and_seeds(tmp_path):
+    database = tmp_path / 'startup.db'
+    _run(['-m', 'flask', '--app', 'app', 'init-db'], database)
+    with sqlite3.connect(database) as connection:
+        assert connection.execute("SELECT count(*) FROM users").fetchone() == (0,)
+        assert connection.execute("SELECT count(*) FROM sqlite_master WHERE name = 'search_index'").fetchone() == (1,)
+
+    _run(['-m', 'flask', '--app', 'app', 'seed-db'], database)
+    _run(['-m', 'flask', '--app', 'app', 'seed-db'], database)
+    with sqlite3.connect(database) as connection:
+        assert connection.execute("SELECT count(*) FROM users WHERE username = 'user1'").fetchone() == (1,)